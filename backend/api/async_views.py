@@ -0,0 +1,251 @@
+"""
+Асинхронные представления для «горячих» эндпоинтов чтения.
+
+Представления используются только при работе через ASGI
+(см. foodgram/asgi.py) и отдают те же данные, что и вьюсеты из views.py:
+сериализация выполняется теми же сериализаторами (а рецепты, как и во
+вьюсете, собираются из готовых документов, см. documents.py), а все
+связанные данные загружаются заранее через асинхронный ORM. Запросы с
+методами, отличными от GET, передаются синхронным вьюсетам.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils.translation import gettext_lazy as _
+from django_filters.utils import translate_validation
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.models import Ingredient, Tag
+from users.models import Follow
+
+from .documents import document_queryset, render_documents, serves
+from .filters import IngredientFilter, RecipeFilter
+from .serializers import (
+    FollowSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from .utils import ordered_by_ids, recipe_queryset, requested_ids
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с поиском токена через асинхронный ORM.
+    Разбор заголовка Authorization выполняет TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        return key, None
+
+    async def authenticate_async(self, request):
+        credentials = self.authenticate(request)
+        if credentials is None:
+            return AnonymousUser()
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(
+                key=credentials[0])
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return token.user
+
+
+def render(data, status=200, headers=None):
+    """Ответ в том же JSON-формате, что и у JSONRenderer в DRF."""
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type='application/json',
+        headers=headers,
+    )
+
+
+def async_read(view):
+    """
+    Декоратор асинхронного представления чтения: GET-запросы обрабатываются
+    асинхронно, остальные методы передаются синхронному вьюсету из
+    основного URLconf. Исключения DRF превращаются в ответы того же вида,
+    что возвращает DRF.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+            return await sync_to_async(match.func)(
+                request, *match.args, **match.kwargs)
+        try:
+            request.user = await (
+                AsyncTokenAuthentication().authenticate_async(request))
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            headers = None
+            if isinstance(exc, (exceptions.NotAuthenticated,
+                                exceptions.AuthenticationFailed)):
+                headers = {'WWW-Authenticate': TokenAuthentication.keyword}
+            detail = exc.detail
+            if not isinstance(detail, (list, dict)):
+                detail = {'detail': detail}
+            return render(detail, status=exc.status_code, headers=headers)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def filter_queryset(filterset_class, request, queryset):
+    """
+    Применение набора фильтров. Валидация формы фильтров может обращаться
+    к базе данных (например, для тегов), поэтому выполняется в потоке.
+    """
+    filterset = filterset_class(request.GET, queryset=queryset,
+                                request=request)
+    if not await sync_to_async(filterset.is_valid)():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+async def paginate(request, queryset):
+    """
+    Асинхронный аналог PageNumberPagination: возвращает страницу
+    объектов и данные для ответа в формате DRF.
+    """
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    num_pages = max(1, -(-count // page_size))
+    page_number = request.GET.get('page', 1)
+    if page_number == 'last':
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        raise exceptions.NotFound(_('Invalid page.'))
+    if not 1 <= page_number <= num_pages:
+        raise exceptions.NotFound(_('Invalid page.'))
+    offset = (page_number - 1) * page_size
+    objects = [
+        obj async for obj in queryset[offset:offset + page_size]
+    ]
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page_number < num_pages:
+        next_url = replace_query_param(url, 'page', page_number + 1)
+    if page_number == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page_number > 2:
+        previous_url = replace_query_param(url, 'page', page_number - 1)
+    return objects, {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+    }
+
+
+async def get_object(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise exceptions.NotFound()
+
+
+def render_bytes(content):
+    return HttpResponse(content, content_type='application/json')
+
+
+async def recipe_documents(request):
+    """
+    Список рецептов из готовых документов, как в RecipeViewSet.list.
+    Недостающие документы строятся синхронно, поэтому склейка выполняется
+    в потоке.
+    """
+    queryset = await filter_queryset(
+        RecipeFilter, request, document_queryset(request))
+    ids = requested_ids(request)
+    if ids is not None:
+        recipes = ordered_by_ids(
+            [recipe async for recipe in queryset.filter(pk__in=ids)], ids)
+        page = None
+    else:
+        recipes, page = await paginate(request, queryset)
+    results = b'[' + b','.join(
+        await sync_to_async(render_documents)(recipes, request)) + b']'
+    if page is None:
+        return render_bytes(results)
+    return render_bytes(
+        JSONRenderer().render(page)[:-1] + b',"results":' + results + b'}')
+
+
+@async_read
+async def recipe_list(request):
+    if serves(request):
+        return await recipe_documents(request)
+    queryset = await filter_queryset(
+        RecipeFilter, request, recipe_queryset(request))
+    ids = requested_ids(request)
+    if ids is not None:
+        recipes = ordered_by_ids(
+            [recipe async for recipe in queryset.filter(pk__in=ids)], ids)
+        return render(RecipeSerializer(
+            recipes, many=True, context={'request': request}).data)
+    recipes, page = await paginate(request, queryset)
+    page['results'] = RecipeSerializer(
+        recipes, many=True, context={'request': request}).data
+    return render(page)
+
+
+@async_read
+async def recipe_detail(request, pk):
+    if serves(request):
+        recipe = await get_object(document_queryset(request), pk=pk)
+        documents = await sync_to_async(render_documents)([recipe], request)
+        return render_bytes(documents[0])
+    recipe = await get_object(recipe_queryset(request), pk=pk)
+    return render(
+        RecipeSerializer(recipe, context={'request': request}).data)
+
+
+@async_read
+async def tag_list(request):
+    tags = [tag async for tag in Tag.objects.all()]
+    return render(TagSerializer(tags, many=True).data)
+
+
+@async_read
+async def tag_detail(request, pk):
+    tag = await get_object(Tag.objects.all(), pk=pk)
+    return render(TagSerializer(tag).data)
+
+
+@async_read
+async def ingredient_list(request):
+    queryset = await filter_queryset(
+        IngredientFilter, request, Ingredient.objects.all())
+    ingredients = [ingredient async for ingredient in queryset]
+    return render(IngredientSerializer(ingredients, many=True).data)
+
+
+@async_read
+async def ingredient_detail(request, pk):
+    ingredient = await get_object(Ingredient.objects.all(), pk=pk)
+    return render(IngredientSerializer(ingredient).data)
+
+
+@async_read
+async def subscriptions(request):
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    follows, page = await paginate(
+        request, Follow.objects.subscriptions_of(request.user))
+    page['results'] = FollowSerializer(
+        follows, many=True, context={'request': request}).data
+    return render(page)
@@ -0,0 +1,103 @@
+"""
+Быстрое представление списков для горячих эндпоинтов.
+
+Сериализатор DRF для каждого объекта списка вызывает get_attribute и
+to_representation каждого поля и вложенных сериализаторов. Здесь поля
+сериализатора один раз на список превращаются в функции объект -> значение:
+источник поля читается operator.attrgetter, целые и строковые поля
+приводятся int и str, вложенные сериализаторы собираются так же, методы
+SerializerMethodField вызываются напрямую, а остальные поля (изображения,
+связи в виде идентификаторов) — через свой to_representation. Сериализатор
+может заменить функцию поля фабрикой из атрибута compiled_fields.
+
+Ответ совпадает с ответом сериализатора DRF байт в байт; это проверяет
+команда bench_serializers --check.
+"""
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
+
+CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.SlugField: str,
+}
+
+
+def source_getter(field):
+    if field.source == '*':
+        return lambda obj: obj
+    return attrgetter('.'.join(field.source_attrs))
+
+
+def with_none(getter, convert):
+    def represent(obj):
+        value = getter(obj)
+        return None if value is None else convert(value)
+    return represent
+
+
+def generic(field):
+    """Поле, которое представляется своим to_representation."""
+    def represent(obj):
+        attribute = field.get_attribute(obj)
+        value = (attribute.pk if isinstance(attribute, PKOnlyObject)
+                 else attribute)
+        return None if value is None else field.to_representation(attribute)
+    return represent
+
+
+def compile_field(serializer, name, field):
+    factory = getattr(serializer, 'compiled_fields', {}).get(name)
+    if factory is not None:
+        return factory(serializer)
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(serializer, field.method_name)
+    if isinstance(field, serializers.ListSerializer):
+        return with_none(source_getter(field), compile_many(field.child))
+    if isinstance(field, serializers.BaseSerializer):
+        return with_none(source_getter(field), compile_serializer(field))
+    if type(field) is serializers.ReadOnlyField:
+        return source_getter(field)
+    if type(field) in CONVERTERS:
+        return with_none(source_getter(field), CONVERTERS[type(field)])
+    return generic(field)
+
+
+def compile_serializer(serializer):
+    """Функция объект -> словарь с полями сериализатора serializer."""
+    accessors = [
+        (name, compile_field(serializer, name, field))
+        for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+
+    def represent(obj):
+        return {name: get(obj) for name, get in accessors}
+    return represent
+
+
+def compile_many(child):
+    """Функция список (или менеджер связи) -> список словарей."""
+    represent = compile_serializer(child)
+
+    def represent_all(data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        return [represent(item) for item in iterable]
+    return represent_all
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """
+    Список, который представляется собранными функциями полей (при
+    settings.COMPILED_SERIALIZERS) вместо сериализатора на каждый объект.
+    """
+
+    def to_representation(self, data):
+        if not settings.COMPILED_SERIALIZERS:
+            return super().to_representation(data)
+        return compile_many(self.child)(data)
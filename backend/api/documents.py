@@ -0,0 +1,172 @@
+"""
+Заранее сериализованные JSON-документы рецептов.
+
+Часть представления рецепта, не зависящая от пользователя, хранится в
+RecipeDocument в том виде, в котором ее отдает RecipeSerializer. Вместо
+признаков is_subscribed (автора), is_favorited и is_in_shopping_cart и
+вместо адреса сервера в ссылке на изображение в документе стоят нулевые
+байты: в корректном JSON они не встречаются, так как JSONRenderer
+экранирует управляющие символы. Ответ собирается склейкой байтов
+документов с подставленными значениями.
+"""
+import json
+from functools import partial
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import QueryDict
+from django.utils.encoding import iri_to_uri
+from rest_framework.renderers import JSONRenderer
+
+from recipes import outbox
+from recipes.models import Recipe, RecipeDocument
+from users.models import Follow
+
+from .serializers import RecipeSerializer
+
+HOLE = '\x00'
+PLACEHOLDER = b'\x00'
+FLAG_HOLES = 3
+JSON_BOOLEANS = {True: b'true', False: b'false', None: b'false'}
+
+
+class DocumentRequest:
+    """
+    Запрос-заглушка для сериализации документа: анонимный пользователь,
+    без параметров, ссылки строятся без адреса сервера.
+    """
+    user = AnonymousUser()
+    GET = QueryDict()
+
+    def build_absolute_uri(self, location):
+        bits = urlsplit(location)
+        if bits.scheme and bits.netloc:
+            return iri_to_uri(location)
+        return HOLE + iri_to_uri(location)
+
+
+def build_body(recipe):
+    """
+    Документ рецепта; recipe должен быть загружен с with_related().
+    Возвращает None, если документ нельзя разметить однозначно.
+    """
+    data = RecipeSerializer(
+        recipe, context={'request': DocumentRequest()}).data
+    data['author']['is_subscribed'] = HOLE
+    data['is_favorited'] = HOLE
+    data['is_in_shopping_cart'] = HOLE
+    body = JSONRenderer().render(data)
+    body = body.replace(b'"\\u0000"', PLACEHOLDER).replace(
+        b'\\u0000', PLACEHOLDER)
+    holes = body.count(PLACEHOLDER)
+    if holes != FLAG_HOLES + (body.find(b'"image":"\x00') != -1):
+        return None
+    return body
+
+
+def build_documents(recipe_ids):
+    """Построение и сохранение документов; возвращает {id: документ}."""
+    bodies = {}
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).with_related(None)
+    for recipe in recipes:
+        body = build_body(recipe)
+        if body is not None:
+            bodies[recipe.pk] = body
+    RecipeDocument.objects.bulk_create(
+        [RecipeDocument(recipe_id=pk, body=body)
+         for pk, body in bodies.items()],
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=['body'],
+    )
+    return bodies
+
+
+def build_missing(recipe_ids):
+    existing = RecipeDocument.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+    missing = set(recipe_ids) - set(existing)
+    if missing:
+        build_documents(missing)
+
+
+def invalidate(recipe_ids):
+    """
+    Удаление устаревших документов рецептов и их перестроение после
+    фиксации транзакции или, при OUTBOX['DEFERRED_BUILDS'], обработчиком
+    журнала событий.
+    """
+    recipe_ids = list(recipe_ids)
+    RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+    if not settings.OUTBOX['DEFERRED_BUILDS']:
+        transaction.on_commit(partial(build_missing, recipe_ids))
+
+
+def handle_events(events):
+    """Обработчик журнала событий: документы новых и измененных рецептов."""
+    build_missing(outbox.recipe_ids(events))
+
+
+def invalidate_lazily(**lookup):
+    """
+    Удаление документов рецептов, отобранных по lookup. Документы
+    перестраиваются при следующем чтении или командой
+    build_recipe_documents.
+    """
+    RecipeDocument.objects.filter(
+        recipe__in=Recipe.objects.filter(**lookup)).delete()
+
+
+def serves(request):
+    """Запрошено полное представление рецептов, которое хранят документы."""
+    return (
+        settings.RECIPE_DOCUMENTS
+        and RecipeSerializer.sparse_params(request) is None
+    )
+
+
+def document_queryset(request):
+    """Рецепты с документами и признаками, зависящими от пользователя."""
+    user_id = request.user.id
+    return Recipe.objects.add_user_annotations(user_id).annotate(
+        author_subscribed=Exists(
+            Follow.objects.filter(user_id=user_id, author=OuterRef('author'))
+        )
+    ).select_related('document')
+
+
+def render_documents(recipes, request):
+    """Список документов рецептов с подставленными значениями."""
+    bodies = {
+        recipe.pk: bytes(recipe.document.body)
+        for recipe in recipes if hasattr(recipe, 'document')
+    }
+    missing = [recipe.pk for recipe in recipes if recipe.pk not in bodies]
+    if missing:
+        bodies.update(build_documents(missing))
+    origin = json.dumps(
+        iri_to_uri(request._current_scheme_host), ensure_ascii=False
+    )[1:-1].encode()
+    documents = []
+    for recipe in recipes:
+        body = bodies.get(recipe.pk)
+        if body is None:
+            documents.append(JSONRenderer().render(
+                RecipeSerializer(recipe, context={'request': request}).data))
+            continue
+        values = [
+            JSON_BOOLEANS[recipe.author_subscribed],
+            JSON_BOOLEANS[recipe.is_favorited],
+            JSON_BOOLEANS[recipe.is_in_shopping_cart],
+            origin,
+        ]
+        parts = body.split(PLACEHOLDER)
+        spliced = [parts[0]]
+        for value, part in zip(values, parts[1:]):
+            spliced.append(value)
+            spliced.append(part)
+        documents.append(b''.join(spliced))
+    return documents
@@ -0,0 +1,174 @@
+"""
+Поток событий /api/events/ (server-sent events).
+
+Клиент открывает GET-запрос и получает события по мере изменений:
+
+* recipe_created — новый рецепт автора из подписок пользователя;
+* recipe_updated, recipe_deleted — изменение и удаление рецептов,
+  перечисленных в параметре ?recipes=1,2 (открытых у клиента); об
+  удалении рецептов авторов из подписок сообщается также;
+* favorite_added, favorite_removed, shopping_cart_added,
+  shopping_cart_removed — изменения избранного и списка покупок;
+* subscribed, unsubscribed — изменения подписок: поток сразу начинает
+  или перестает получать рецепты автора.
+
+Данные события — идентификаторы, сами объекты клиент запрашивает в API.
+Без событий каждые EVENTS['HEARTBEAT_SECONDS'] секунд отправляется
+комментарий, чтобы прокси и балансировщики не закрывали соединение.
+Переподключаясь, клиент передает заголовок Last-Event-ID, и пропущенные
+события досылаются из истории брокера; если продолжить поток нельзя,
+первым приходит событие reset, и клиент догоняет состояние через
+/api/sync/.
+
+Поток обслуживается ASGI-приложением без представлений Django
+(FoodgramASGIHandler передает ему запросы к PATH): открытое соединение
+держит только корутину, задачу ожидания отключения клиента и таймер
+пинга, а соединение с базой данных нужно лишь при подключении.
+"""
+import asyncio
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.events import broker
+from users.models import Follow
+
+from .utils import requested_ids
+
+PATH = '/api/events/'
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # nginx не буферизует ответ и отдает события сразу.
+    (b'x-accel-buffering', b'no'),
+]
+PING = b': ping\n\n'
+SUBSCRIPTION_EVENTS = {'subscribed': broker.join, 'unsubscribed': broker.leave}
+
+
+def subscription_channels(request):
+    """
+    Каналы потока: пользователь и авторы его подписок (для
+    авторизованного пользователя) и рецепты из параметра ?recipes=.
+    Выполняется в потоке: аутентификация и подписки читаются из базы.
+    """
+    try:
+        credentials = TokenAuthentication().authenticate(request)
+        channels = {
+            f'recipe:{pk}'
+            for pk in requested_ids(request, 'recipes') or ()
+        }
+        if credentials is not None:
+            user = credentials[0]
+            channels.add(f'user:{user.pk}')
+            channels.update(
+                f'author:{pk}' for pk in Follow.objects.filter(
+                    user=user).values_list('author_id', flat=True))
+        return channels
+    finally:
+        close_old_connections()
+
+
+def encode(entry):
+    sequence, event = entry
+    return (
+        f'id: {broker.event_id(sequence)}\n'
+        f'event: {event["type"]}\n'
+        f'data: {json.dumps(event["data"])}\n\n'
+    ).encode()
+
+
+def first_chunk(last_event_id, channels):
+    """
+    Начало потока: пропущенные после Last-Event-ID события или reset, если
+    их не восстановить. Новый поток начинается со строки id без данных —
+    она задает клиенту позицию для переподключения, не создавая события.
+    """
+    position = broker.event_id(broker.last).encode()
+    if not last_event_id:
+        return b'id: ' + position + b'\n\n'
+    missed = broker.missed(last_event_id, channels)
+    if missed is None:
+        return b'id: ' + position + b'\nevent: reset\ndata: {}\n\n'
+    return b''.join(map(encode, missed)) or b'id: ' + position + b'\n\n'
+
+
+async def respond(send, status, data, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({'type': 'http.response.body',
+                'body': JSONRenderer().render(data)})
+
+
+async def error_response(send, exc):
+    headers = []
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        headers.append(
+            (b'www-authenticate', TokenAuthentication.keyword.encode()))
+    if isinstance(exc, exceptions.MethodNotAllowed):
+        headers.append((b'allow', b'GET'))
+    detail = exc.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {'detail': detail}
+    await respond(send, exc.status_code, detail, headers)
+
+
+async def wait_disconnect(receive, subscriber):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscriber.close()
+
+
+async def stream(scope, receive, send):
+    """ASGI-приложение потока событий."""
+    request = ASGIRequest(scope, io.BytesIO())
+    if request.method != 'GET':
+        await error_response(send, exceptions.MethodNotAllowed(
+            request.method))
+        return
+    try:
+        channels = await sync_to_async(subscription_channels)(request)
+    except exceptions.APIException as exc:
+        await error_response(send, exc)
+        return
+    # Подписка и чтение истории выполняются без переключения на другие
+    # корутины, поэтому события не теряются и не повторяются.
+    subscriber = broker.subscribe(channels)
+    chunk = first_chunk(request.headers.get('Last-Event-ID'),
+                        subscriber.channels)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive, subscriber))
+    loop = asyncio.get_running_loop()
+    heartbeat = settings.EVENTS['HEARTBEAT_SECONDS']
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': STREAM_HEADERS})
+        while not subscriber.closed:
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+            timer = loop.call_later(heartbeat, subscriber.wake.set)
+            await subscriber.wake.wait()
+            timer.cancel()
+            subscriber.wake.clear()
+            chunks = []
+            while subscriber.pending:
+                entry = subscriber.pending.popleft()
+                event = entry[1]
+                if event['type'] in SUBSCRIPTION_EVENTS:
+                    SUBSCRIPTION_EVENTS[event['type']](
+                        subscriber, f'author:{event["data"]["author"]}')
+                chunks.append(encode(entry))
+            chunk = b''.join(chunks) or PING
+    finally:
+        broker.unsubscribe(subscriber)
+        disconnect.cancel()
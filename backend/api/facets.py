@@ -0,0 +1,165 @@
+"""
+Счетчики фасетов списка рецептов: число рецептов по каждому тегу, по
+группам времени приготовления и с признаками «в избранном» и «в списке
+покупок» при тех же параметрах фильтра, что и у /api/recipes/.
+
+Все счетчики считаются одним агрегирующим запросом: каждый — COUNT с
+собственным условием (FILTER (WHERE ...)), теги проверяются по маске
+tag_mask. Счетчики тегов при сопоставлении tags_match=any не учитывают
+выбранные теги — показывают, сколько рецептов у тега при остальных
+условиях; остальные счетчики считаются по итоговой выборке.
+
+Ответ кешируется по набору параметров фильтра. В ключ входят номер
+версии рецептов, который увеличивается при каждом изменении рецептов и
+тегов, и номер версии пользователя — он увеличивается при изменении его
+избранного и списка покупок. Старые записи просто перестают читаться и
+вытесняются по времени жизни.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django_filters.utils import translate_validation
+
+from recipes.models import (
+    FavoriteRecipeUser,
+    Recipe,
+    ShoppingCartUser,
+    Tag,
+    has_tags,
+    tags_mask,
+)
+
+from .filters import RecipeFilter
+from .utils import USER_FLAGS
+
+RECIPES_VERSION = 'recipe-facets:version'
+USER_VERSION = 'recipe-facets:user:{}'
+# Параметры, которые не передаются фильтру и не входят в ключ кеша.
+IGNORED_PARAMS = {'ordering'}
+USER_LISTS = {
+    'is_favorited': FavoriteRecipeUser,
+    'is_in_shopping_cart': ShoppingCartUser,
+}
+
+
+def version(key):
+    """
+    Текущий номер версии. Начальное значение — время в миллисекундах,
+    чтобы после вытеснения ключа из кеша номер не повторил прежний.
+    """
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def invalidate(user_id=None):
+    """Новая версия рецептов или пользователя после фиксации транзакции."""
+    key = RECIPES_VERSION if user_id is None else USER_VERSION.format(user_id)
+    transaction.on_commit(lambda: bump(key))
+
+
+def cooking_time_buckets():
+    """Группы времени приготовления: (от, до) в минутах, до=None — выше."""
+    bounds = settings.RECIPE_FACETS['COOKING_TIME_BUCKETS']
+    lows = [1, *(bound + 1 for bound in bounds)]
+    return list(zip(lows, [*bounds, None]))
+
+
+def facet_counts(queryset, tags, match, user_id):
+    """
+    Счетчики одним запросом. queryset отфильтрован по всем параметрам,
+    кроме тегов при match='any'; tags — выбранные теги; для
+    пользователя user_id считаются также избранное и список покупок.
+    """
+    selected = Q()
+    if tags and match == 'any':
+        selected = Q(has_tags(tags_mask(tags)))
+    all_tags = list(Tag.objects.order_by('name'))
+    buckets = cooking_time_buckets()
+    aggregates = {'count': Count('pk', filter=selected)}
+    for tag in all_tags:
+        aggregates[f'tag_{tag.pk}'] = Count(
+            'pk', filter=Q(has_tags(1 << tag.bit)))
+    for low, high in buckets:
+        condition = Q(cooking_time__gte=low)
+        if high is not None:
+            condition &= Q(cooking_time__lte=high)
+        aggregates[f'time_{low}'] = Count('pk', filter=condition & selected)
+    if user_id:
+        # Условия через pk__in, а не по признакам is_favorited и
+        # is_in_shopping_cart: при фильтре по признаку aggregate()
+        # оборачивает выборку в подзапрос, из которого признак не выбран.
+        for flag, model in USER_LISTS.items():
+            recipes = model.objects.filter(user_id=user_id).values('recipe')
+            aggregates[flag] = Count(
+                'pk', filter=Q(pk__in=recipes) & selected)
+    counts = queryset.order_by().aggregate(**aggregates)
+    facets = {
+        'count': counts['count'],
+        'tags': [
+            {'id': tag.pk, 'name': tag.name, 'slug': tag.slug,
+             'count': counts[f'tag_{tag.pk}']}
+            for tag in all_tags
+        ],
+        'cooking_time': [
+            {'min': low, 'max': high, 'count': counts[f'time_{low}']}
+            for low, high in buckets
+        ],
+    }
+    if user_id:
+        facets.update((flag, counts[flag]) for flag in USER_LISTS)
+    return facets
+
+
+def cache_key(request):
+    params = sorted(
+        (name, sorted(request.query_params.getlist(name)))
+        for name in RecipeFilter.base_filters
+        if name in request.query_params and name not in IGNORED_PARAMS
+    )
+    user_id = request.user.id
+    signature = hashlib.sha256(
+        json.dumps([user_id, params]).encode()).hexdigest()
+    user_version = version(USER_VERSION.format(user_id)) if user_id else 0
+    return (f'recipe-facets:{version(RECIPES_VERSION)}:{user_version}:'
+            f'{signature}')
+
+
+def recipe_facets(request):
+    """Счетчики для параметров фильтра запроса из кеша или из базы."""
+    key = cache_key(request)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+    user_id = request.user.id
+    queryset = Recipe.objects.all()
+    if request.query_params.keys() & USER_FLAGS:
+        queryset = queryset.alias(**queryset.user_flags(user_id))
+    params = request.query_params.copy()
+    for name in IGNORED_PARAMS:
+        params.pop(name, None)
+    filterset = RecipeFilter(params, queryset, request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    tags = filterset.form.cleaned_data.get('tags')
+    match = filterset.form.cleaned_data.get('tags_match') or 'any'
+    if tags and match == 'any':
+        params.pop('tags')
+        filterset = RecipeFilter(params, queryset, request=request)
+    facets = facet_counts(filterset.qs, tags, match, user_id)
+    cache.set(key, facets, settings.RECIPE_FACETS['CACHE_TIMEOUT'])
+    return facets
@@ -0,0 +1,73 @@
+import uuid
+
+from django.conf import settings
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+class LimitedImageField(serializers.ImageField):
+    """
+    Загруженный файл изображения. До полного декодирования по заголовку
+    проверяются формат, размер файла, ширина, высота и число пикселей:
+    небольшой файл с огромными размерами («декомпрессионная бомба») не
+    распаковывается в память.
+    """
+    default_error_messages = {
+        'too_large': 'Размер файла больше {limit} МБ.',
+        'too_big': 'Изображение больше {side} пикселей по стороне или '
+                   '{pixels} пикселей всего.',
+        'format': 'Поддерживаются изображения JPEG, PNG и GIF.',
+    }
+
+    def to_internal_value(self, data):
+        limits = settings.RECIPE_IMAGE
+        if getattr(data, 'size', 0) > limits['MAX_BYTES']:
+            self.fail('too_large', limit=limits['MAX_BYTES'] // 2 ** 20)
+        image_format, width, height = self.read_header(data)
+        if (max(width, height) > limits['MAX_SIDE']
+                or width * height > limits['MAX_PIXELS']):
+            self.fail_too_big()
+        # Имя файла клиента не используется: расширение берется из формата.
+        data.name = f'{uuid.uuid4()}.{IMAGE_FORMATS[image_format]}'
+        return super().to_internal_value(data)
+
+    def fail_too_big(self):
+        limits = settings.RECIPE_IMAGE
+        self.fail('too_big', side=limits['MAX_SIDE'],
+                  pixels=limits['MAX_PIXELS'])
+
+    def read_header(self, data):
+        try:
+            with Image.open(data) as image:
+                header = image.format, image.width, image.height
+        except Image.DecompressionBombError:
+            self.fail_too_big()
+        except (OSError, SyntaxError, ValueError):
+            self.fail('invalid_image')
+        finally:
+            if hasattr(data, 'seek'):
+                data.seek(0)
+        if header[0] not in IMAGE_FORMATS:
+            self.fail('format')
+        return header
+
+
+class RecipeImageField(Base64ImageField, LimitedImageField):
+    """
+    Изображение рецепта: строка base64 в JSON или файл из
+    multipart/form-data либо тела запроса.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            if not (hasattr(data, 'read') and hasattr(data, 'seek')):
+                self.fail('invalid')
+            return LimitedImageField.to_internal_value(self, data)
+        # Размер проверяется до декодирования base64.
+        limit = settings.RECIPE_IMAGE['MAX_BYTES']
+        if len(data) * 3 // 4 > limit:
+            self.fail('too_large', limit=limit // 2 ** 20)
+        return super().to_internal_value(data)
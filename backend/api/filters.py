@@ -1,6 +1,8 @@
+from django.db.models import F
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
+    ChoiceFilter,
     FilterSet,
     filters,
 )
@@ -11,11 +13,27 @@ from recipes.models import Ingredient, Recipe, Tag
 class IngredientFilter(FilterSet):
     """Фильтр для поиска по названию ингредиента"""
     name = filters.CharFilter(lookup_expr='istartswith')
+    ordering = ChoiceFilter(
+        choices=(('popularity', 'По популярности'),),
+        method='order_by_popularity',
+    )
 
     class Meta:
         model = Ingredient
         fields = ['name']
 
+    def order_by_popularity(self, queryset, name, value):
+        """
+        Сначала ингредиенты, которые встречаются в большем числе рецептов,
+        затем чаще попадающие в списки покупок. Счетчики хранятся в
+        IngredientUsage и читаются соединением по первичному ключу.
+        """
+        return queryset.order_by(
+            F('usage__recipes').desc(nulls_last=True),
+            F('usage__shopping_carts').desc(nulls_last=True),
+            'name',
+        )
+
 
 class RecipeFilter(FilterSet):
     """
@@ -25,11 +43,47 @@ class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all())
+        queryset=Tag.objects.all(),
+        method='filter_tags')
+    tags_match = ChoiceFilter(
+        choices=(
+            ('any', 'Любой из тегов'),
+            ('all', 'Все теги'),
+        ),
+        method='match_tags',
+    )
     author = CharFilter(field_name='author')
     is_favorited = BooleanFilter()
     is_in_shopping_cart = BooleanFilter()
+    ordering = ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Набирающие популярность'),
+        ),
+        method='order_by_score',
+    )
 
     class Meta:
         model = Recipe
         fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтр по маске тегов рецепта: по умолчанию рецепты с любым из
+        выбранных тегов, с tags_match=all — со всеми.
+        """
+        return queryset.filter_by_tags(
+            value, self.form.cleaned_data.get('tags_match') or 'any')
+
+    def match_tags(self, queryset, name, value):
+        """Режим сопоставления учитывается в filter_tags."""
+        return queryset
+
+    def order_by_score(self, queryset, name, value):
+        """
+        Сортировка по рейтингу из RecipeScore. Рецепты без строки рейтинга
+        (например, загруженные import_recipes --no-rebuild до пересчета)
+        не пропадают из выдачи, а идут в конце.
+        """
+        return queryset.order_by(
+            F(f'score__{value}').desc(nulls_last=True), '-pub_date')
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import FavoriteRecipeUser, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+# Основные эндпоинты; значения подставляются из данных базы.
+READ_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/recipes/?tags={tag}',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/facets/',
+    '/api/tags/',
+    '/api/ingredients/?name={ingredient}',
+    '/api/users/subscriptions/',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+def profiles(sqlite_path):
+    """Переменные окружения профилей базы данных."""
+    return {
+        'postgresql': {'DB_ENGINE': 'foodgram.db.postgresql_pool'},
+        'sqlite': {'DB_ENGINE': 'foodgram.db.sqlite',
+                   'DB_NAME': sqlite_path},
+        'sqlite-default': {'DB_ENGINE': 'django.db.backends.sqlite3',
+                           'DB_NAME': sqlite_path},
+    }
+
+
+def client_for(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def timed(client, method, path):
+    started = time.perf_counter()
+    response = getattr(client, method)(path)
+    return time.perf_counter() - started, response.status_code
+
+
+def toggle_favorites(client, recipe_ids, count, latencies, errors):
+    """Поток записи: count раз добавить рецепт в избранное и убрать его."""
+    try:
+        for index in range(count):
+            recipe_id = recipe_ids[index % len(recipe_ids)]
+            path = f'/api/recipes/{recipe_id}/favorite/'
+            for method in ('post', 'delete'):
+                try:
+                    elapsed, status = timed(client, method, path)
+                except Exception as error:
+                    errors.append(repr(error))
+                    continue
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(f'{method.upper()} {status}')
+    finally:
+        connections.close_all()
+
+
+def summary(latencies):
+    """Медиана и 95-й процентиль в миллисекундах."""
+    if len(latencies) < 2:
+        return '-'
+    quantiles = statistics.quantiles(latencies, n=100)
+    return f'{quantiles[49] * 1000:.1f} / {quantiles[94] * 1000:.1f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение профилей базы данных (PostgreSQL, настроенный SQLite и '
+        'SQLite с настройками Django по умолчанию) на основных эндпоинтах: '
+        'задержки чтения и запись избранного из нескольких потоков. Каждый '
+        'профиль запускается в отдельном процессе; базы должны содержать '
+        'одни и те же данные. Запись меняет данные: рецепты добавляются в '
+        'избранное и убираются из него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', action='append', dest='profiles',
+            choices=sorted(profiles('')),
+            help='Профиль базы; можно указать несколько раз '
+                 '(по умолчанию postgresql и sqlite).')
+        parser.add_argument('--sqlite', default='db.sqlite3',
+                            help='Файл базы для профилей SQLite.')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Запросов к каждому эндпоинту чтения.')
+        parser.add_argument('--writers', type=int, default=4,
+                            help='Потоков, одновременно пишущих в базу.')
+        parser.add_argument('--writes', type=int, default=25,
+                            help='Добавлений в избранное на поток.')
+        parser.add_argument('--worker', action='store_true',
+                            help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.workload(options)))
+            return
+        names = options['profiles'] or ['postgresql', 'sqlite']
+        available = profiles(os.path.abspath(options['sqlite']))
+        results = {name: self.run_profile(available[name], options)
+                   for name in names}
+        self.report(names, results)
+
+    def run_profile(self, environment, options):
+        command = [
+            sys.executable, '-m', 'django', 'bench_db_backends', '--worker',
+            '--repeat', str(options['repeat']),
+            '--writers', str(options['writers']),
+            '--writes', str(options['writes']),
+        ]
+        result = subprocess.run(
+            command, capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env={**os.environ, **environment},
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def workload(self, options):
+        user = User.objects.order_by('pk').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('В базе нет пользователей или рецептов')
+        values = {
+            'recipe': Recipe.objects.order_by('pk').first().pk,
+            'tag': getattr(Tag.objects.order_by('pk').first(), 'slug', ''),
+            'ingredient': Ingredient.objects.order_by(
+                'pk').values_list('name', flat=True).first()[:3].upper(),
+        }
+        client = client_for(user)
+        reads = {}
+        for template in READ_PATHS:
+            path = template.format(**values)
+            client.get(path)
+            reads[template] = [
+                timed(client, 'get', path)[0]
+                for _ in range(options['repeat'])
+            ]
+        return {'reads': reads, 'writes': self.concurrent_writes(options)}
+
+    def concurrent_writes(self, options):
+        """
+        Потоки добавляют рецепты в избранное своих пользователей и сразу
+        убирают их: каждая операция — транзакция записи, которая
+        соперничает за блокировку базы с остальными потоками.
+        """
+        users = list(User.objects.order_by('pk')[:options['writers']])
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        jobs = []
+        for user in users:
+            favorites = set(FavoriteRecipeUser.objects.filter(
+                user=user).values_list('recipe_id', flat=True))
+            free = [pk for pk in recipe_ids if pk not in favorites]
+            if free:
+                jobs.append((client_for(user), free))
+        connections.close_all()
+        latencies, errors = [], []
+        threads = [
+            threading.Thread(target=toggle_favorites, args=(
+                *job, options['writes'], latencies, errors))
+            for job in jobs
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'latencies': latencies,
+            'elapsed': time.perf_counter() - started,
+            'errors': errors,
+        }
+
+    def report(self, names, results):
+        width = max(map(len, READ_PATHS)) + 2
+        self.stdout.write('Задержка чтения, мс (p50 / p95)')
+        self.stdout.write(
+            ''.ljust(width) + ''.join(name.ljust(18) for name in names))
+        for template in READ_PATHS:
+            self.stdout.write(template.ljust(width) + ''.join(
+                summary(results[name]['reads'][template]).ljust(18)
+                for name in names))
+        self.stdout.write('Запись избранного из нескольких потоков')
+        for name in names:
+            writes = results[name]['writes']
+            operations = len(writes['latencies'])
+            self.stdout.write(
+                f'{name}: {operations / writes["elapsed"]:.0f} операций/с, '
+                f'p50 / p95 {summary(writes["latencies"])} мс, '
+                f'ошибок {len(writes["errors"])}')
+            for error in sorted(set(writes['errors']))[:3]:
+                self.stdout.write(f'  {error}')
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+BACKENDS = {
+    'без пула': 'django.db.backends.postgresql',
+    'с пулом': 'foodgram.db.postgresql_pool',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение накладных расходов на подключение к PostgreSQL в начале '
+        'запроса: новое соединение на каждый запрос против пула.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def measure(self, wrapper, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            wrapper.connect()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options['database']].settings_dict
+        if 'postgresql' not in settings_dict['ENGINE']:
+            raise CommandError('Замер выполняется только для PostgreSQL')
+        results = {}
+        for title, engine in BACKENDS.items():
+            wrapper = load_backend(engine).DatabaseWrapper(
+                {**settings_dict, 'ENGINE': engine}, options['database'])
+            results[title] = self.measure(wrapper, options['iterations'])
+        for title, timings in results.items():
+            self.stdout.write(
+                f'{title}: среднее {statistics.mean(timings) * 1000:.3f} мс, '
+                f'медиана {statistics.median(timings) * 1000:.3f} мс')
+        saved = (statistics.mean(results['без пула'])
+                 - statistics.mean(results['с пулом']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия на запрос: {saved * 1000:.3f} мс'))
@@ -0,0 +1,116 @@
+import base64
+import io
+import json
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+
+def noise_png(megabytes, rng):
+    """PNG из шума: почти не сжимается, размер близок к заданному."""
+    side = int((megabytes * 2 ** 20 / 3) ** 0.5)
+    pixels = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение загрузки изображения рецепта строкой base64 в JSON и '
+        'файлом в multipart/form-data: медиана времени создания рецепта '
+        'и пиковая память обработки запроса (tracemalloc). Рецепты '
+        'создаются в откатываемой транзакции, файлы — во временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=float, nargs='+', default=[5, 10],
+                            help='Размеры изображений в МБ.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        tags = list(Tag.objects.values_list('pk', flat=True)[:2])
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True)[:3])
+        if not tags or not ingredients:
+            raise CommandError('Нужны хотя бы один тег и один ингредиент')
+        self.fields = {
+            'name': 'Замер загрузки изображения',
+            'text': 'Рецепт для замера загрузки изображения.',
+            'cooking_time': 10,
+            'tags': tags,
+            'ingredients': [{'id': pk, 'amount': 10} for pk in ingredients],
+        }
+        self.view = RecipeViewSet.as_view({'post': 'create'})
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                for megabytes in options['sizes']:
+                    self.compare(noise_png(megabytes, rng), options['repeat'])
+
+    def compare(self, image, repeat):
+        self.stdout.write(f'Изображение {len(image) / 2 ** 20:.1f} МБ:')
+        for label, build in (('base64', self.json_request),
+                             ('multipart', self.multipart_request)):
+            self.measure(label, build, image, repeat)
+
+    def json_request(self, image):
+        body = json.dumps({
+            **self.fields,
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(image).decode(),
+        })
+        return APIRequestFactory().generic(
+            'POST', '/api/recipes/', body, 'application/json')
+
+    def multipart_request(self, image):
+        body = encode_multipart(BOUNDARY, {
+            **self.fields,
+            'ingredients': json.dumps(self.fields['ingredients']),
+            'image': io.BytesIO(image),
+        })
+        return APIRequestFactory().generic(
+            'POST', '/api/recipes/', body, MULTIPART_CONTENT)
+
+    def measure(self, label, build, image, repeat):
+        timings = []
+        for _ in range(repeat):
+            request = build(image)
+            started = time.perf_counter()
+            self.create(request)
+            timings.append(time.perf_counter() - started)
+        request = build(image)
+        tracemalloc.start()
+        self.create(request)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = int(request.META['CONTENT_LENGTH'])
+        self.stdout.write(
+            f'  {label}: тело {size / 2 ** 20:.1f} МБ, '
+            f'медиана {statistics.median(timings) * 1000:.0f} мс, '
+            f'пик памяти {peak / 2 ** 20:.1f} МБ')
+
+    def create(self, request):
+        """Создание рецепта с откатом транзакции после ответа."""
+        with transaction.atomic():
+            author = User.objects.create(
+                username='bench_image_upload',
+                email='bench_image_upload@example.com')
+            force_authenticate(request, author)
+            response = self.view(request)
+            transaction.set_rollback(True)
+        if response.status_code != 201:
+            raise CommandError(
+                f'Ответ {response.status_code}: {response.data}')
@@ -0,0 +1,167 @@
+import asyncio
+import statistics
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+
+
+def process_tree_rss(pid):
+    """Суммарный RSS процесса и всех его потомков (в килобайтах)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        proc = Path('/proc', str(current))
+        try:
+            for line in (proc / 'status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1])
+            for task in (proc / 'task').iterdir():
+                pending.extend(
+                    int(child)
+                    for child in (task / 'children').read_text().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+async def read_response(reader, method='GET'):
+    """
+    Чтение HTTP/1.1 ответа на запрос method (Content-Length или chunked).
+    Возвращает код ответа, признак того, что сервер оставил соединение
+    открытым, и тело. У ответов на HEAD и ответов 1xx, 204 и 304 тела нет,
+    даже если указан Content-Length.
+    """
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    body = b''
+    if method == 'HEAD' or status < 200 or status in (204, 304):
+        pass
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            body += (await reader.readexactly(size + 2))[:size]
+            if not size:
+                break
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close', body
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное сравнение эндпоинтов чтения: пропускная способность, '
+        'задержки и память сервера на одно соединение. Запускается против '
+        'работающего сервера (gunicorn WSGI или ASGI).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь эндпоинта; можно указать несколько раз.')
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization.')
+        parser.add_argument(
+            '--pid', type=int,
+            help='PID мастер-процесса сервера для замера RSS.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            '/api/recipes/', '/api/recipes/?page=2', '/api/tags/',
+            '/api/ingredients/?name=%D0%B0',
+        ]
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть больше 0')
+        result = asyncio.run(self.run(paths, options))
+        self.report(result, options)
+
+    async def worker(self, host, port, requests, deadline, stats):
+        index = 0
+        connected = False
+        while time.monotonic() < deadline:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                stats['errors'] += 1
+                return
+            if not connected:
+                connected = True
+                stats['connected'] += 1
+            try:
+                keep_alive = True
+                while keep_alive and time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    writer.write(requests[index % len(requests)])
+                    status, keep_alive, _ = await read_response(reader)
+                    stats['latencies'].append(
+                        time.perf_counter() - started)
+                    if status >= 400:
+                        stats['errors'] += 1
+                    index += 1
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                stats['errors'] += 1
+            finally:
+                writer.close()
+
+    async def run(self, paths, options):
+        url = urlsplit(options['base_url'])
+        host, port = url.hostname, url.port or 80
+        auth = (
+            f'Authorization: Token {options["token"]}\r\n'
+            if options['token'] else ''
+        )
+        requests = [
+            (f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+             f'{auth}Connection: keep-alive\r\n\r\n').encode()
+            for path in paths
+        ]
+        stats = {'latencies': [], 'errors': 0, 'connected': 0}
+        pid = options['pid']
+        rss_before = process_tree_rss(pid) if pid else None
+        started = time.monotonic()
+        deadline = started + options['duration']
+        tasks = [
+            asyncio.create_task(
+                self.worker(host, port, requests, deadline, stats))
+            for _ in range(options['concurrency'])
+        ]
+        await asyncio.sleep(min(options['duration'] / 2, 5))
+        rss_loaded = process_tree_rss(pid) if pid else None
+        await asyncio.gather(*tasks)
+        stats['elapsed'] = time.monotonic() - started
+        stats['rss_before'] = rss_before
+        stats['rss_loaded'] = rss_loaded
+        return stats
+
+    def report(self, stats, options):
+        latencies = sorted(stats['latencies'])
+        total = len(latencies)
+        self.stdout.write(
+            f'Соединений: {stats["connected"]}/{options["concurrency"]}, '
+            f'запросов: {total}, ошибок: {stats["errors"]}')
+        if total > 1:
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'Пропускная способность: {total / stats["elapsed"]:.1f} rps')
+            self.stdout.write(
+                'Задержка, мс: '
+                f'p50={quantiles[49] * 1000:.1f} '
+                f'p95={quantiles[94] * 1000:.1f} '
+                f'p99={quantiles[98] * 1000:.1f}')
+        if stats['rss_before'] is not None and stats['connected']:
+            delta = stats['rss_loaded'] - stats['rss_before']
+            self.stdout.write(
+                f'RSS сервера: {stats["rss_before"]} КБ -> '
+                f'{stats["rss_loaded"]} КБ, '
+                f'{delta / stats["connected"]:.1f} КБ на соединение')
@@ -0,0 +1,131 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from api.compiled import compile_many
+from api.serializers import (
+    FollowSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+)
+from api.utils import recipe_queryset
+from recipes.models import Ingredient
+from users.models import Follow, User
+
+# Варианты ответа списка рецептов: полное представление и ?fields=/?expand=.
+RECIPE_QUERIES = (
+    '',
+    '?fields=id,name,image,cooking_time',
+    '?expand=author',
+    '?fields=id,author,tags,ingredients',
+    '?fields=tags,ingredients,is_favorited&expand=ingredients',
+)
+
+
+def make_request(query, user):
+    request = RequestFactory().get(f'/api/recipes/{query}')
+    request.user = user
+    return request
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение собранных списков (api/compiled.py) с сериализаторами '
+        'DRF для рецептов, подписок и ингредиентов: сначала проверяется, '
+        'что JSON совпадает байт в байт для анонима и нескольких '
+        'пользователей и вариантов ?fields=/?expand=, затем измеряется '
+        'скорость сериализации страницы. Код возврата ненулевой при '
+        'расхождении.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size', type=int, action='append', dest='page_sizes',
+            help='Объектов на странице; можно указать несколько раз '
+                 '(по умолчанию PAGE_SIZE и 100).')
+        parser.add_argument('--users', type=int, default=3,
+                            help='Пользователей, от имени которых ответы.')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Сериализаций страницы на замер.')
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить совпадение ответов.')
+
+    def handle(self, *args, **options):
+        page_sizes = options['page_sizes'] or [settings.PAGE_SIZE, 100]
+        users = [AnonymousUser(), *User.objects.filter(
+            follower__isnull=False).distinct().order_by('pk')[
+                :options['users']]]
+        compared = self.compare(users, max(page_sizes))
+        self.stdout.write(self.style.SUCCESS(
+            f'Ответы совпадают байт в байт: {compared} списков'))
+        if options['check']:
+            return
+        self.stdout.write('Сериализация страницы, страниц/с '
+                          '(DRF -> собранный список, ускорение)')
+        for page_size in page_sizes:
+            for name, serializer, objects in self.cases(
+                    users[-1], '', page_size):
+                self.benchmark(name, serializer, objects, options['repeat'])
+
+    def cases(self, user, query, limit):
+        """Списки для сравнения: (название, сериализатор, объекты)."""
+        request = make_request(query, user)
+        context = {'request': request}
+        recipes = list(recipe_queryset(request)[:limit])
+        yield (f'recipes{query} ({len(recipes)})',
+               RecipeSerializer(recipes, many=True, context=context), recipes)
+        if query:
+            return
+        if user.is_authenticated:
+            follows = list(Follow.objects.subscriptions_of(user)[:limit])
+            yield (f'subscriptions ({len(follows)})',
+                   FollowSerializer(follows, many=True, context=context),
+                   follows)
+        ingredients = list(Ingredient.objects.all()[:limit])
+        yield (f'ingredients ({len(ingredients)})',
+               IngredientSerializer(ingredients, many=True, context=context),
+               ingredients)
+
+    def compare(self, users, limit):
+        compared = 0
+        for user in users:
+            for query in RECIPE_QUERIES:
+                for name, serializer, objects in self.cases(
+                        user, query, limit):
+                    expected = render(serializers.ListSerializer
+                                      .to_representation(serializer, objects))
+                    actual = render(
+                        compile_many(serializer.child)(objects))
+                    if actual != expected:
+                        raise CommandError(
+                            f'{name}, пользователь {user}: ответы '
+                            f'различаются\nDRF: {expected[:500]!r}\n'
+                            f'собранный: {actual[:500]!r}')
+                    compared += 1
+        return compared
+
+    def benchmark(self, name, serializer, objects, repeat):
+        rates = []
+        for represent in (
+            lambda: serializers.ListSerializer.to_representation(
+                serializer, objects),
+            # Сборка функций полей входит в замер: она выполняется на
+            # каждый ответ.
+            lambda: compile_many(serializer.child)(objects),
+        ):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                represent()
+            rates.append(repeat / (time.perf_counter() - started))
+        self.stdout.write(
+            f'{name}: {rates[0]:.0f} -> {rates[1]:.0f} '
+            f'(x{rates[1] / rates[0]:.1f})')
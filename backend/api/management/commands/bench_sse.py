@@ -0,0 +1,193 @@
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+
+from api.events import PATH, stream
+from foodgram.events import broker
+
+REQUEST = (f'GET {PATH}?recipes=1 HTTP/1.1\r\nHost: bench\r\n'
+           'Accept: text/event-stream\r\n\r\n').encode()
+
+
+def raise_open_files_limit():
+    """Мягкий лимит открытых файлов до жесткого; наследуется сервером."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def resident_memory(pid):
+    """VmRSS процесса в килобайтах (только Linux)."""
+    for line in Path(f'/proc/{pid}/status').read_text().splitlines():
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1])
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def forked_epoch():
+    """Эпоха брокера в дочернем процессе, созданном fork."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        os.write(write, broker.epoch.encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read, 'rb') as pipe:
+        epoch = pipe.read().decode()
+    os.waitpid(pid, 0)
+    return epoch
+
+
+async def connect(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(REQUEST)
+    head = await reader.readuntil(b'\r\n\r\n')
+    if not head.startswith(b'HTTP/1.1 200'):
+        raise CommandError(head.decode('latin-1').splitlines()[0])
+    return reader, writer
+
+
+async def heard_ping(reader, timeout):
+    try:
+        while b': ping' not in await asyncio.wait_for(
+                reader.read(4096), timeout):
+            pass
+    except (asyncio.TimeoutError, OSError):
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка потока /api/events/: открывает много '
+        'простаивающих SSE-соединений к отдельному процессу uvicorn и '
+        'показывает память сервера на соединение и доставку пингов, а '
+        'также время раздачи события подписчикам внутри процесса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000,
+                            help='Число одновременных соединений.')
+        parser.add_argument('--heartbeat', type=float, default=2,
+                            help='Интервал пингов сервера в секундах.')
+        parser.add_argument('--subscribers', type=int, default=10000,
+                            help='Подписчиков при замере раздачи события.')
+
+    def handle(self, *args, **options):
+        self.check_epochs()
+        limit = raise_open_files_limit()
+        if options['connections'] + 100 > limit:
+            raise CommandError(
+                f'Лимит открытых файлов {limit} меньше числа соединений')
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'foodgram.asgi:application',
+             '--port', str(port), '--log-level', 'warning',
+             '--no-access-log'],
+            env={**os.environ, 'EVENTS_HEARTBEAT': str(options['heartbeat']),
+                 'EVENTS_BACKEND': 'local'},
+        )
+        try:
+            asyncio.run(self.idle_connections(
+                server.pid, port, options['connections'],
+                options['heartbeat']))
+        finally:
+            server.terminate()
+            server.wait()
+        asyncio.run(self.fan_out(options['subscribers']))
+
+    def check_epochs(self):
+        """
+        Воркеры gunicorn с preload — fork мастера, импортировавшего брокер;
+        у каждого должна быть своя эпоха, иначе Last-Event-ID чужого
+        воркера примется за свой.
+        """
+        epochs = {broker.epoch, forked_epoch(), forked_epoch()}
+        if len(epochs) != 3:
+            raise CommandError(f'Эпохи брокера совпадают после fork: {epochs}')
+        self.stdout.write('Эпохи брокера после fork различаются')
+
+    async def wait_ready(self, port):
+        for _ in range(100):
+            try:
+                _, writer = await connect(port)
+            except OSError:
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            return
+        raise CommandError('Сервер не запустился')
+
+    async def idle_connections(self, server_pid, port, count, heartbeat):
+        await self.wait_ready(port)
+        await asyncio.sleep(0.5)
+        before = resident_memory(server_pid)
+        started = time.perf_counter()
+        streams = []
+        for start in range(0, count, 200):
+            streams += await asyncio.gather(*(
+                connect(port) for _ in range(start, min(count, start + 200))))
+        opened = time.perf_counter() - started
+        await asyncio.sleep(heartbeat)
+        after = resident_memory(server_pid)
+        alive = sum(await asyncio.gather(*(
+            heard_ping(reader, heartbeat * 2 + 1)
+            for reader, _ in streams)))
+        for _, writer in streams:
+            writer.close()
+        self.stdout.write(
+            f'Соединений: {count}, открыты за {opened:.2f} с; RSS сервера '
+            f'{before / 1024:.1f} -> {after / 1024:.1f} МБ, '
+            f'{(after - before) / count:.1f} КБ на соединение')
+        self.stdout.write(f'Получили пинг за {heartbeat * 2 + 1:.0f} с: '
+                          f'{alive} из {count}')
+
+    async def fan_out(self, count):
+        """
+        Раздача одного события count подписчикам одного канала в этом
+        процессе: время от публикации до отправки последнему подписчику.
+        """
+        delivered = []
+        done = asyncio.Event()
+        disconnect = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            await disconnect
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if b'event: bench' in message.get('body', b''):
+                delivered.append(time.perf_counter())
+                if len(delivered) == count:
+                    done.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': PATH,
+                 'query_string': b'recipes=0', 'headers': []}
+        streams = [asyncio.ensure_future(stream(scope, receive, send))
+                   for _ in range(count)]
+        while sum(len(subscribers)
+                  for subscribers in broker.subscribers.values()) < count:
+            await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        broker.dispatch({'type': 'bench', 'channels': ['recipe:0'],
+                         'data': {}})
+        await asyncio.wait_for(done.wait(), 60)
+        self.stdout.write(
+            f'Раздача события {count} подписчикам: последний получил через '
+            f'{(max(delivered) - started) * 1000:.1f} мс')
+        disconnect.set_result(None)
+        await asyncio.gather(*streams)
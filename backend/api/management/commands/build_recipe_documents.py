@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+from api.documents import build_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение заранее сериализованных документов рецептов, '
+        'у которых документа нет (или всех рецептов с --all).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить документы всех рецептов.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(document__isnull=True)
+        ids = list(recipes.values_list('pk', flat=True))
+        built = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            built += len(build_documents(ids[start:start + batch_size]))
+        self.stdout.write(
+            self.style.SUCCESS(f'Построено документов: {built}'))
@@ -0,0 +1,84 @@
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from rest_framework.authtoken.models import Token
+
+from foodgram.db.nplusone import detect, format_issues, install
+from recipes.models import Recipe
+from users.models import User
+
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=20',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/{recipe}/similar/',
+    '/api/users/',
+    '/api/users/{user}/',
+    '/api/users/me/',
+    '/api/users/subscriptions/',
+    '/api/users/suggestions/',
+    '/api/tags/',
+    '/api/ingredients/?name=а',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка эндпоинтов API на N+1 запросы: каждый путь выполняется '
+        'через представление, повторы запросов одного вида из одного поля '
+        'сериализатора выводятся со стеком. Готовые документы рецептов '
+        'отключаются, чтобы проверялись сериализаторы. Код возврата '
+        'ненулевой, если найдены N+1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь эндпоинта; можно указать несколько раз.')
+        parser.add_argument('--email',
+                            help='Пользователь, от имени которого запросы.')
+        parser.add_argument('--threshold', type=int)
+
+    def handle(self, *args, **options):
+        install()
+        headers = {}
+        if options['email']:
+            email = options['email']
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден')
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        found = 0
+        with override_settings(RECIPE_DOCUMENTS=False):
+            for path in self.paths(options['paths']):
+                found += self.inspect(path, headers, options['threshold'])
+        if found:
+            raise CommandError(f'Найдено N+1: {found}')
+        self.stdout.write(self.style.SUCCESS('N+1 запросов не найдено'))
+
+    def paths(self, paths):
+        recipe = Recipe.objects.order_by('pk').first()
+        user = User.objects.order_by('pk').first()
+        return [
+            path.format(recipe=getattr(recipe, 'pk', 0),
+                        user=getattr(user, 'pk', 0))
+            for path in paths or PATHS
+        ]
+
+    def inspect(self, path, headers, threshold):
+        match = resolve(urlsplit(path).path)
+        request = RequestFactory().get(path, **headers)
+        with detect(threshold) as collector:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        issues = collector.issues()
+        queries = sum(collector.counts.values())
+        self.stdout.write(
+            f'{path}: {response.status_code}, SELECT-запросов {queries}')
+        if issues:
+            self.stdout.write(self.style.WARNING(format_issues(issues)))
+        return len(issues)
@@ -0,0 +1,312 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import yaml
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from .bench_read_path import read_response
+
+# Формат combined, который nginx использует без собственного log_format.
+LOG_LINE = re.compile(
+    r'^\S+ \S+ \S+ \[[^\]]+\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" '
+    r'\d{3} ')
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+# Тела запросов в журнал не попадают, поэтому воспроизводятся только
+# безопасные методы.
+REPLAYED_METHODS = {'GET', 'HEAD'}
+LOGIN_PATH = '/api/auth/token/login/'
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+CONNECTION_ERRORS = (OSError, asyncio.IncompleteReadError, ValueError)
+
+
+def route_of(path):
+    """Маршрут запроса: путь без параметров, числа заменены на {id}."""
+    return ID_SEGMENT.sub('/{id}', urlsplit(path).path)
+
+
+def log_requests(path, prefix):
+    """Запросы из access.log nginx и число пропущенных строк."""
+    requests, skipped = [], 0
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            match = LOG_LINE.match(line)
+            if (match and match['method'] in REPLAYED_METHODS
+                    and match['path'].startswith(prefix)
+                    and not match['path'].startswith(LOGIN_PATH)):
+                requests.append((match['method'], match['path']))
+            else:
+                skipped += 1
+    return requests, skipped
+
+
+def parameter_value(parameter):
+    """Значение параметра запроса: пример из схемы или значение по типу."""
+    schema = parameter.get('schema', {})
+    for source in (parameter, schema):
+        if 'example' in source:
+            value = source['example']
+            # Пример массива записан строкой вида 'lunch&tags=breakfast'.
+            if schema.get('type') == 'array' and isinstance(value, str):
+                return value.split(f'&{parameter["name"]}=')
+            return value
+    if schema.get('enum'):
+        return schema['enum'][0]
+    return {'integer': 1, 'boolean': 'true'}.get(schema.get('type'), 'а')
+
+
+def schema_operations(path):
+    """GET-операции OpenAPI-схемы: шаблон пути и параметры запроса."""
+    with open(path, encoding='utf-8') as file:
+        schema = yaml.safe_load(file)
+    for template, item in schema['paths'].items():
+        if 'get' in item:
+            yield template, {
+                parameter['name']: parameter_value(parameter)
+                for parameter in item['get'].get('parameters', [])
+                if parameter.get('in') == 'query'
+            }
+
+
+def percentile(values, fraction):
+    """Процентиль по рангу для отсортированного списка."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summary(latencies, statuses, errors):
+    latencies = sorted(latencies)
+    count = sum(statuses.values())
+    report = {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+    }
+    if latencies:
+        report.update({
+            f'{name}_ms': round(percentile(latencies, fraction) * 1000, 2)
+            for name, fraction in QUANTILES.items()
+        })
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест работающего сервера. Запросы воспроизводятся '
+        'из access.log nginx (--log) или строятся по GET-операциям '
+        'OpenAPI-схемы (--schema) и отправляются заданным числом '
+        'параллельных соединений. Отчет — задержки p50/p95/p99 и доля '
+        'ошибок по маршрутам; --report сохраняет его в JSON для сравнения '
+        'сборок (--baseline).'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--log', help='Файл access.log nginx.')
+        source.add_argument(
+            '--schema',
+            default=str(Path(settings.BASE_DIR).parent / 'docs'
+                        / 'openapi-schema.yml'),
+            help='OpenAPI-схема (по умолчанию docs/openapi-schema.yml).')
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--prefix', default='/api/',
+                            help='Воспроизводить только пути с префиксом.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--requests', type=int,
+            help='Всего запросов; по умолчанию каждый запрос один раз.')
+        parser.add_argument('--duration', type=float,
+                            help='Ограничение длительности в секундах.')
+        parser.add_argument('--ids', type=int, default=20,
+                            help='Объектов на шаблон пути с {id} из схемы.')
+        parser.add_argument('--email', help='Email для входа.')
+        parser.add_argument('--password', help='Пароль для входа.')
+        parser.add_argument('--report', help='Файл JSON-отчета.')
+        parser.add_argument('--baseline',
+                            help='JSON-отчет предыдущей сборки.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть больше 0')
+        url = urlsplit(options['base_url'])
+        self.address = url.hostname, url.port or 80
+        self.netloc = url.netloc
+        report = asyncio.run(self.main(options))
+        self.print_report(report)
+        if options['report']:
+            Path(options['report']).write_text(json.dumps(
+                report, ensure_ascii=False, indent=2, sort_keys=True))
+        if options['baseline']:
+            self.compare(report, json.loads(
+                Path(options['baseline']).read_text()))
+
+    async def main(self, options):
+        self.token = None
+        if options['email']:
+            self.token = await self.login(
+                options['email'], options['password'] or '')
+        if options['log']:
+            requests, skipped = log_requests(
+                options['log'], options['prefix'])
+            source = {'log': options['log'], 'skipped_lines': skipped}
+        else:
+            requests = await self.schema_requests(
+                options['schema'], options['ids'])
+            source = {'schema': options['schema']}
+        if not requests:
+            raise CommandError('Нет запросов для воспроизведения')
+        prepared = [
+            (f'{method} {route_of(path)}', method, self.request(method, path))
+            for method, path in requests
+        ]
+        report = await self.run(prepared, options)
+        report.update(source=source, base_url=options['base_url'],
+                      concurrency=options['concurrency'],
+                      authenticated=self.token is not None)
+        return report
+
+    def request(self, method, path, body=None):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.netloc}',
+                 'Connection: keep-alive']
+        if self.token:
+            lines.append(f'Authorization: Token {self.token}')
+        if body is not None:
+            lines += ['Content-Type: application/json',
+                      f'Content-Length: {len(body)}']
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b'')
+
+    async def fetch(self, data):
+        """Отдельный запрос вне замера; возвращает код и тело ответа."""
+        reader, writer = await asyncio.open_connection(*self.address)
+        try:
+            writer.write(data)
+            status, _, body = await read_response(reader)
+        finally:
+            writer.close()
+        return status, body
+
+    async def login(self, email, password):
+        body = json.dumps({'email': email, 'password': password}).encode()
+        status, response = await self.fetch(
+            self.request('POST', LOGIN_PATH, body))
+        if status not in (200, 201):
+            raise CommandError(f'Вход не выполнен: {status} {response!r}')
+        return json.loads(response)['auth_token']
+
+    async def object_ids(self, collection, limit):
+        """Идентификаторы объектов из списка по адресу collection."""
+        status, body = await self.fetch(
+            self.request('GET', f'{collection}?limit={limit}'))
+        if status != 200:
+            return []
+        data = json.loads(body)
+        items = data['results'] if isinstance(data, dict) else data
+        return [item['id'] for item in items[:limit]]
+
+    async def schema_requests(self, schema, limit):
+        requests = []
+        for template, query in schema_operations(schema):
+            paths = [template]
+            if '{id}' in template:
+                ids = await self.object_ids(template.split('{id}')[0], limit)
+                paths = [template.replace('{id}', str(pk)) for pk in ids]
+            for path in paths:
+                requests.append(('GET', path))
+                if query:
+                    requests.append(
+                        ('GET', f'{path}?{urlencode(query, doseq=True)}'))
+        return requests
+
+    async def run(self, requests, options):
+        self.stats = defaultdict(
+            lambda: {'latencies': [], 'statuses': Counter(), 'errors': 0})
+        self.total = options['requests'] or len(requests)
+        self.counter = itertools.count()
+        started = time.monotonic()
+        self.deadline = started + (options['duration'] or float('inf'))
+        await asyncio.gather(*(
+            self.worker(requests) for _ in range(options['concurrency'])))
+        elapsed = time.monotonic() - started
+        routes = {
+            route: summary(**stats) for route, stats in self.stats.items()}
+        total = summary(
+            [value for stats in self.stats.values()
+             for value in stats['latencies']],
+            sum((stats['statuses'] for stats in self.stats.values()),
+                Counter()),
+            sum(stats['errors'] for stats in self.stats.values()),
+        )
+        total['duration_s'] = round(elapsed, 2)
+        total['rps'] = round(total['requests'] / elapsed, 1)
+        return {'routes': routes, 'total': total}
+
+    def next_request(self, requests):
+        index = next(self.counter)
+        if index >= self.total or time.monotonic() > self.deadline:
+            return None
+        return requests[index % len(requests)]
+
+    async def worker(self, requests):
+        """Соединение, по которому запросы отправляются по очереди."""
+        writer = None
+        while True:
+            item = self.next_request(requests)
+            if item is None:
+                break
+            route, method, data = item
+            stats = self.stats[route]
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        *self.address)
+                started = time.perf_counter()
+                writer.write(data)
+                status, keep_alive, _ = await read_response(reader, method)
+            except CONNECTION_ERRORS:
+                stats['statuses']['connection_error'] += 1
+                stats['errors'] += 1
+                keep_alive = False
+            else:
+                stats['latencies'].append(time.perf_counter() - started)
+                stats['statuses'][str(status)] += 1
+                stats['errors'] += status >= 400
+            if not keep_alive and writer is not None:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    def print_report(self, report):
+        total = report['total']
+        self.stdout.write(
+            f'Запросов: {total["requests"]} за {total["duration_s"]} с '
+            f'({total["rps"]} rps), ошибок: {total["errors"]}')
+        self.stdout.write(
+            f'{"маршрут":<48} {"запросов":>8} {"ошибки":>7} '
+            f'{"p50":>8} {"p95":>8} {"p99":>8}')
+        for route, stats in sorted(report['routes'].items()):
+            self.stdout.write(
+                f'{route:<48} {stats["requests"]:>8} '
+                f'{stats["error_rate"]:>7.1%} '
+                + ' '.join(
+                    f'{stats.get(f"{name}_ms", 0):>8.1f}'
+                    for name in QUANTILES))
+
+    def compare(self, report, baseline):
+        """Изменение p95 и доли ошибок относительно предыдущего отчета."""
+        self.stdout.write('Сравнение с предыдущим отчетом (p95, ошибки):')
+        for route, stats in sorted(report['routes'].items()):
+            old = baseline.get('routes', {}).get(route)
+            if not (old and old.get('p95_ms') and 'p95_ms' in stats):
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms']
+            self.stdout.write(
+                f'{route:<48} {old["p95_ms"]:>8.1f} -> '
+                f'{stats["p95_ms"]:>8.1f} мс ({change:+.0%}), '
+                f'{old["error_rate"]:.1%} -> {stats["error_rate"]:.1%}')
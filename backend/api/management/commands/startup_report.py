@@ -0,0 +1,144 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve
+
+from foodgram.warmup import freeze, warm_up
+
+# Холодный старт процесса, как у воркера без preload.
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - started
+from foodgram.warmup import warm_up
+timings = warm_up()
+print(json.dumps({
+    'setup': setup,
+    'warm_up': dict(timings),
+    'total': time.perf_counter() - started,
+}))
+'''
+
+# Запросы, которые выполняет воркер после fork при замере памяти.
+WORKLOAD = ('/api/tags/', '/api/ingredients/?name=а', '/api/recipes/')
+
+SMAPS = Path('/proc/self/smaps_rollup')
+
+
+def memory():
+    """Итоги /proc/self/smaps_rollup в килобайтах (только Linux)."""
+    values = {}
+    for line in SMAPS.read_text().splitlines()[1:]:
+        name, value = line.split(':', 1)
+        values[name] = int(value.split()[0])
+    return values
+
+
+def import_times(stderr):
+    """Собственное время импорта (мкс) по пакетам верхнего уровня."""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(own)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Отчет о запуске воркера: время импорта по пакетам, длительность '
+        'django.setup() и шагов прогрева, а также время запуска и '
+        'собственная память воркера, созданного через fork из прогретого '
+        'процесса, без заморозки объектов и с gc.freeze().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15,
+                            help='Число пакетов в отчете об импорте.')
+
+    def handle(self, *args, **options):
+        self.cold_start(options['top'])
+        if not SMAPS.exists():
+            self.stdout.write(
+                'Замер памяти воркеров требует /proc/self/smaps_rollup')
+            return
+        warm_up()
+        self.stdout.write(
+            f'RSS прогретого мастера: {memory()["Rss"] / 1024:.1f} МБ')
+        self.fork_worker('без заморозки')
+        freeze()
+        self.fork_worker('после gc.freeze()')
+
+    def cold_start(self, top):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', COLD_START],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        report = json.loads(result.stdout.splitlines()[-1])
+        totals = import_times(result.stderr)
+        self.stdout.write(
+            f'Холодный старт: {report["total"] * 1000:.0f} мс, из них '
+            f'django.setup() {report["setup"] * 1000:.0f} мс')
+        self.stdout.write('Прогрев: ' + ', '.join(
+            f'{name} {seconds * 1000:.0f} мс'
+            for name, seconds in report['warm_up'].items()))
+        self.stdout.write(
+            f'Импорт: {sum(totals.values()) / 1000:.0f} мс, по пакетам:')
+        for name, microseconds in totals.most_common(top):
+            self.stdout.write(f'  {name:<28} {microseconds / 1000:8.1f} мс')
+
+    def fork_worker(self, label):
+        """
+        Запуск воркера через fork: время до готовности после выполнения
+        тестовых запросов и сборки мусора и его собственная (не общая с
+        мастером) память.
+        """
+        read, write = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            try:
+                self.work()
+                report = {'ready': time.perf_counter() - started,
+                          'memory': memory()}
+            except Exception as error:
+                report = {'error': repr(error)}
+            with os.fdopen(write, 'w') as pipe:
+                json.dump(report, pipe)
+            os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as pipe:
+            report = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        if 'error' in report:
+            raise CommandError(f'Воркер {label}: {report["error"]}')
+        private = (report['memory']['Private_Clean']
+                   + report['memory']['Private_Dirty'])
+        self.stdout.write(
+            f'Воркер {label}: готов через {report["ready"] * 1000:.0f} мс, '
+            f'собственная память {private / 1024:.1f} МБ, '
+            f'PSS {report["memory"]["Pss"] / 1024:.1f} МБ')
+
+    def work(self):
+        factory = RequestFactory()
+        for path in WORKLOAD:
+            match = resolve(path.split('?')[0])
+            response = match.func(
+                factory.get(path), *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        gc.collect()
@@ -0,0 +1,14 @@
+from rest_framework.parsers import FileUploadParser
+
+
+class ImageUploadParser(FileUploadParser):
+    """
+    Изображение в теле запроса (Content-Type: image/*). Файл читается
+    обработчиками загрузки Django: крупный файл пишется во временный файл
+    на диске, а не собирается в памяти. Имя файла необязательно.
+    """
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super().get_filename(
+            stream, media_type, parser_context) or 'image'
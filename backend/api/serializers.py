@@ -1,9 +1,12 @@
+import json
+
 from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.db.transaction import atomic
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import relations, serializers
+from rest_framework.utils import html
 
 from recipes.models import (
     FavoriteRecipeUser,
@@ -13,8 +16,72 @@ from recipes.models import (
     ShoppingCartUser,
     Tag,
 )
+from recipes.similarity import flag_duplicates, near_duplicates
 from users.models import Follow, User
 
+from .compiled import CompiledListSerializer, compile_many
+from .fields import RecipeImageField
+
+
+class SparseFieldsetsMixin:
+    """
+    Сокращение ответа по параметрам запроса:
+    - ?fields=id,name — в ответ попадают только перечисленные поля;
+    - ?expand=author,tags — вложенные объекты, которые нужно развернуть.
+    Если указан хотя бы один из параметров, неразвернутые вложенные объекты
+    из collapsed_fields возвращаются в виде идентификаторов. Параметры
+    действуют только на корневой сериализатор ответа.
+    """
+    collapsed_fields = {}
+
+    @staticmethod
+    def sparse_params(request):
+        if request is None:
+            return None
+        params = getattr(request, 'query_params', None) or request.GET
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        only, expand = (
+            {name.strip() for name in params.get(key, '').split(',')
+             if name.strip()}
+            for key in ('fields', 'expand')
+        )
+        return only or None, expand
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        Поля, которые попадут в ответ: имя поля -> будет ли вложенный
+        объект развернут.
+        """
+        sparse = cls.sparse_params(request)
+        if sparse is None:
+            return dict.fromkeys(cls.Meta.fields, True)
+        only, expand = sparse
+        return {
+            name: name not in cls.collapsed_fields or name in expand
+            for name in cls.Meta.fields
+            if only is None or name in only
+        }
+
+    def is_response_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_response_root():
+            return fields
+        requested = self.requested_fields(self.context.get('request'))
+        return {
+            name: (field if requested[name]
+                   else self.collapsed_fields[name]())
+            for name, field in fields.items()
+            if name in requested
+        }
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тэга."""
@@ -34,9 +101,10 @@ class IngredientSerializer(serializers.ModelSerializer):
             'name',
             'measurement_unit'
         )
+        list_serializer_class = CompiledListSerializer
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsetsMixin, UserSerializer):
     """
     Определение логики сериализации объектов кастомной модели
     пользователя.
@@ -55,6 +123,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if getattr(obj, 'is_subscribed', None) is not None:
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (user.is_authenticated
                 and obj.following.filter(user=user).exists())
@@ -77,6 +147,16 @@ class RecipeInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
+def compiled_author_recipes(serializer):
+    """
+    Рецепты автора для собранного списка подписок (api/compiled.py):
+    сериализатор рецептов собирается один раз на список, а не для каждой
+    подписки, как в get_recipes.
+    """
+    represent = compile_many(RecipeInfoSerializer())
+    return lambda follow: represent(follow.author.recipes.all())
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """
        Определение логики сериализации для объектов модели
@@ -90,6 +170,7 @@ class FollowSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
+    compiled_fields = {'recipes': compiled_author_recipes}
 
     class Meta(CustomUserSerializer.Meta):
         model = Follow
@@ -97,22 +178,22 @@ class FollowSerializer(serializers.ModelSerializer):
             'id', 'first_name', 'last_name', 'username', 'email',
             'is_subscribed',
             'recipes', 'recipes_count')
+        list_serializer_class = CompiledListSerializer
 
     def get_is_subscribed(self, obj):
+        if getattr(obj, 'is_subscribed', None) is not None:
+            return obj.is_subscribed
         return Follow.objects.filter(
             user=self.context.get('request').user,
             author=obj.author
         ).exists()
 
     def get_recipes(self, attrs):
-        author = attrs.author
-        all_recipes = Recipe.objects.filter(author=author)
+        all_recipes = attrs.author.recipes.all()
         return RecipeInfoSerializer(all_recipes, many=True).data
 
     def get_recipes_count(self, attrs):
-        author = attrs.author
-        all_recipes = Recipe.objects.filter(author=author)
-        return all_recipes.count()
+        return attrs.author.recipes.count()
 
     def validate(self, attrs):
         author = self.context.get('author')
@@ -146,11 +227,22 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     """
     Определение логики сериализации для чтения (отображения) объектов модели
     рецептов.
     """
+    collapsed_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            read_only=True, many=True),
+        'ingredients': lambda: serializers.SlugRelatedField(
+            slug_field='ingredient_id',
+            source='recipe_ingredients',
+            read_only=True,
+            many=True,
+        ),
+    }
     author = CustomUserSerializer(many=False, read_only=True)
     ingredients = IngredientRecipeSerializer(
         read_only=True,
@@ -168,17 +260,22 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorited', 'is_in_shopping_cart', 'name',
             'image', 'text', 'cooking_time',
         )
+        list_serializer_class = CompiledListSerializer
 
     def get_is_favorited(self, recipe):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if getattr(recipe, 'is_favorited', None) is not None:
+            return recipe.is_favorited
         return user.favorites.filter(recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if getattr(recipe, 'is_in_shopping_cart', None) is not None:
+            return recipe.is_in_shopping_cart
         return user.shopping_card.filter(recipe=recipe).exists()
 
 
@@ -198,7 +295,9 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
 class RecipePostSerializer(serializers.ModelSerializer):
     """
     Определение логики сериализации для записи объектов модели рецептов.
-    - Запись изображение осуществляется в кодированном (base64) формате.
+    - Изображение передается строкой base64 в JSON или файлом в
+    multipart/form-data; в multipart теги перечисляются повторяющимся
+    полем tags, а ингредиенты передаются JSON-списком в поле ingredients.
     - Список тегов и ингредиентов устанавливается через идентификаторы ('id')
     объектов этих моделей.
     """
@@ -206,7 +305,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         queryset=Tag.objects.all(), many=True
     )
     ingredients = IngredientAmountSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -235,6 +334,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
                 ingredient=ingredient.get('id'),
                 recipe=recipe,
                 amount=ingredient.get('amount'))
+        flag_duplicates(recipe, self.near_duplicates)
         return recipe
 
     @atomic
@@ -253,8 +353,28 @@ class RecipePostSerializer(serializers.ModelSerializer):
                 recipe=instance,
                 amount=ingredient.get('amount'))
         instance.save()
+        flag_duplicates(instance, self.near_duplicates)
         return instance
 
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = self.multipart_data(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def multipart_data(data):
+        """Поля multipart/form-data в виде, принятом для JSON."""
+        values = {key: data.get(key) for key in data}
+        if 'tags' in data:
+            values['tags'] = data.getlist('tags')
+        if isinstance(values.get('ingredients'), str):
+            try:
+                values['ingredients'] = json.loads(values['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'ingredients': 'Ожидается JSON-список ингредиентов.'})
+        return values
+
     def validate(self, attrs):
         ingredients = attrs.get('ingredients', [])
         ingredients_id = []
@@ -269,8 +389,24 @@ class RecipePostSerializer(serializers.ModelSerializer):
             if not amount > 0:
                 raise serializers.ValidationError(
                     {"amount": "значение количества должно быть > 0"})
+        self.near_duplicates = self.find_near_duplicates(attrs)
         return attrs
 
+    def find_near_duplicates(self, attrs):
+        """
+        Поиск почти-дубликатов рецепта среди рецептов всех авторов.
+        Найденные рецепты не мешают сохранению, а попадают в отчет
+        «Возможные дубликаты» в админке.
+        """
+        instance = self.instance
+        return near_duplicates(
+            [item['id'].pk for item in attrs.get('ingredients', [])],
+            [tag.pk for tag in attrs.get('tags', [])],
+            attrs.get('name', getattr(instance, 'name', '')),
+            attrs.get('text', getattr(instance, 'text', '')),
+            exclude=getattr(instance, 'pk', None),
+        )
+
     def to_representation(self, instance):
         """
         Переопределение перечня полей, возвращаемых эндпоинтом при успешном
@@ -281,6 +417,18 @@ class RecipePostSerializer(serializers.ModelSerializer):
         return RecipeSerializer(instance, context=context).data
 
 
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """Замена изображения рецепта файлом из тела запроса."""
+    image = RecipeImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
+    def to_representation(self, instance):
+        return RecipeSerializer(instance, context=self.context).data
+
+
 class RecipeShortRepresentationSerializer(serializers.ModelSerializer):
     """
     Определение логики сериализации для отображения сокращенного набора
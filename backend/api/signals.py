@@ -0,0 +1,131 @@
+"""
+Обновление заранее сериализованных документов рецептов, сброс кеша
+счетчиков фасетов и публикация событий потока /api/events/.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from foodgram.events import publish
+from recipes.models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartUser,
+    Tag,
+)
+from users.models import Follow
+
+from . import facets
+from .documents import invalidate, invalidate_lazily
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+USER_LIST_EVENTS = {
+    FavoriteRecipeUser: 'favorite',
+    ShoppingCartUser: 'shopping_cart',
+}
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    invalidate([instance.pk])
+    facets.invalidate()
+    if raw:
+        return
+    if created:
+        publish('recipe_created', [f'author:{instance.author_id}'],
+                id=instance.pk, author=instance.author_id)
+    else:
+        publish('recipe_updated', [f'recipe:{instance.pk}'], id=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    facets.invalidate()
+    publish('recipe_deleted',
+            [f'recipe:{instance.pk}', f'author:{instance.author_id}'],
+            id=instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    facets.invalidate()
+    if not reverse:
+        invalidate([instance.pk])
+    elif pk_set:
+        invalidate(pk_set)
+    else:
+        invalidate_lazily(tags=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_lazily(tags=instance)
+    facets.invalidate()
+
+
+@receiver(post_save, sender=FavoriteRecipeUser)
+@receiver(post_delete, sender=FavoriteRecipeUser)
+@receiver(post_save, sender=ShoppingCartUser)
+@receiver(post_delete, sender=ShoppingCartUser)
+def user_list_changed(sender, instance, **kwargs):
+    facets.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=FavoriteRecipeUser)
+@receiver(post_save, sender=ShoppingCartUser)
+def user_list_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish(f'{USER_LIST_EVENTS[sender]}_added',
+                [f'user:{instance.user_id}'], recipe=instance.recipe_id)
+
+
+@receiver(post_delete, sender=FavoriteRecipeUser)
+@receiver(post_delete, sender=ShoppingCartUser)
+def user_list_removed(sender, instance, **kwargs):
+    publish(f'{USER_LIST_EVENTS[sender]}_removed',
+            [f'user:{instance.user_id}'], recipe=instance.recipe_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish('subscribed', [f'user:{instance.user_id}'],
+                author=instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    publish('unsubscribed', [f'user:{instance.user_id}'],
+            author=instance.author_id)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_lazily(recipe_ingredients__ingredient=instance)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        invalidate_lazily(author=instance)
@@ -0,0 +1,166 @@
+"""
+Дельта-синхронизация клиентов: /api/sync/?since=<курсор>.
+
+Ответ содержит рецепты, созданные или измененные после курсора,
+идентификаторы удаленных рецептов и, для авторизованного пользователя,
+изменения его избранного и списка покупок. Каждый вид изменений читается
+по своему индексу (время, id) с позиции из курсора, не больше
+SYNC['PAGE_SIZE'] записей за страницу, поэтому стоимость синхронизации
+пропорциональна числу изменений, а не размеру каталога. has_more=true
+означает, что следующую страницу нужно запросить сразу.
+
+Изменения новее SYNC['SETTLE_SECONDS'] секунд в ответ не попадают: время
+изменения выставляется до фиксации транзакции, и запись, зафиксированная
+позже, могла бы оказаться позади уже выданного курсора.
+
+Курсор подписан и привязан к пользователю. Если он старше срока хранения
+надгробий, ответ — 410, и клиент выполняет полную синхронизацию без since.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import exceptions, status
+
+from recipes.changes import retention_start
+from recipes.models import (
+    FavoriteRecipeUser,
+    Recipe,
+    ShoppingCartUser,
+    Tombstone,
+)
+
+from .serializers import RecipeSerializer
+from .utils import query_params, recipe_queryset
+
+CURSOR_SALT = 'api.sync'
+USER_LISTS = {
+    'favorites': (FavoriteRecipeUser, Tombstone.FAVORITE),
+    'shopping_cart': (ShoppingCartUser, Tombstone.SHOPPING_CART),
+}
+
+
+class CursorExpiredError(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = ('Курсор устарел: выполните полную синхронизацию '
+                      'без параметра since.')
+    default_code = 'cursor_expired'
+
+
+def invalid_cursor():
+    return exceptions.ValidationError({'since': ['Неверный курсор.']})
+
+
+def encode_cursor(user_id, positions):
+    return signing.dumps({
+        'user': user_id,
+        'positions': {
+            name: [moment.isoformat(), pk]
+            for name, (moment, pk) in positions.items()
+        },
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, user_id):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        positions = {
+            name: (datetime.fromisoformat(moment), pk)
+            for name, (moment, pk) in data['positions'].items()
+        }
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise invalid_cursor()
+    if data['user'] != user_id:
+        raise invalid_cursor()
+    return positions
+
+
+def read_stream(queryset, field, position, until, limit):
+    """
+    Записи после позиции (время, id) и не новее until в порядке
+    (field, id). Возвращает записи, новую позицию и признак того, что
+    прочитаны не все записи. Прочитанный до конца поток переходит к
+    позиции until, чтобы курсор не отставал, пока изменений нет.
+    """
+    queryset = queryset.filter(**{f'{field}__lte': until})
+    if position is not None:
+        moment, pk = position
+        queryset = queryset.filter(**{f'{field}__gte': moment}).exclude(
+            **{field: moment, 'pk__lte': pk})
+    rows = list(queryset.order_by(field, 'pk')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = (getattr(rows[-1], field), rows[-1].pk)
+    if not more:
+        position = max(position or (until, 0), (until, 0))
+    return rows, position, more
+
+
+def removed(tombstones, kind, existing, field):
+    """
+    Идентификаторы рецептов из надгробий вида kind, которых нет среди
+    значений field в existing: объект, удаленный и затем добавленный
+    снова, удаленным не считается.
+    """
+    ids = list(dict.fromkeys(
+        tombstone.recipe_id for tombstone in tombstones
+        if tombstone.kind == kind))
+    if not ids:
+        return []
+    present = set(existing.filter(
+        **{f'{field}__in': ids}).values_list(field, flat=True))
+    return [pk for pk in ids if pk not in present]
+
+
+def sync(request):
+    user_id = request.user.id
+    until = timezone.now() - timedelta(
+        seconds=settings.SYNC['SETTLE_SECONDS'])
+    limit = settings.SYNC['PAGE_SIZE']
+    since = query_params(request).get('since')
+    if since:
+        positions = decode_cursor(since, user_id)
+        if positions.get('tombstones', (until, 0))[0] < retention_start():
+            raise CursorExpiredError()
+    else:
+        # Клиенту без данных удаленные раньше объекты не нужны.
+        positions = {'tombstones': (until, 0)}
+    has_more = False
+
+    def read(name, queryset, field):
+        nonlocal has_more
+        rows, positions[name], more = read_stream(
+            queryset, field, positions.get(name), until, limit)
+        has_more |= more
+        return rows
+
+    recipes = read('recipes', recipe_queryset(request), 'updated_at')
+    tombstone_filter = Q(kind=Tombstone.RECIPE)
+    if user_id:
+        tombstone_filter |= Q(user_id=user_id, kind__in=[
+            kind for _, kind in USER_LISTS.values()])
+    tombstones = read(
+        'tombstones', Tombstone.objects.filter(tombstone_filter),
+        'deleted_at')
+    data = {
+        'recipes': RecipeSerializer(
+            recipes, many=True, context={'request': request}).data,
+        'deleted_recipes': removed(
+            tombstones, Tombstone.RECIPE, Recipe.objects.all(), 'pk'),
+    }
+    if user_id:
+        for name, (model, kind) in USER_LISTS.items():
+            entries = model.objects.filter(user_id=user_id)
+            data[name] = {
+                'added': [
+                    entry.recipe_id
+                    for entry in read(name, entries, 'created')
+                ],
+                'removed': removed(tombstones, kind, entries, 'recipe_id'),
+            }
+    data['has_more'] = has_more
+    data['next'] = encode_cursor(user_id, positions)
+    return data
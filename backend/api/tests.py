@@ -0,0 +1,118 @@
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartUser,
+    Tag,
+)
+from users.models import Follow, User
+
+from .fields import RecipeImageField
+from .serializers import (
+    FollowSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+)
+from .utils import recipe_queryset
+
+# Варианты ответа списка рецептов: полное представление и ?fields=/?expand=.
+RECIPE_QUERIES = (
+    '',
+    '?fields=id,name,image,cooking_time',
+    '?expand=author',
+    '?fields=id,author,tags,ingredients',
+    '?fields=tags,ingredients,is_favorited&expand=ingredients',
+)
+
+
+class RecipeImageFieldTest(SimpleTestCase):
+    """Значения изображения, которые не являются ни строкой, ни файлом."""
+
+    def test_non_file_values_are_rejected(self):
+        for value in (123, {}, [], None):
+            with self.subTest(value=value):
+                with self.assertRaises(serializers.ValidationError):
+                    RecipeImageField().to_internal_value(value)
+
+
+class CompiledSerializersTest(TestCase):
+    """
+    Собранные списки (api/compiled.py) дают тот же JSON, что и
+    сериализаторы DRF, байт в байт.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия', password='password')
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (('Завтрак', '#E26C2D', 'breakfast'),
+                                      ('Обед', '#49B64E', 'lunch'))
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'сахар')
+        ]
+        for number, author in enumerate(cls.users * 2):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание', cooking_time=10,
+                image=f'recipes/images/{number}.png', author=author)
+            recipe.tags.set(tags[:number % 2 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients[:number % 3 + 1])
+            reader = cls.users[(number + 1) % 3]
+            FavoriteRecipeUser.objects.create(user=reader, recipe=recipe)
+            if number % 2:
+                ShoppingCartUser.objects.create(user=reader, recipe=recipe)
+        Follow.objects.create(user=cls.users[0], author=cls.users[1])
+        Follow.objects.create(user=cls.users[0], author=cls.users[2])
+
+    def request(self, query, user):
+        request = RequestFactory().get(f'/api/recipes/{query}')
+        request.user = user
+        return request
+
+    def assertSameJSON(self, serializer_class, objects, request):
+        context = {'request': request}
+        rendered = []
+        for compiled in (False, True):
+            with override_settings(COMPILED_SERIALIZERS=compiled):
+                rendered.append(JSONRenderer().render(serializer_class(
+                    objects, many=True, context=context).data))
+        self.assertEqual(rendered[0], rendered[1])
+
+    def test_recipes(self):
+        for user in (AnonymousUser(), *self.users):
+            for query in RECIPE_QUERIES:
+                with self.subTest(user=user, query=query):
+                    request = self.request(query, user)
+                    self.assertSameJSON(
+                        RecipeSerializer,
+                        list(recipe_queryset(request)), request)
+
+    def test_subscriptions(self):
+        user = self.users[0]
+        self.assertSameJSON(
+            FollowSerializer, list(Follow.objects.subscriptions_of(user)),
+            self.request('', user))
+
+    def test_ingredients(self):
+        for user in (AnonymousUser(), self.users[0]):
+            with self.subTest(user=user):
+                self.assertSameJSON(
+                    IngredientSerializer, list(Ingredient.objects.all()),
+                    self.request('', user))
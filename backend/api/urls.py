@@ -3,8 +3,10 @@ from rest_framework import routers
 
 from .views import (
     CustomUserViewSet,
+    DatabasePoolView,
     IngredientsViewSet,
     RecipeViewSet,
+    SyncView,
     TagsViewSet,
 )
 
@@ -17,6 +19,8 @@ router.register('ingredients', IngredientsViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    path('db-pool/', DatabasePoolView.as_view(), name='db-pool'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
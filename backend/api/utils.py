@@ -1,8 +1,16 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
 from rest_framework import response, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 
 from recipes.models import Recipe, RecipeIngredient
+from users.models import Follow
+
+from .serializers import CustomUserSerializer, RecipeSerializer
+
+USER_FLAGS = {'is_favorited', 'is_in_shopping_cart'}
 
 
 def ingredients_export(user):
@@ -17,6 +25,7 @@ def ingredients_export(user):
     return ''.join(product_list)
 
 
+@transaction.atomic
 def add_delete(serializer_name, model, request, recipe_id):
     """
     Добавление / удаление рецепта в список избранного или корзину (список
@@ -35,3 +44,58 @@ def add_delete(serializer_name, model, request, recipe_id):
         model, user=user, recipe=get_object_or_404(Recipe, id=recipe_id)
     ).delete()
     return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def query_params(request):
+    return getattr(request, 'query_params', None) or request.GET
+
+
+def requested_ids(request, param='ids'):
+    """
+    Идентификаторы из параметра ?ids=1,2,3 (или другого param) без
+    повторов в порядке запроса или None, если параметра нет.
+    """
+    value = query_params(request).get(param)
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(
+            int(pk) for pk in value.split(',') if pk.strip()))
+    except ValueError:
+        raise ValidationError(
+            {param: ['Ожидается список целых чисел через запятую.']})
+    if len(ids) > settings.MULTI_GET_MAX_IDS:
+        raise ValidationError({param: [
+            f'Не больше {settings.MULTI_GET_MAX_IDS} идентификаторов.']})
+    return ids
+
+
+def ordered_by_ids(objects, ids):
+    """Объекты в порядке ids; отсутствующие идентификаторы пропускаются."""
+    found = {obj.pk: obj for obj in objects}
+    return [found[pk] for pk in ids if pk in found]
+
+
+def recipe_queryset(request):
+    """
+    Рецепты для RecipeSerializer с учетом параметров fields/expand:
+    загружаются и аннотируются только данные полей, попадающих в ответ.
+    """
+    user_id = request.user.id
+    fields = RecipeSerializer.requested_fields(request)
+    queryset = Recipe.objects.with_related(user_id, fields)
+    if fields.keys() & USER_FLAGS or query_params(request).keys() & USER_FLAGS:
+        queryset = queryset.add_user_annotations(user_id)
+    return queryset
+
+
+def user_queryset(request, queryset):
+    """Аннотация признака подписки, если он попадает в ответ."""
+    if 'is_subscribed' not in CustomUserSerializer.requested_fields(request):
+        return queryset
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Follow.objects.filter(
+                user_id=request.user.id, author=OuterRef('pk'))
+        )
+    )
@@ -1,7 +1,6 @@
 from django.conf import settings
 from django.contrib.auth.hashers import check_password, make_password
-from django.db.models import Value
-from django.db.models.fields import BooleanField
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -9,34 +8,52 @@ from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from foodgram.db.pool import pool_stats
 from recipes.models import (
+    AuthorSuggestions,
     FavoriteRecipeUser,
     Ingredient,
     Recipe,
     ShoppingCartUser,
     Tag,
 )
+from recipes.similarity import similar_recipes
 from users.models import Follow, User
 
+from .documents import document_queryset, render_documents, serves
+from .facets import recipe_facets
 from .filters import IngredientFilter, RecipeFilter
+from .parsers import ImageUploadParser
 from .permissions import AuthorOrReadOnly
 from .serializers import (
     CustomUserSerializer,
     FavoritesWriteSerializer,
     FollowSerializer,
     IngredientSerializer,
+    RecipeImageSerializer,
     RecipePostSerializer,
     RecipeSerializer,
     SetPasswordSerializer,
     ShoppingCartWriteSerializer,
     TagSerializer,
 )
-from .utils import add_delete, ingredients_export
+from .sync import sync
+from .utils import (
+    add_delete,
+    ingredients_export,
+    ordered_by_ids,
+    recipe_queryset,
+    requested_ids,
+    user_queryset,
+)
 
 
 class PermissionMixin:
@@ -68,6 +85,25 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     http_method_names = ['get', 'post', 'delete']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return user_queryset(self.request, queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список пользователей; с параметром ?ids=1,2,3 — пользователи с
+        указанными идентификаторами в порядке запроса, без пагинации.
+        """
+        ids = requested_ids(request)
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        users = ordered_by_ids(
+            self.filter_queryset(self.get_queryset()).filter(pk__in=ids),
+            ids)
+        return Response(self.get_serializer(users, many=True).data)
+
     @action(
         detail=False, methods=(['get']),
         permission_classes=[IsAuthenticated]
@@ -109,8 +145,7 @@ class CustomUserViewSet(UserViewSet):
         Возвращает пользователей, на которых подписан текущий пользователь.
         В выдачу добавляются рецепты.
         """
-        user = request.user
-        subscriptions = Follow.objects.filter(user=user)
+        subscriptions = Follow.objects.subscriptions_of(request.user)
         pages = self.paginate_queryset(subscriptions)
         serializer = FollowSerializer(
             pages,
@@ -119,11 +154,32 @@ class CustomUserViewSet(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def suggestions(self, request):
+        """
+        Авторы, которые могут понравиться пользователю: заранее
+        рассчитанный список без авторов, на которых он подписался после
+        расчета.
+        """
+        ids = AuthorSuggestions.objects.filter(
+            user=request.user).values_list('authors', flat=True).first()
+        users = ordered_by_ids(user_queryset(
+            request, User.objects.filter(pk__in=ids or []).exclude(
+                following__user=request.user)), ids or [])
+        serializer = CustomUserSerializer(
+            users, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
         permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, **kwargs):
         """
         Эндпоинт для добавления / удаления подписки на пользователя.
@@ -161,10 +217,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return Recipe.objects.add_user_annotations(self.request.user.id)
-        return Recipe.objects.add_user_annotations(
-            Value(None, output_field=BooleanField()))
+        return recipe_queryset(self.request)
+
+    def use_documents(self):
+        """
+        Ответ можно собрать из готовых документов, если запрошено полное
+        представление рецептов в компактном JSON (без параметра indent).
+        """
+        renderer = self.request.accepted_renderer
+        return (
+            serves(self.request)
+            and type(renderer) is JSONRenderer
+            and renderer.get_indent(self.request.accepted_media_type,
+                                    self.get_renderer_context()) is None
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов; с параметром ?ids=1,2,3 — рецепты с указанными
+        идентификаторами в порядке запроса, одним списком без пагинации.
+        """
+        ids = requested_ids(request)
+        if not self.use_documents():
+            if ids is None:
+                return super().list(request, *args, **kwargs)
+            recipes = ordered_by_ids(self.filter_queryset(
+                self.get_queryset()).filter(pk__in=ids), ids)
+            return Response(self.get_serializer(recipes, many=True).data)
+        queryset = self.filter_queryset(document_queryset(request))
+        if ids is None:
+            recipes = self.paginate_queryset(queryset)
+        else:
+            recipes = ordered_by_ids(queryset.filter(pk__in=ids), ids)
+        results = b'[' + b','.join(render_documents(recipes, request)) + b']'
+        if ids is not None or recipes is None:
+            return HttpResponse(results, content_type='application/json')
+        envelope = JSONRenderer().render({
+            'count': self.paginator.page.paginator.count,
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+        })
+        return HttpResponse(
+            envelope[:-1] + b',"results":' + results + b'}',
+            content_type='application/json',
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_documents():
+            return super().retrieve(request, *args, **kwargs)
+        recipe = get_object_or_404(
+            self.filter_queryset(document_queryset(request)),
+            pk=kwargs['pk'],
+        )
+        self.check_object_permissions(request, recipe)
+        return HttpResponse(
+            render_documents([recipe], request)[0],
+            content_type='application/json',
+        )
 
     def get_serializer_class(self):
         """
@@ -178,6 +287,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Эндпоинт похожих рецептов: рецепты с пересекающимися наборами
+        ингредиентов и тегов в порядке убывания сходства.
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        ids = similar_recipes(recipe.pk, settings.SIMILAR_RECIPES_LIMIT)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Число рецептов по тегам, группам времени приготовления и в
+        избранном/списке покупок при параметрах фильтра списка рецептов.
+        """
+        return Response(recipe_facets(request))
+
+    @action(detail=True, methods=['put'],
+            parser_classes=(ImageUploadParser,))
+    def image(self, request, pk=None):
+        """
+        Замена изображения рецепта файлом в теле запроса (Content-Type:
+        image/jpeg, image/png, image/gif) без кодирования в base64.
+        """
+        serializer = RecipeImageSerializer(
+            self.get_object(), data={'image': request.data.get('file')},
+            context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     @action(detail=True,
             permission_classes=(IsAuthenticated,),
             methods=['post', 'delete'])
@@ -209,3 +353,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = (
             f'attachment; filename={settings.SHOPPING_CART}')
         return response
+
+
+class SyncView(APIView):
+    """
+    Изменения рецептов, избранного и списка покупок после курсора since
+    (без since — полная синхронизация). Ответ содержит курсор next для
+    следующего запроса.
+    """
+
+    def get(self, request):
+        return Response(sync(request))
+
+
+class DatabasePoolView(APIView):
+    """
+    Загрузка пулов соединений с базой данных и время ожидания соединения
+    в обработавшем запрос воркере.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool_stats())
@@ -9,8 +9,35 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from api import events  # noqa: E402
+
+
+class FoodgramASGIHandler(ASGIHandler):
+    """
+    ASGI-обработчик, который разрешает адреса через ASGI_URLCONF, чтобы
+    GET-запросы к основным эндпоинтам чтения обслуживались асинхронными
+    представлениями. Поток событий /api/events/ обслуживается отдельным
+    ASGI-приложением (api/events.py) в обход обработки запросов Django.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == events.PATH:
+            return await events.stream(scope, receive, send)
+        return await super().__call__(scope, receive, send)
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASGI_URLCONF
+        return request, error_response
+
+
+application = FoodgramASGIHandler()
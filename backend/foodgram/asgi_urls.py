@@ -0,0 +1,12 @@
+"""
+URLconf для ASGI: асинхронные представления чтения подключаются перед
+основными маршрутами из foodgram/urls.py.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.async_urls')),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .nplusone import NPlusOneError, detect, format_issues, install
+from .pool import PoolExhausted
+from .routers import use_replica
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedMiddleware(MiddlewareMixin):
+    """
+    Ответ 503 с заголовком Retry-After вместо ошибки сервера, если пул
+    соединений с базой данных исчерпан.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, PoolExhausted):
+            return None
+        logger.warning('Пул соединений исчерпан: %s', request.path)
+        return JsonResponse(
+            {'detail': 'Сервис временно перегружен, повторите запрос.'},
+            status=503,
+            headers={'Retry-After': '1'},
+            json_dumps_params={'ensure_ascii': False},
+        )
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Чтение в GET/HEAD/OPTIONS-запросах к представлениям из
+    REPLICA_READ_VIEWS выполняется на репликах. После успешной записи
+    клиент на REPLICA_PIN_SECONDS секунд закрепляется за основной базой,
+    чтобы видеть собственные изменения. Клиент определяется по заголовку
+    Authorization (закрепление хранится в кэше) и дополнительно по cookie.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    @staticmethod
+    def client_key(request):
+        credentials = request.META.get('HTTP_AUTHORIZATION')
+        if not credentials:
+            return None
+        digest = hashlib.sha256(credentials.encode()).hexdigest()
+        return f'db-pin:{digest}'
+
+    @staticmethod
+    def view_path(view_func):
+        view = getattr(view_func, 'cls', view_func)
+        return f'{view.__module__}.{view.__qualname__}'
+
+    def is_pinned(self, request):
+        if request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+            return True
+        key = self.client_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def is_replica_view(self, view_func):
+        path = self.view_path(view_func)
+        return any(path == name or path.startswith(f'{name}.')
+                   for name in settings.REPLICA_READ_VIEWS)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.REPLICA_DATABASES
+                and request.method in self.safe_methods
+                and self.is_replica_view(view_func)
+                and not self.is_pinned(request)):
+            use_replica(True)
+            request.reads_from_replica = True
+
+    def process_response(self, request, response):
+        if getattr(request, 'reads_from_replica', False):
+            use_replica(False)
+        if (settings.REPLICA_DATABASES
+                and request.method not in self.safe_methods
+                and response.status_code < 400):
+            seconds = settings.REPLICA_PIN_SECONDS
+            key = self.client_key(request)
+            if key is not None:
+                cache.set(key, 1, seconds)
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    Поиск N+1 запросов в каждом запросе к серверу. NPLUSONE_DETECTION:
+    'log' записывает найденные повторы в журнал (staging), 'raise'
+    превращает их в ошибку (разработка), 'off' отключает проверку.
+    """
+
+    def __init__(self, get_response):
+        if settings.NPLUSONE_DETECTION not in ('log', 'raise'):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect() as collector:
+            response = self.get_response(request)
+        issues = collector.issues()
+        if issues:
+            message = (f'N+1 запросы в {request.method} '
+                       f'{request.get_full_path()}:\n{format_issues(issues)}')
+            if settings.NPLUSONE_DETECTION == 'raise':
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,140 @@
+"""
+Поиск N+1 запросов. Запросы одного вида (SQL без значений параметров),
+повторенные в пределах запроса к API не меньше порогового числа раз из
+одного и того же поля сериализатора (или одного места кода приложения),
+считаются N+1: обычно это ленивая загрузка связанных объектов в цикле.
+"""
+import re
+import sys
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.fields import Field
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+STACK_DEPTH = 6
+
+_collector = ContextVar('nplusone_collector', default=None)
+
+
+class NPlusOneError(AssertionError):
+    """Обнаружены N+1 запросы."""
+
+
+def fingerprint(sql):
+    """Вид запроса: списки IN любой длины сводятся к одному виду."""
+    return IN_LIST.sub('(%s...)', sql)
+
+
+def serializer_field():
+    """Поле сериализатора, при выводе которого выполняется запрос."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            field = frame.f_locals.get('field')
+            if isinstance(field, Field) and field.parent is not None:
+                return f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+def application_stack():
+    """Последние кадры стека из кода приложения (без библиотек)."""
+    root = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(root)
+        and 'site-packages' not in frame.filename
+    ]
+    return [
+        f'{frame.filename[len(root) + 1:]}:{frame.lineno} in {frame.name}'
+        for frame in frames[-STACK_DEPTH:]
+    ]
+
+
+class QueryCollector:
+    """Счетчик SELECT-запросов по виду и месту вызова."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.examples = {}
+
+    def add(self, sql):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return
+        stack = application_stack()
+        origin = serializer_field() or (stack[-1] if stack else '?')
+        key = (origin, fingerprint(sql))
+        self.counts[key] += 1
+        if key not in self.examples:
+            self.examples[key] = stack
+
+    def issues(self):
+        return [
+            {'origin': origin, 'sql': sql, 'count': count,
+             'stack': self.examples[(origin, sql)]}
+            for (origin, sql), count in self.counts.most_common()
+            if count >= self.threshold
+        ]
+
+
+def collect(execute, sql, params, many, context):
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(sql)
+    return execute(sql, params, many, context)
+
+
+def add_wrapper(connection, **kwargs):
+    if collect not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collect)
+
+
+def install():
+    """Подключение счетчика ко всем соединениям процесса."""
+    connection_created.connect(add_wrapper, dispatch_uid='nplusone')
+    for connection in connections.all():
+        add_wrapper(connection)
+
+
+@contextmanager
+def detect(threshold=None):
+    """Сбор запросов внутри блока; результат — QueryCollector.issues()."""
+    collector = QueryCollector(threshold or settings.NPLUSONE_THRESHOLD)
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def format_issues(issues):
+    lines = []
+    for issue in issues:
+        lines.append(
+            f'{issue["origin"]}: {issue["count"]} запросов\n'
+            f'    {issue["sql"][:300]}')
+        lines.extend(f'      {frame}' for frame in issue['stack'])
+    return '\n'.join(lines)
+
+
+@contextmanager
+def assert_no_nplusone(threshold=None):
+    """
+    Помощник для тестов: NPlusOneError, если в блоке есть N+1 запросы.
+
+        with assert_no_nplusone():
+            client.get('/api/recipes/')
+    """
+    install()
+    with detect(threshold) as collector:
+        yield collector
+    issues = collector.issues()
+    if issues:
+        raise NPlusOneError('N+1 запросы:\n' + format_issues(issues))
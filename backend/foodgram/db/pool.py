@@ -0,0 +1,212 @@
+"""
+Ограниченный пул соединений с базой данных для одного процесса-воркера.
+
+Пул не зависит от драйвера: соединения проверяются и сбрасываются
+переданными функциями, а новое соединение открывает функция, переданная
+в acquire(). Статистика пула (загрузка и время
+ожидания соединения) доступна через ConnectionPool.stats().
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolExhausted(OperationalError):
+    """Свободное соединение не освободилось за время ожидания."""
+
+
+class ConnectionPool:
+    """
+    Пул не более чем из max_size соединений. Соединение живет не дольше
+    max_lifetime секунд; простаивавшее дольше health_check_interval
+    секунд соединение проверяется перед выдачей. Если свободных соединений
+    нет, ожидание длится не более timeout секунд, после чего выбрасывается
+    PoolExhausted.
+    """
+
+    def __init__(self, check, reset, max_size=10, max_lifetime=1800,
+                 timeout=5, health_check_interval=30):
+        self.check = check
+        self.reset = reset
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _expired(self, connection, now):
+        return now - self._created_at[id(connection)] > self.max_lifetime
+
+    def _discard(self, connection):
+        """Закрытие соединения; вызывается под блокировкой."""
+        self._created_at.pop(id(connection), None)
+        self._size -= 1
+        self._discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            logger.debug('Ошибка при закрытии соединения', exc_info=True)
+
+    def _take(self, deadline):
+        """
+        Под блокировкой: свободное соединение с моментом последнего
+        использования, либо None, если можно открыть новое.
+        """
+        waited = False
+        while True:
+            now = time.monotonic()
+            while self._idle:
+                connection, released_at = self._idle.pop()
+                if self._expired(connection, now):
+                    self._discard(connection)
+                    continue
+                return connection, released_at, waited
+            if self._size < self.max_size:
+                self._size += 1
+                return None, None, waited
+            remaining = deadline - now
+            if remaining <= 0:
+                self._timeouts += 1
+                raise PoolExhausted(
+                    f'Все {self.max_size} соединений пула заняты '
+                    f'дольше {self.timeout} с')
+            waited = True
+            self._condition.wait(remaining)
+
+    def acquire(self, connect):
+        """
+        Выдача соединения из пула; если свободных нет и размер пула
+        позволяет, новое соединение открывается вызовом connect().
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self._condition:
+                connection, released_at, waited = self._take(deadline)
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._created_at[id(connection)] = time.monotonic()
+            elif (time.monotonic() - released_at
+                  > self.health_check_interval
+                  and not self.check(connection)):
+                with self._condition:
+                    self._discard(connection)
+                    self._condition.notify()
+                continue
+            break
+        wait_time = time.monotonic() - started
+        with self._condition:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+        return connection
+
+    def release(self, connection):
+        """Возврат соединения в пул; неисправные соединения закрываются."""
+        usable = self.reset(connection)
+        with self._condition:
+            if id(connection) not in self._created_at:
+                connection.close()
+                return
+            if not usable or self._expired(connection, time.monotonic()):
+                self._discard(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """Закрытие всех свободных соединений."""
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'utilization': round(in_use / self.max_size, 3),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'avg_wait_ms': round(
+                    self._wait_time / self._checkouts * 1000, 3
+                ) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait_time * 1000, 3),
+            }
+
+
+def get_pool(alias, settings_dict, check, reset):
+    """
+    Пул соединений для базы данных alias в текущем процессе. После fork
+    воркер создает собственный пул и не использует соединения мастера.
+    """
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict.get('POOL', {})
+                pool = _pools[key] = ConnectionPool(
+                    check,
+                    reset,
+                    max_size=options.get('MAX_SIZE', 10),
+                    max_lifetime=options.get('MAX_LIFETIME', 1800),
+                    timeout=options.get('TIMEOUT', 5),
+                    health_check_interval=options.get(
+                        'HEALTH_CHECK_INTERVAL', 30),
+                )
+    return pool
+
+
+def pool_stats():
+    """Статистика пулов текущего процесса по алиасам баз данных."""
+    pid = os.getpid()
+    return {
+        alias: pool.stats()
+        for (alias, owner), pool in list(_pools.items())
+        if owner == pid
+    }
+
+
+def close_pools():
+    """
+    Закрытие свободных соединений всех пулов текущего процесса; мастер
+    gunicorn вызывает ее перед fork воркеров.
+    """
+    pid = os.getpid()
+    for (_, owner), pool in list(_pools.items()):
+        if owner == pid:
+            pool.close_all()
@@ -0,0 +1,66 @@
+"""
+Бэкенд PostgreSQL, который берет соединения из пула процесса вместо
+открытия нового соединения на каждый запрос.
+
+Настройки пула задаются ключом POOL в описании базы данных:
+MAX_SIZE, MAX_LIFETIME, TIMEOUT и HEALTH_CHECK_INTERVAL.
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..pool import get_pool
+
+
+def check_connection(connection):
+    """Проверка соединения, простаивавшего в пуле."""
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except Exception:
+        return False
+    return True
+
+
+def reset_connection(connection):
+    """
+    Возврат соединения в исходное состояние перед помещением в пул:
+    незавершенная транзакция откатывается.
+    """
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_IDLE:
+        return True
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    try:
+        connection.rollback()
+    except Exception:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Соединение берется из пула при подключении и возвращается в пул
+    вместо закрытия (в конце запроса при CONN_MAX_AGE = 0).
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict,
+                        check_connection, reset_connection)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params)
+        )
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
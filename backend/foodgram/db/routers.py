@@ -0,0 +1,40 @@
+"""
+Маршрутизация чтения на реплики базы данных.
+
+ReplicaRoutingMiddleware отмечает запросы, чтение в которых можно
+выполнять на репликах, а ReplicaRouter отправляет такие чтения на одну из
+реплик из REPLICA_DATABASES. Запись всегда выполняется на основной базе.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+
+_read_from_replica = contextvars.ContextVar(
+    'read_from_replica', default=False)
+
+
+def use_replica(enabled):
+    """Включение чтения с реплик для текущего контекста выполнения."""
+    _read_from_replica.set(enabled)
+
+
+class ReplicaRouter:
+    """
+    Чтение в отмеченных запросах выполняется на случайной реплике,
+    остальные чтения и вся запись — на основной базе данных.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _read_from_replica.get() and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,207 @@
+"""
+Рассылка событий подписчикам потока /api/events/ (SSE).
+
+Событие — словарь {'type', 'channels', 'data'}: тип, каналы получателей
+('user:<id>', 'author:<id>', 'recipe:<id>') и небольшие данные
+(идентификаторы; подробности клиент запрашивает в API). Брокер процесса
+раздает событие подписчикам его каналов и хранит последние
+EVENTS['HISTORY'] событий, чтобы клиент мог продолжить поток с
+Last-Event-ID.
+
+Как события попадают в брокер, задает EVENTS['BACKEND']:
+
+* 'local' — публикация после фиксации транзакции в брокер того же
+  процесса; подходит для одного воркера;
+* 'postgres' — публикация NOTIFY в транзакции изменения (PostgreSQL
+  доставляет уведомление только после фиксации), а каждый процесс с
+  подписчиками слушает канал LISTEN на отдельном соединении, которое
+  читается из цикла событий без отдельного потока.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5
+
+
+class Subscriber:
+    """
+    Подписчик потока: очередь событий и флаг пробуждения. Память на
+    подписчика — несколько небольших объектов, без задач и таймеров
+    на каждое событие.
+    """
+    __slots__ = ('channels', 'pending', 'wake', 'closed')
+
+    def __init__(self, channels):
+        self.channels = set(channels)
+        self.pending = deque()
+        self.wake = asyncio.Event()
+        self.closed = False
+
+    def push(self, entry):
+        self.pending.append(entry)
+        self.wake.set()
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+
+
+class Broker:
+    """
+    Брокер событий процесса. Идентификатор события — '<эпоха>-<номер>':
+    номер растет в пределах процесса, эпоха различает процессы и
+    перезапуски, поэтому чужой или устаревший Last-Event-ID распознается.
+
+    Модуль импортируется в мастере gunicorn (preload), поэтому эпоха
+    создается заново в каждом дочернем процессе после fork (after_fork).
+    """
+
+    def __init__(self, history=1000):
+        self.history = deque(maxlen=history)
+        self.subscribers = defaultdict(set)
+        self.loop = None
+        self.listener = None
+        self.new_epoch()
+
+    def new_epoch(self):
+        self.epoch = os.urandom(4).hex()
+        self.last = 0
+        self.history.clear()
+
+    def after_fork(self):
+        """Новый процесс: своя эпоха, без унаследованных подписчиков."""
+        self.new_epoch()
+        self.subscribers.clear()
+        self.loop = None
+        self.listener = None
+
+    def subscribe(self, channels):
+        self.start()
+        subscriber = Subscriber(channels)
+        for channel in subscriber.channels:
+            self.subscribers[channel].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for channel in list(subscriber.channels):
+            self.leave(subscriber, channel)
+
+    def join(self, subscriber, channel):
+        subscriber.channels.add(channel)
+        self.subscribers[channel].add(subscriber)
+
+    def leave(self, subscriber, channel):
+        subscriber.channels.discard(channel)
+        subscribers = self.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[channel]
+
+    def start(self):
+        """Привязка к циклу событий и запуск LISTEN при первом подписчике."""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        if settings.EVENTS['BACKEND'] == 'postgres' and self.listener is None:
+            self.listener = PostgresListener(self)
+            self.listener.connect()
+
+    def dispatch(self, event):
+        """Раздача события подписчикам; вызывается в цикле событий."""
+        self.last += 1
+        entry = (self.last, event)
+        self.history.append(entry)
+        receivers = set()
+        for channel in event['channels']:
+            receivers |= self.subscribers.get(channel, set())
+        for subscriber in receivers:
+            subscriber.push(entry)
+
+    def dispatch_threadsafe(self, event):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.dispatch, event)
+
+    def event_id(self, sequence):
+        return f'{self.epoch}-{sequence}'
+
+    def missed(self, last_event_id, channels):
+        """
+        События каналов после last_event_id или None, если продолжить
+        поток нельзя (другой процесс или событие вытеснено из истории).
+        """
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self.history[0][0] if self.history else self.last + 1
+        if sequence > self.last or sequence + 1 < oldest:
+            return None
+        return [
+            entry for entry in self.history
+            if entry[0] > sequence and channels & set(entry[1]['channels'])
+        ]
+
+
+class PostgresListener:
+    """LISTEN на отдельном соединении psycopg2, читаемом из цикла событий."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.connection = None
+
+    def connect(self):
+        import psycopg2
+
+        try:
+            params = connections['default'].get_connection_params()
+            connection = psycopg2.connect(**params)
+            connection.set_isolation_level(0)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {settings.EVENTS["CHANNEL"]}')
+        except psycopg2.Error:
+            logger.exception('Не удалось подключиться для LISTEN')
+            self.broker.loop.call_later(RECONNECT_DELAY, self.connect)
+            return
+        self.connection = connection
+        self.broker.loop.add_reader(connection.fileno(), self.read)
+
+    def read(self):
+        import psycopg2
+
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            logger.exception('Соединение LISTEN прервано')
+            self.broker.loop.remove_reader(self.connection.fileno())
+            self.connection.close()
+            self.broker.loop.call_later(RECONNECT_DELAY, self.connect)
+            return
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            self.broker.dispatch(json.loads(notify.payload))
+
+
+broker = Broker(settings.EVENTS['HISTORY'])
+os.register_at_fork(after_in_child=broker.after_fork)
+
+
+def publish(event_type, channels, **data):
+    """
+    Публикация события из синхронного кода (обработчиков сигналов).
+    Событие доставляется только после фиксации текущей транзакции.
+    """
+    event = {'type': event_type, 'channels': list(channels), 'data': data}
+    if settings.EVENTS['BACKEND'] == 'postgres':
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [
+                settings.EVENTS['CHANNEL'], json.dumps(event)])
+    else:
+        transaction.on_commit(lambda: broker.dispatch_threadsafe(event))
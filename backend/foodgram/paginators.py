@@ -0,0 +1,40 @@
+"""Пагинатор списков админки для больших таблиц."""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этого числа строк оценка не используется: точный подсчет дешев.
+ESTIMATE_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для списка без фильтров берет оценку числа строк
+    из статистики PostgreSQL (pg_class.reltuples) вместо COUNT(*) по всей
+    таблице. Для отфильтрованных списков и других СУБД число строк
+    считается точно.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimated_count()
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+    def estimated_count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where or query.distinct:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -51,6 +52,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db.middleware.NPlusOneMiddleware',
+    'foodgram.db.middleware.PoolExhaustedMiddleware',
+    'foodgram.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,18 +83,89 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_URLCONF = 'foodgram.asgi_urls'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Бэкенд foodgram.db.postgresql_pool держит в каждом воркере ограниченный
+# пул соединений вместо подключения к PostgreSQL на каждый запрос.
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', default='foodgram.db.postgresql_pool'),
         'NAME': os.getenv('DB_NAME', default="postgres"),
         'USER': os.getenv('POSTGRES_USER', default="postgres"),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default="postgres2504"),
         'HOST': os.getenv('DB_HOST', default="localhost"),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', default=1800)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
+            'HEALTH_CHECK_INTERVAL': int(
+                os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', default=30)),
+        },
+    }
+}
+
+# Профиль SQLite для установок на одном сервере и CI:
+# DB_ENGINE=foodgram.db.sqlite, DB_NAME — путь к файлу базы. Настройки
+# соединения (WAL, busy_timeout и другие PRAGMA) задает бэкенд, их можно
+# переопределить ключом PRAGMAS. Соединения постоянные: открытие
+# соединения к SQLite дешево, но кеш страниц соединения терялся бы после
+# каждого запроса.
+
+if DATABASES['default']['ENGINE'] == 'foodgram.db.sqlite':
+    DATABASES['default'].update(
+        CONN_MAX_AGE=int(os.getenv('DB_CONN_MAX_AGE', default=600)),
+        CONN_HEALTH_CHECKS=True,
+    )
+
+# Реплики для чтения: DB_REPLICAS содержит через запятую хосты реплик
+# PostgreSQL (или файлы баз данных для SQLite). Чтение в безопасных
+# запросах к REPLICA_READ_VIEWS выполняется на репликах; после записи
+# клиент на REPLICA_PIN_SECONDS секунд закрепляется за основной базой.
+
+REPLICA_DATABASES = []
+
+for index, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    alias = f'replica_{index}'
+    location_key = (
+        'NAME' if 'sqlite' in DATABASES['default']['ENGINE'] else 'HOST')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location_key: location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+
+REPLICA_READ_VIEWS = (
+    'api.views.RecipeViewSet',
+    'api.views.IngredientsViewSet',
+    'api.views.TagsViewSet',
+    'api.views.CustomUserViewSet',
+    'api.async_views',
+)
+
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=10))
+
+REPLICA_PIN_COOKIE = 'db_primary_pin'
+
+# Кеш закрепления клиентов за основной базой и счетчиков фасетов. При
+# нескольких воркерах кеш должен быть общим, например
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache и
+# CACHE_LOCATION=cache_table (таблицу создает manage.py createcachetable).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -148,6 +223,19 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'foodgram.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Файлы медиа моложе этого срока gc_media не удаляет, даже если на них
+# еще нет ссылок: запись, которая их использует, может быть не сохранена.
+MEDIA_GC_MIN_AGE = timedelta(hours=1)
+
 PATH_DATA = Path(BASE_DIR, 'data/')
 
 # Default primary key field type
@@ -167,8 +255,106 @@ HEX_CODE_MAX_LENGTH = 7
 
 PAGE_SIZE = 6
 
+# Наибольшее число идентификаторов в ?ids= списков рецептов и пользователей
+MULTI_GET_MAX_IDS = 100
+
 SHOPPING_CART = 'shopping_cart.txt'
 
+# Отдача рецептов из заранее сериализованных документов (api/documents.py)
+RECIPE_DOCUMENTS = os.getenv('RECIPE_DOCUMENTS', default='True') == 'True'
+
+# Списки рецептов, подписок и ингредиентов через собранные функции полей
+# (api/compiled.py) вместо сериализатора DRF на каждый объект
+COMPILED_SERIALIZERS = os.getenv(
+    'COMPILED_SERIALIZERS', default='True') == 'True'
+
+# Рейтинги рецептов ?ordering=popular|trending (recipes/ranking.py)
+RECIPE_RANKING = {
+    'FAVORITE_WEIGHT': 1.0,
+    'SHOPPING_CART_WEIGHT': 1.5,
+    'POPULAR_HALF_LIFE': timedelta(days=30),
+    'TRENDING_HALF_LIFE': timedelta(days=1),
+}
+
+# Индекс похожих рецептов (recipes/similarity.py)
+SIMILARITY_INDEX_DIR = os.getenv(
+    'SIMILARITY_INDEX_DIR', default=os.path.join(BASE_DIR, 'similarity'))
+SIMILAR_RECIPES_LIMIT = 6
+# Число сигнатур, измененных после построения индекса похожих рецептов, при
+# котором обработчик журнала событий перестраивает индекс
+SIMILARITY_INDEX_MAX_CHANGES = int(
+    os.getenv('SIMILARITY_INDEX_MAX_CHANGES', default=5000))
+# Порог сходства (0..1), начиная с которого рецепт считается почти-дубликатом
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Рекомендации авторов /api/users/suggestions/ (recipes/suggestions.py):
+# длина списка на пользователя и веса блужданий по избранному и подпискам.
+AUTHOR_SUGGESTIONS = {
+    'TOP_K': 10,
+    'CO_FAVORITES_WEIGHT': 1.0,
+    'FOLLOWS_WEIGHT': 0.5,
+}
+
+# Счетчики фасетов /api/recipes/facets/ (api/facets.py): верхние границы
+# групп времени приготовления в минутах и время жизни ответа в кеше.
+RECIPE_FACETS = {
+    'COOKING_TIME_BUCKETS': (15, 30, 60),
+    'CACHE_TIMEOUT': 600,
+}
+
+# Синхронизация /api/sync/ (api/sync.py): объектов каждого вида на странице,
+# задержка в секундах, после которой изменения считаются зафиксированными
+# (курсор не обгоняет еще не завершенные транзакции), и срок хранения
+# надгробий удаленных объектов.
+SYNC = {
+    'PAGE_SIZE': 100,
+    'SETTLE_SECONDS': 5,
+    'TOMBSTONE_RETENTION': timedelta(days=30),
+}
+
+# Журнал доменных событий (recipes/outbox.py): обработчики команды
+# consume_events, событий в пачке, время в секундах, после которого пропуск
+# в идентификаторах считается откаченной транзакцией, и пауза опроса.
+# DEFERRED_BUILDS=True переносит построение документов и сигнатур рецептов
+# из запроса записи в обработчики.
+OUTBOX = {
+    'HANDLERS': {
+        'documents': 'api.documents.handle_events',
+        'signatures': 'recipes.similarity.handle_events',
+    },
+    'BATCH_SIZE': 500,
+    'GAP_TIMEOUT': 60,
+    'POLL_SECONDS': 1,
+    'DEFERRED_BUILDS': os.getenv(
+        'OUTBOX_DEFERRED_BUILDS', default='False') == 'True',
+}
+
+# Поток событий /api/events/ (foodgram/events.py): доставка между
+# процессами через LISTEN/NOTIFY PostgreSQL ('postgres') или только внутри
+# процесса ('local'), интервал комментариев-пингов в секундах, число
+# событий, хранимых для продолжения потока с Last-Event-ID, и канал NOTIFY.
+EVENTS = {
+    'BACKEND': os.getenv('EVENTS_BACKEND', default=(
+        'postgres' if 'postgresql' in DATABASES['default']['ENGINE']
+        else 'local')),
+    'HEARTBEAT_SECONDS': float(os.getenv('EVENTS_HEARTBEAT', default=15)),
+    'HISTORY': 1000,
+    'CHANNEL': 'foodgram_events',
+}
+
+# Поиск N+1 запросов: 'off', 'log' (staging) или 'raise' (разработка).
+NPLUSONE_DETECTION = os.getenv('NPLUSONE_DETECTION', default='off')
+# Число повторов запроса одного вида из одного места, считающееся N+1.
+NPLUSONE_THRESHOLD = 3
+
+# Ограничения изображений рецептов; размеры проверяются по заголовку файла
+# до декодирования пикселей.
+RECIPE_IMAGE = {
+    'MAX_BYTES': 10 * 2 ** 20,
+    'MAX_SIDE': 6000,
+    'MAX_PIXELS': 24_000_000,
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
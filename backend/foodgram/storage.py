@@ -0,0 +1,64 @@
+"""Хранилище медиафайлов с именами по хешу содержимого."""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+# Файлы раскладываются по подкаталогам из первых символов хеша, чтобы
+# в одном каталоге не оказывались сотни тысяч файлов.
+SHARD_LENGTH = 2
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файл сохраняется под именем <каталог>/<ab>/<sha256>.<расширение>:
+    одинаковые изображения хранятся один раз, а содержимое файла с
+    данным именем никогда не меняется, поэтому nginx может отдавать его
+    с бессрочным кешированием.
+
+    Повторная запись существующего файла только обновляет время его
+    изменения: gc_media не удаляет недавно использованные файлы, пока
+    ссылающиеся на них записи еще не сохранены в базе.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        validate_file_name(name, allow_relative_path=True)
+        return self._save(name, content)
+
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:SHARD_LENGTH], f'{digest}{extension}')
+
+    def _save(self, name, content):
+        path = self.path(name)
+        if os.path.exists(path):
+            os.utime(path)
+            return name
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Запись во временный файл и переименование: параллельные загрузки
+        # одного изображения не оставят наполовину записанный файл.
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        os.chmod(file.name, self.file_permissions_mode or 0o644)
+        os.replace(file.name, path)
+        return name
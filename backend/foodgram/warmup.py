@@ -0,0 +1,91 @@
+"""
+Прогрев процесса приложения. В режиме preload gunicorn выполняет его в
+мастере до fork воркеров: импортированные модули, разобранные маршруты и
+загруженные индексы становятся общими страницами памяти всех воркеров.
+"""
+import gc
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+from PIL import Image
+from rest_framework.settings import api_settings
+
+from foodgram.db.pool import close_pools
+from recipes import similarity
+
+logger = logging.getLogger(__name__)
+
+# Настройки DRF, которые импортируют классы по строкам при первом обращении.
+DRF_SETTINGS = (
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PAGINATION_CLASS',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_RENDERER_CLASSES',
+)
+
+
+def warm_urls():
+    """Импорт представлений и разбор маршрутов WSGI и ASGI."""
+    for urlconf in {settings.ROOT_URLCONF, settings.ASGI_URLCONF}:
+        get_resolver(urlconf).reverse_dict
+    for name in DRF_SETTINGS:
+        getattr(api_settings, name)
+
+
+def warm_images():
+    """Регистрация всех форматов Pillow."""
+    Image.init()
+
+
+def warm_content_types():
+    """Кеш типов содержимого (используется админкой и правами)."""
+    try:
+        ContentType.objects.get_for_models(*apps.get_models())
+    except DatabaseError:
+        logger.warning('Кеш типов содержимого не прогрет: база недоступна')
+
+
+def warm_similarity():
+    """Загрузка индексов похожих рецептов и чтение их в page cache."""
+    for index in similarity.current_indexes().values():
+        index.warm()
+
+
+WARMUP_STEPS = (
+    ('urls', warm_urls),
+    ('images', warm_images),
+    ('content_types', warm_content_types),
+    ('similarity', warm_similarity),
+)
+
+
+def warm_up():
+    """
+    Прогрев процесса. Возвращает длительность каждого шага в секундах.
+    Соединения с базой после прогрева закрываются, чтобы воркеры не
+    унаследовали сокеты мастера.
+    """
+    timings = []
+    for name, step in WARMUP_STEPS:
+        started = time.perf_counter()
+        step()
+        timings.append((name, time.perf_counter() - started))
+    connections.close_all()
+    close_pools()
+    return timings
+
+
+def freeze():
+    """
+    Перенос всех объектов процесса в постоянное поколение сборщика
+    мусора. Сборщик не обходит их в воркерах и не записывает в их
+    заголовки, поэтому страницы мастера остаются общими после fork.
+    """
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,36 @@
+"""
+Настройки gunicorn. По умолчанию приложение загружается в мастере
+(preload): после прогрева и заморозки объектов воркеры запускаются
+через fork и разделяют с мастером импортированный код и кеши.
+GUNICORN_PRELOAD=False возвращает загрузку приложения в каждом воркере.
+"""
+import os
+
+bind = '0:8000'
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('GUNICORN_WORKERS', default=1))
+preload_app = os.getenv('GUNICORN_PRELOAD', default='True') == 'True'
+
+
+def log_warm_up(log, timings):
+    log.info('Прогрев: %s', ', '.join(
+        f'{name} {seconds * 1000:.0f} мс' for name, seconds in timings))
+
+
+def when_ready(server):
+    """Прогрев мастера перед запуском первых воркеров."""
+    if not preload_app:
+        return
+    from foodgram.warmup import freeze, warm_up
+
+    log_warm_up(server.log, warm_up())
+    freeze()
+
+
+def post_worker_init(worker):
+    """Без preload каждый воркер прогревается сам до первого запроса."""
+    if preload_app:
+        return
+    from foodgram.warmup import warm_up
+
+    log_warm_up(worker.log, warm_up())
@@ -1,22 +1,47 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foodgram.paginators import EstimatedCountPaginator
 
 from .models import (
+    DuplicateCandidate,
     FavoriteRecipeUser,
     Ingredient,
+    IngredientUsage,
     Recipe,
     ShoppingCartUser,
     Tag,
 )
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Настройки списков для больших таблиц: без точного подсчета общего
+    числа записей и с оценкой числа строк для списка без фильтров.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class UserRecipeAdmin(LargeTableAdmin):
+    """Списки избранного и покупок."""
+
+    list_display = ("user", "recipe", "created")
+    list_select_related = ("user", "recipe")
+    autocomplete_fields = ("user", "recipe")
+    search_fields = ("^user__username", "^recipe__name")
+
+
 @admin.register(FavoriteRecipeUser)
-class FavoritesAdmin(admin.ModelAdmin):
-    list_display = ("user", "recipe")
+class FavoritesAdmin(UserRecipeAdmin):
+    pass
 
 
 @admin.register(ShoppingCartUser)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ("user", "recipe")
+class ShoppingCartAdmin(UserRecipeAdmin):
+    pass
 
 
 @admin.register(Tag)
@@ -28,10 +53,11 @@ class TagsAdmin(admin.ModelAdmin):
         "color",
         "slug",
     )
+    search_fields = ("name", "slug")
 
 
 @admin.register(Ingredient)
-class IngredientsAdmin(admin.ModelAdmin):
+class IngredientsAdmin(LargeTableAdmin):
     """Отображение данных модели Ингредиентов."""
 
     list_display = (
@@ -39,7 +65,7 @@ class IngredientsAdmin(admin.ModelAdmin):
         "measurement_unit",
     )
 
-    search_fields = ("name",)
+    search_fields = ("^name",)
 
 
 class IngredientsInline(admin.TabularInline):
@@ -49,31 +75,103 @@ class IngredientsInline(admin.TabularInline):
     """
 
     model = Recipe.ingredients.through
+    autocomplete_fields = ("ingredient",)
     extra = 1
 
 
 @admin.register(Recipe)
-class RecipesAdmin(admin.ModelAdmin):
+class RecipesAdmin(LargeTableAdmin):
     """Отображение данных модели Рецептов."""
 
     list_display = (
         "name",
         "author",
+        "pub_date",
+        "favorites_count",
     )
-    list_filter = (
-        "name",
-        "author",
-        "tags",
-    )
+    list_select_related = ("author",)
+    list_filter = ("tags",)
+    search_fields = ("^name", "^author__username")
+    autocomplete_fields = ("author", "tags")
 
     readonly_fields = ("favorites_count",)
 
     inlines = (IngredientsInline,)
 
+    def get_queryset(self, request):
+        """
+        Число добавлений в избранное считается коррелированным подзапросом:
+        он выполняется только для строк текущей страницы, а не для всей
+        таблицы, как COUNT с GROUP BY.
+        """
+        favorites = FavoriteRecipeUser.objects.filter(
+            recipe=OuterRef("pk")
+        ).order_by().values("recipe").annotate(count=Count("pk"))
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(Subquery(favorites.values("count")), 0)
+        )
+
     @admin.display(description="В избранном")
     def favorites_count(self, obj):
         """
         Отображение количества раз, когда рецепт был добавлен кем-либо в список
         избранного.
         """
-        return obj.favorites.count()
+        return obj.favorites_count
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidatesAdmin(LargeTableAdmin):
+    """
+    Отчет о возможных дубликатах: рецепты, найденные при публикации или
+    командой find_duplicates.
+    """
+
+    list_display = (
+        "recipe",
+        "recipe_author",
+        "duplicate_of",
+        "duplicate_author",
+        "similarity",
+        "created",
+    )
+    list_select_related = ("recipe__author", "duplicate_of__author")
+    raw_id_fields = ("recipe", "duplicate_of")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Автор рецепта")
+    def recipe_author(self, obj):
+        return obj.recipe.author
+
+    @admin.display(description="Автор похожего рецепта")
+    def duplicate_author(self, obj):
+        return obj.duplicate_of.author
+
+
+@admin.register(IngredientUsage)
+class IngredientUsageAdmin(LargeTableAdmin):
+    """
+    Отчет об использовании ингредиентов: число рецептов и записей
+    списков покупок. Счетчики обновляются сигналами и командой
+    update_ingredient_usage.
+    """
+
+    list_display = (
+        "ingredient",
+        "measurement_unit",
+        "recipes",
+        "shopping_carts",
+    )
+    list_select_related = ("ingredient",)
+    search_fields = ("^ingredient__name",)
+    ordering = ("-recipes", "-shopping_carts")
+    readonly_fields = ("ingredient", "recipes", "shopping_carts")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Единица измерения")
+    def measurement_unit(self, obj):
+        return obj.ingredient.measurement_unit
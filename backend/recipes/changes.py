@@ -0,0 +1,38 @@
+"""
+Журнал изменений для синхронизации клиентов (/api/sync/).
+
+Recipe.updated_at отмечает изменение самого рецепта (auto_now) и всего,
+что входит в его представление: строк ингредиентов, тегов рецепта,
+названий тегов и ингредиентов. Удаления рецептов и записей избранного и
+списка покупок оставляют надгробия Tombstone, которые хранятся
+SYNC['TOMBSTONE_RETENTION'] и удаляются командой prune_tombstones.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Recipe, Tombstone
+
+
+def touch(recipes):
+    """Отметка изменения рецептов (queryset) текущим временем."""
+    recipes.update(updated_at=timezone.now())
+
+
+def touch_ids(recipe_ids):
+    touch(Recipe.objects.filter(pk__in=recipe_ids))
+
+
+def bury(kind, recipe_id, user_id=None):
+    Tombstone.objects.create(kind=kind, recipe_id=recipe_id, user_id=user_id)
+
+
+def retention_start():
+    """Самое раннее время, с которого надгробия гарантированно хранятся."""
+    return timezone.now() - settings.SYNC['TOMBSTONE_RETENTION']
+
+
+def prune():
+    """Удаление надгробий старше срока хранения; возвращает их число."""
+    deleted, _ = Tombstone.objects.filter(
+        deleted_at__lt=retention_start()).delete()
+    return deleted
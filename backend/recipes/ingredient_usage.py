@@ -0,0 +1,155 @@
+"""
+Статистика использования ингредиентов (IngredientUsage).
+
+recipes — число рецептов с ингредиентом, shopping_carts — число записей
+списков покупок, рецепт которых содержит ингредиент: рецепт с солью в
+списках покупок трех пользователей дает соли 3. Так каждое изменение
+меняет счетчики на известную величину, не перечитывая списки покупок
+целиком.
+
+Счетчики меняются приращениями из сигналов: добавление и удаление
+ингредиента рецепта, добавление рецепта в список покупок и удаление из
+него. При удалении рецепта его вклад вычитается один раз до каскадного
+удаления связанных строк, а сигналы этих строк пропускаются, пока открыт
+блок atomic, в котором Django выполняет удаление. Пути,
+которые пишут ингредиенты рецептов через bulk_create, вызывают
+add_recipes сами; команда update_ingredient_usage пересчитывает всю
+статистику.
+"""
+import threading
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import (
+    Ingredient,
+    IngredientUsage,
+    RecipeIngredient,
+    ShoppingCartUser,
+)
+
+BATCH_SIZE = 500
+
+_deleting = threading.local()
+
+
+def change(field, deltas):
+    """
+    Прибавление deltas[ingredient_id] к счетчику field одним запросом на
+    пачку. Строки статистики создаются для ингредиентов, которые
+    используются впервые.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    created = [pk for pk, delta in deltas.items() if delta > 0]
+    if created:
+        IngredientUsage.objects.bulk_create(
+            [IngredientUsage(ingredient_id=pk) for pk in created],
+            ignore_conflicts=True,
+        )
+    ids = sorted(deltas)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        increment = Case(
+            *(When(ingredient_id=pk, then=Value(deltas[pk])) for pk in batch),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        IngredientUsage.objects.filter(ingredient_id__in=batch).update(
+            **{field: F(field) + increment})
+
+
+def recipe_ingredients(recipe_id):
+    return list(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+
+
+def cart_count(recipe_id):
+    return ShoppingCartUser.objects.filter(recipe_id=recipe_id).count()
+
+
+def ingredient_changed(recipe_id, ingredient_id, sign):
+    """Ингредиент добавлен в рецепт (sign=1) или убран из него (-1)."""
+    if recipe_id in deleting():
+        return
+    change('recipes', {ingredient_id: sign})
+    carts = cart_count(recipe_id)
+    if carts:
+        change('shopping_carts', {ingredient_id: sign * carts})
+
+
+def cart_changed(recipe_id, sign):
+    """Рецепт добавлен в список покупок (sign=1) или убран из него (-1)."""
+    if recipe_id in deleting():
+        return
+    change('shopping_carts', dict.fromkeys(
+        recipe_ingredients(recipe_id), sign))
+
+
+def add_recipes(recipe_ids):
+    """Учет новых рецептов, ингредиенты которых записаны bulk_create."""
+    recipe_ids = list(recipe_ids)
+    counts = Counter()
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        counts.update(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids[start:start + BATCH_SIZE]
+        ).values_list('ingredient_id', flat=True))
+    change('recipes', counts)
+
+
+def deleting():
+    """
+    Рецепты, удаляемые в текущем потоке: идентификатор рецепта -> блок
+    atomic удаления. Отметки закрытых блоков отбрасываются, поэтому
+    удаление, прерванное исключением или откатом, не оставляет отметку.
+    """
+    blocks = transaction.get_connection().atomic_blocks
+    _deleting.recipes = {
+        recipe_id: block
+        for recipe_id, block in getattr(_deleting, 'recipes', {}).items()
+        if any(block is open_block for open_block in blocks)
+    }
+    return _deleting.recipes
+
+
+def recipe_deleting(recipe_id):
+    """
+    Вычитание вклада удаляемого рецепта. До завершения удаления сигналы
+    его ингредиентов и записей списков покупок пропускаются: к моменту их
+    отправки часть связанных строк уже удалена.
+    """
+    ingredients = recipe_ingredients(recipe_id)
+    carts = cart_count(recipe_id)
+    change('recipes', dict.fromkeys(ingredients, -1))
+    change('shopping_carts', dict.fromkeys(ingredients, -carts))
+    blocks = transaction.get_connection().atomic_blocks
+    if blocks:
+        deleting()[recipe_id] = blocks[-1]
+
+
+def recipe_deleted(recipe_id):
+    deleting().pop(recipe_id, None)
+
+
+def recompute():
+    """Пересчет всей статистики; возвращает число используемых ингредиентов."""
+    rows = RecipeIngredient.objects.values('ingredient_id').annotate(
+        recipe_count=Count('pk', distinct=True),
+        cart_count=Count('recipe__shopping_card'),
+    ).values_list('ingredient_id', 'recipe_count', 'cart_count')
+    usage = [
+        IngredientUsage(ingredient_id=pk, recipes=recipes,
+                        shopping_carts=carts)
+        for pk, recipes, carts in rows
+    ]
+    with transaction.atomic():
+        IngredientUsage.objects.bulk_create(
+            [IngredientUsage(ingredient_id=pk)
+             for pk in Ingredient.objects.values_list('pk', flat=True)],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+        IngredientUsage.objects.update(recipes=0, shopping_carts=0)
+        IngredientUsage.objects.bulk_update(
+            usage, ['recipes', 'shopping_carts'], batch_size=BATCH_SIZE)
+    return len(usage)
@@ -0,0 +1,132 @@
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from recipes.models import FavoriteRecipeUser, Recipe, Tag
+from recipes.tag_masks import update_masks
+
+User = get_user_model()
+
+BENCH_USERNAME = 'bench_admin'
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени отрисовки списков админки (медиана и число '
+        'запросов). --create N добавляет N синтетических рецептов '
+        'служебного автора через bulk_create, --cleanup удаляет их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', type=int, default=0)
+        parser.add_argument('--cleanup', action='store_true')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Адрес страницы админки; можно указать несколько раз.')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+        if options['create']:
+            self.create(options['create'])
+        paths = options['paths'] or self.default_paths()
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должно быть больше 0')
+        # Пользователь не сохраняется: права суперпользователя проверяются
+        # по атрибутам объекта.
+        user = User(username=BENCH_USERNAME, is_active=True, is_staff=True,
+                    is_superuser=True)
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+        for path in paths:
+            self.measure(path, user, options['repeat'])
+
+    def default_paths(self):
+        paths = [
+            '/admin/recipes/recipe/',
+            '/admin/recipes/recipe/?p=500',
+            '/admin/recipes/recipe/?q=Бенчмарк 12345',
+            '/admin/recipes/favoriterecipeuser/',
+            '/admin/recipes/ingredient/',
+            '/admin/users/user/',
+        ]
+        tag = Tag.objects.first()
+        if tag is not None:
+            paths.append(f'/admin/recipes/recipe/?tags__id__exact={tag.pk}')
+        recipe = Recipe.objects.first()
+        if recipe is not None:
+            paths.append(f'/admin/recipes/recipe/{recipe.pk}/change/')
+        return paths
+
+    def measure(self, path, user, repeat):
+        match = resolve(urlsplit(path).path)
+        timings = []
+        for _ in range(repeat):
+            request = RequestFactory().get(path)
+            request.user = user
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = match.func(request, *match.args, **match.kwargs)
+                response.render()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{path}: {response.status_code}, '
+            f'медиана {statistics.median(timings) * 1000:.1f} мс, '
+            f'запросов {len(queries)}')
+
+    def create(self, count):
+        author, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@example.com',
+                      'first_name': 'Бенчмарк', 'last_name': 'Админки'},
+        )
+        author.set_unusable_password()
+        author.save(update_fields=['password'])
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        start = Recipe.objects.filter(author=author).count()
+        now = timezone.now()
+        for offset in range(start, start + count, BATCH_SIZE):
+            numbers = range(offset, min(offset + BATCH_SIZE, start + count))
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    name=f'Бенчмарк {number}',
+                    text='Синтетический рецепт для замера админки.',
+                    cooking_time=number % 120 + 1,
+                    image='recipes/images/bench.png',
+                    author=author,
+                    pub_date=now,
+                )
+                for number in numbers
+            )
+            if tags:
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(
+                        recipe_id=recipe.pk,
+                        tag_id=tags[recipe.pk % len(tags)])
+                    for recipe in recipes
+                )
+                update_masks(recipe.pk for recipe in recipes)
+            FavoriteRecipeUser.objects.bulk_create(
+                FavoriteRecipeUser(user=author, recipe=recipe)
+                for recipe in recipes[::10]
+            )
+            self.stdout.write(f'Создано рецептов: {numbers[-1] + 1}')
+
+    def cleanup(self):
+        ids = list(Recipe.objects.filter(
+            author__username=BENCH_USERNAME).values_list('pk', flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            Recipe.objects.filter(
+                pk__in=ids[start:start + BATCH_SIZE]).delete()
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено рецептов: {len(ids)}'))
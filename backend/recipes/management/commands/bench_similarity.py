@@ -0,0 +1,118 @@
+import gc
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.similarity import SimilarityIndex, feature_tokens, minhash_many
+
+
+def synthetic_recipes(count, ingredients, tags, variants, rng):
+    """
+    Наборы ингредиентов и тегов: популярность ингредиентов убывает по
+    закону Ципфа, доля variants рецептов — вариации уже созданных
+    (замена от одного до трех ингредиентов).
+    """
+    weights = 1 / (np.arange(ingredients) + 10)
+    weights /= weights.sum()
+    sizes = rng.integers(5, 13, count)
+    drawn = np.split(
+        rng.choice(ingredients, sizes.sum(), p=weights), np.cumsum(sizes))
+    recipes = []
+    for number in range(count):
+        if number and rng.random() < variants:
+            base = recipes[rng.integers(number)]
+            items = list(base[0])
+            for _ in range(rng.integers(1, 4)):
+                items[rng.integers(len(items))] = drawn[number][0]
+                drawn[number] = np.roll(drawn[number], 1)
+            recipes.append((set(items), base[1]))
+            continue
+        recipes.append((
+            set(drawn[number].tolist()),
+            rng.choice(tags, rng.integers(1, 3), replace=False).tolist(),
+        ))
+    return [feature_tokens(sorted(items), labels)
+            for items, labels in recipes]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер построения LSH-индекса похожих рецептов, времени поиска и '
+        'полноты относительно точного коэффициента Жаккара на '
+        'синтетических данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--variants', type=float, default=0.3)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--threshold', type=float, default=0.5,
+                            help='Порог Жаккара для подсчета полноты.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        started = time.perf_counter()
+        tokens = synthetic_recipes(
+            options['recipes'], options['ingredients'], options['tags'],
+            options['variants'], rng)
+        self.stdout.write(
+            f'Данные: {len(tokens)} рецептов '
+            f'({time.perf_counter() - started:.1f} с)')
+        ids = np.arange(1, len(tokens) + 1, dtype=np.int64)
+
+        started = time.perf_counter()
+        signatures = minhash_many(tokens)
+        self.stdout.write(
+            f'Сигнатуры: {time.perf_counter() - started:.2f} с')
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'index')
+            started = time.perf_counter()
+            SimilarityIndex.write(path, ids, signatures, timezone.now())
+            self.stdout.write(
+                f'Индекс: {time.perf_counter() - started:.2f} с')
+            index = SimilarityIndex.load(path)
+            index.warm()
+            # Синтетические данные — миллионы объектов, которых нет в
+            # процессе сервера: исключаем их из обходов сборщика мусора.
+            gc.freeze()
+            queries = rng.choice(len(tokens), options['queries'],
+                                 replace=False)
+            self.measure(index, tokens, ids, queries, options['threshold'])
+
+    def measure(self, index, tokens, ids, queries, threshold):
+        lengths = np.fromiter(map(len, tokens), np.int64, len(tokens))
+        flat = np.concatenate(tokens)
+        owner = np.repeat(np.arange(len(tokens)), lengths)
+        latencies = []
+        relevant = found = candidates = 0
+        for row in queries:
+            started = time.perf_counter()
+            signature = index.signature(ids[row])
+            result, scores = index.query(signature)
+            latencies.append(time.perf_counter() - started)
+            candidates += len(result)
+            overlap = np.bincount(
+                owner[np.isin(flat, tokens[row])], minlength=len(tokens))
+            jaccard = overlap / (lengths + lengths[row] - overlap)
+            truth = set(ids[jaccard >= threshold].tolist()) - {ids[row]}
+            relevant += len(truth)
+            found += len(truth & set(result.tolist()))
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            'Поиск, мс: '
+            f'p50={quantiles[49] * 1000:.2f} '
+            f'p99={quantiles[98] * 1000:.2f}, '
+            f'кандидатов в среднем: {candidates / len(queries):.0f}')
+        if relevant:
+            self.stdout.write(
+                f'Полнота при Жаккаре >= {threshold}: '
+                f'{found / relevant:.3f} ({found}/{relevant})')
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from recipes.outbox import consume, handlers, lag, prune
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработка журнала доменных событий обработчиками из '
+        "settings.OUTBOX['HANDLERS']: события передаются пачками по порядку, "
+        'позиция каждого обработчика сохраняется после пачки. Без --once '
+        'команда работает постоянно и опрашивает журнал.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--handler', action='append', dest='handlers',
+            choices=sorted(settings.OUTBOX['HANDLERS']),
+            help='Обработчик; можно указать несколько раз '
+                 '(по умолчанию все).')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.OUTBOX['BATCH_SIZE'])
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать накопленные события и выйти.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалять события, обработанные всеми '
+                                 'обработчиками.')
+        parser.add_argument('--status', action='store_true',
+                            help='Показать число необработанных событий.')
+
+    def handle(self, *args, **options):
+        available = handlers()
+        names = options['handlers'] or sorted(available)
+        if options['status']:
+            for name, count in lag(names).items():
+                self.stdout.write(f'{name}: необработанных событий {count}')
+            return
+        while True:
+            processed, failed = self.consume_all(
+                {name: available[name] for name in names},
+                options['batch_size'])
+            if options['prune']:
+                # Удалять можно только события, пройденные всеми
+                # обработчиками из настроек, а не только запущенными.
+                prune(sorted(available))
+            if options['once'] and not processed:
+                if failed:
+                    raise CommandError(
+                        f'Ошибки обработчиков: {", ".join(sorted(failed))}')
+                return
+            if not processed:
+                time.sleep(settings.OUTBOX['POLL_SECONDS'])
+
+    def consume_all(self, selected, batch_size):
+        """
+        Одна пачка каждому обработчику. Ошибка обработчика откатывает
+        его пачку; остальные обработчики продолжают работу, а пачка
+        повторяется при следующем опросе.
+        """
+        processed, failed = 0, set()
+        for name, handler in selected.items():
+            try:
+                count = consume(name, handler, batch_size)
+            except Exception as error:
+                failed.add(name)
+                self.stderr.write(f'{name}: {error!r}')
+                continue
+            if count:
+                self.stdout.write(f'{name}: обработано событий {count}')
+            processed += count
+        return processed, failed
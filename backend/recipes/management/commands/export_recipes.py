@@ -0,0 +1,94 @@
+import base64
+import json
+import sys
+
+from django.core.management import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+
+def image_record(image, content=True):
+    """
+    Путь изображения и его содержимое в base64; если файла нет в
+    хранилище, выгружается только путь.
+    """
+    record = {'name': image.name}
+    if content and image and image.storage.exists(image.name):
+        with image.open('rb') as file:
+            record['data'] = base64.b64encode(file.read()).decode()
+    return record
+
+
+def recipe_record(recipe, images=True):
+    """Запись NDJSON-выгрузки: рецепт со всеми связанными данными."""
+    return {
+        'id': recipe.pk,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'author': {
+            'email': recipe.author.email,
+            'username': recipe.author.username,
+            'first_name': recipe.author.first_name,
+            'last_name': recipe.author.last_name,
+        },
+        'tags': [
+            {'name': tag.name, 'color': tag.color, 'slug': tag.slug}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+        'image': image_record(recipe.image, images),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка рецептов с тегами, ингредиентами, авторами и '
+        'изображениями в NDJSON (одна строка JSON на рецепт). Рецепты '
+        'читаются порциями через серверный курсор, поэтому память не '
+        'зависит от размера каталога.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='Файл выгрузки; по умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--no-images', action='store_true',
+            help='Выгружать только пути изображений, без содержимого.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').select_related(
+            'author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+        output = options['output']
+        stream = (
+            sys.stdout if output == '-'
+            else open(output, 'w', encoding='utf-8')
+        )
+        count = 0
+        try:
+            for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+                stream.write(json.dumps(
+                    recipe_record(recipe, not options['no_images']),
+                    ensure_ascii=False))
+                stream.write('\n')
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Выгружено рецептов: {count}')
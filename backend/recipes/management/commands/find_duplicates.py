@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+from recipes.models import DuplicateCandidate, Recipe
+from recipes.similarity import (
+    KINDS,
+    duplicate_scores,
+    index_root,
+    load_indexes,
+    lookup_signatures,
+    no_changes,
+    rebuild,
+)
+
+
+def scan(arguments):
+    """
+    Поиск почти-дубликатов для части рецептов в отдельном процессе.
+    Возвращает пары (новый рецепт, более ранний рецепт, сходство).
+    """
+    path, ids, threshold = arguments
+    indexes = load_indexes(path)
+    changes = no_changes()
+    signatures, _ = lookup_signatures(ids, indexes, changes)
+    pairs = []
+    for row, recipe_id in enumerate(ids):
+        found, scores = duplicate_scores(
+            {kind: signatures[kind][row] for kind in KINDS},
+            indexes, changes, exclude=recipe_id)
+        keep = (scores >= threshold) & (found < recipe_id)
+        pairs.extend(
+            (int(recipe_id), int(pk), float(score))
+            for pk, score in zip(found[keep], scores[keep]))
+    return pairs
+
+
+def clusters(pairs):
+    """Группы рецептов, связанных найденными парами (union-find)."""
+    parent = {}
+
+    def root(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for first, second, _ in pairs:
+        parent[root(first)] = root(second)
+    groups = defaultdict(list)
+    for node in parent:
+        groups[root(node)].append(node)
+    return sorted(
+        (sorted(group) for group in groups.values()), key=len, reverse=True)
+
+
+class Command(BaseCommand):
+    help = (
+        'Поиск групп почти-дубликатов среди всех рецептов по LSH-индексу '
+        'сигнатур в нескольких процессах. Найденные пары сохраняются в '
+        'отчет «Возможные дубликаты».'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--threshold', type=float,
+                            default=settings.NEAR_DUPLICATE_THRESHOLD)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Перед поиском вычислить недостающие '
+                                 'сигнатуры и перестроить индекс.')
+        parser.add_argument('--show', type=int, default=10,
+                            help='Сколько самых больших групп вывести.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild()
+        try:
+            path = index_root() / os.readlink(index_root() / 'current')
+        except OSError:
+            raise CommandError(
+                'Индекс похожих рецептов не построен: запустите команду '
+                'с --rebuild или rebuild_similarity_index')
+        indexes = load_indexes(path)
+        ids = np.union1d(*(indexes[kind].ids for kind in KINDS))
+        chunk_size = options['chunk_size']
+        tasks = [
+            (path, ids[start:start + chunk_size], options['threshold'])
+            for start in range(0, len(ids), chunk_size)
+        ]
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes']) as pool:
+            pairs = [
+                pair for chunk in pool.imap_unordered(scan, tasks)
+                for pair in chunk
+            ]
+        existing = set(Recipe.objects.filter(
+            pk__in={pk for pair in pairs for pk in pair[:2]}
+        ).values_list('pk', flat=True))
+        pairs = [
+            pair for pair in pairs
+            if pair[0] in existing and pair[1] in existing
+        ]
+        DuplicateCandidate.objects.bulk_create(
+            [DuplicateCandidate(recipe_id=recipe_id, duplicate_of_id=pk,
+                                similarity=score)
+             for recipe_id, pk, score in pairs],
+            update_conflicts=True,
+            unique_fields=['recipe', 'duplicate_of'],
+            update_fields=['similarity'],
+            batch_size=1000,
+        )
+        groups = clusters(pairs)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено рецептов: {len(ids)}, пар: {len(pairs)}, '
+            f'групп: {len(groups)}'))
+        for group in groups[:options['show']]:
+            self.stdout.write(', '.join(map(str, group)))
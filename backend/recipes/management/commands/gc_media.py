@@ -0,0 +1,101 @@
+import os
+import time
+from pathlib import PurePath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db.models import Count, FileField
+
+
+def media_files(root):
+    """Файлы каталога медиа; обход без построения полного списка."""
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def file_fields():
+    """Все поля моделей, хранящие имена файлов из хранилища медиа."""
+    return [
+        (model, field.attname)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField)
+    ]
+
+
+def reference_counts(names, fields):
+    """Число записей, ссылающихся на каждый из файлов."""
+    counts = {}
+    for model, field in fields:
+        rows = model._default_manager.filter(
+            **{f'{field}__in': names}
+        ).values_list(field).annotate(references=Count('pk')).order_by()
+        for name, references in rows:
+            counts[name] = counts.get(name, 0) + references
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаление файлов медиа, на которые не ссылается ни одна запись. '
+        'Каталог обходится потоково, ссылки проверяются порциями по всем '
+        'файловым полям моделей; недавние файлы не удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int,
+            default=int(settings.MEDIA_GC_MIN_AGE.total_seconds()),
+            help='Минимальный возраст удаляемого файла в секундах.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        if not os.path.isdir(root):
+            self.stdout.write(f'Каталог {root} не найден')
+            return
+        self.fields = file_fields()
+        self.cutoff = time.time() - options['min_age']
+        self.dry_run = options['dry_run']
+        self.totals = {'files': 0, 'references': 0, 'removed': 0, 'size': 0}
+        batch = {}
+        for entry in media_files(root):
+            name = PurePath(os.path.relpath(entry.path, root)).as_posix()
+            batch[name] = entry
+            if len(batch) == options['batch_size']:
+                self.collect(batch)
+                batch = {}
+        if batch:
+            self.collect(batch)
+        action = 'К удалению' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            'Файлов: {files}, ссылок на них: {references}. '.format(
+                **self.totals)
+            + f'{action}: {self.totals["removed"]} '
+            f'({self.totals["size"] / 2 ** 20:.1f} МБ)'))
+
+    def collect(self, batch):
+        counts = reference_counts(list(batch), self.fields)
+        self.totals['files'] += len(batch)
+        self.totals['references'] += sum(counts.values())
+        for name, entry in batch.items():
+            if name in counts:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > self.cutoff:
+                continue
+            if self.dry_run:
+                self.stdout.write(name)
+            else:
+                os.remove(entry.path)
+            self.totals['removed'] += 1
+            self.totals['size'] += stat.st_size
@@ -0,0 +1,284 @@
+import base64
+import json
+import multiprocessing
+import os
+from collections import deque
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import IntegrityError, connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.ingredient_usage import add_recipes
+from recipes.models import TAG_BITS, Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.tag_masks import update_masks
+
+User = get_user_model()
+
+
+def read_batches(source, batch_size):
+    """
+    Порции строк NDJSON и смещение в байтах после каждой порции (для
+    возобновления с контрольной точки).
+    """
+    offset = source.tell()
+    lines = []
+    for line in source:
+        offset += len(line)
+        if line.strip():
+            lines.append(line)
+        if len(lines) == batch_size:
+            yield offset, lines
+            lines = []
+    if lines:
+        yield offset, lines
+
+
+def resolve_authors(records):
+    """Авторы по email; отсутствующие создаются без пароля."""
+    authors = {record['author']['email']: record['author']
+               for record in records}
+    User.objects.bulk_create(
+        [User(password=make_password(None), **data)
+         for data in authors.values()],
+        ignore_conflicts=True,
+    )
+    return {
+        user.email: user
+        for user in User.objects.filter(email__in=authors)
+    }
+
+
+def create_tag(data):
+    """
+    Новый тег. Тег сохраняется по одному, чтобы получить свободный бит
+    маски; если тот же бит одновременно занял другой процесс импорта,
+    попытка повторяется.
+    """
+    for _ in range(TAG_BITS):
+        try:
+            with transaction.atomic():
+                return Tag.objects.get_or_create(
+                    slug=data['slug'], defaults=data)[0]
+        except IntegrityError:
+            continue
+    raise CommandError(f'Не удалось создать тег {data["slug"]}')
+
+
+def resolve_tags(records):
+    """Теги по слагу; отсутствующие создаются из данных выгрузки."""
+    tags = {tag['slug']: tag for record in records for tag in record['tags']}
+    found = dict(Tag.objects.filter(slug__in=tags).values_list('slug', 'pk'))
+    for slug in tags.keys() - found.keys():
+        found[slug] = create_tag(tags[slug]).pk
+    return found
+
+
+def resolve_ingredients(records, create):
+    """Ингредиенты по естественному ключу (название, единица измерения)."""
+    keys = {
+        (item['name'], item['measurement_unit'])
+        for record in records for item in record['ingredients']
+    }
+    if create:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in keys],
+            ignore_conflicts=True,
+        )
+    found = Ingredient.objects.filter(
+        name__in={name for name, _ in keys}
+    ).values_list('name', 'measurement_unit', 'pk')
+    return {
+        (name, unit): pk for name, unit, pk in found if (name, unit) in keys
+    }
+
+
+def save_image(image):
+    if 'data' not in image:
+        return image['name']
+    return default_storage.save(
+        image['name'], ContentFile(base64.b64decode(image['data'])))
+
+
+def check_record(record, authors, ingredients):
+    """Текст ошибки, если рецепт нельзя импортировать."""
+    if record['author']['email'] not in authors:
+        return f'не удалось создать автора {record["author"]["email"]}'
+    missing = [
+        f'{item["name"]} ({item["measurement_unit"]})'
+        for item in record['ingredients']
+        if (item['name'], item['measurement_unit']) not in ingredients
+    ]
+    if missing:
+        return f'нет ингредиентов: {", ".join(missing)}'
+    return None
+
+
+def import_batch(lines, create_ingredients, offset):
+    """
+    Импорт порции рецептов в одной транзакции. Рецепты, которые уже есть
+    в базе (то же название у того же автора), пропускаются, поэтому
+    повторный импорт порции безопасен.
+    """
+    records = [json.loads(line) for line in lines]
+    errors = []
+    with transaction.atomic():
+        authors = resolve_authors(records)
+        tags = resolve_tags(records)
+        ingredients = resolve_ingredients(records, create_ingredients)
+        existing = set(Recipe.objects.filter(
+            author__in=authors.values(),
+            name__in={record['name'] for record in records},
+        ).values_list('author_id', 'name'))
+        accepted = []
+        for record in records:
+            error = check_record(record, authors, ingredients)
+            if error:
+                errors.append(f'рецепт {record.get("id")}: {error}')
+                continue
+            key = (authors[record['author']['email']].pk, record['name'])
+            if key not in existing:
+                existing.add(key)
+                accepted.append((key, record))
+        Recipe.objects.bulk_create(
+            [Recipe(
+                author_id=author_id,
+                name=name,
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=save_image(record['image']),
+            ) for (author_id, name), record in accepted],
+            ignore_conflicts=True,
+        )
+        recipe_ids = {
+            (author_id, name): pk
+            for author_id, name, pk in Recipe.objects.filter(
+                author_id__in={key[0] for key, _ in accepted},
+                name__in={key[1] for key, _ in accepted},
+            ).values_list('author_id', 'name', 'pk')
+        }
+        # bulk_create заполняет pub_date текущим временем (auto_now_add).
+        Recipe.objects.bulk_update(
+            [Recipe(pk=recipe_ids[key],
+                    pub_date=parse_datetime(record['pub_date']))
+             for key, record in accepted],
+            ['pub_date'],
+        )
+        Recipe.tags.through.objects.bulk_create(
+            [Recipe.tags.through(recipe_id=recipe_ids[key],
+                                 tag_id=tags[tag['slug']])
+             for key, record in accepted for tag in record['tags']],
+            ignore_conflicts=True,
+        )
+        update_masks(recipe_ids[key] for key, _ in accepted)
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(
+                recipe_id=recipe_ids[key],
+                ingredient_id=ingredients[
+                    (item['name'], item['measurement_unit'])],
+                amount=item['amount'],
+            ) for key, record in accepted for item in record['ingredients']],
+            ignore_conflicts=True,
+        )
+        add_recipes(recipe_ids[key] for key, _ in accepted)
+    return offset, len(accepted), len(records) - len(accepted), errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт рецептов из NDJSON-выгрузки export_recipes: порции '
+        'рецептов сохраняются через bulk_create в нескольких процессах. '
+        'После каждой порции смещение в файле записывается в контрольную '
+        'точку, и прерванный импорт продолжается с нее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл выгрузки.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <input>.checkpoint.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать импорт с начала, не учитывая контрольную точку.')
+        parser.add_argument(
+            '--create-ingredients', action='store_true',
+            help='Создавать ингредиенты, которых нет в базе.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать рейтинги, документы и индекс похожих '
+                 'рецептов после импорта.')
+
+    def handle(self, *args, **options):
+        path = Path(options['input'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден')
+        checkpoint = Path(
+            options['checkpoint'] or f'{path}.checkpoint')
+        offset = 0
+        if checkpoint.exists() and not options['restart']:
+            offset = json.loads(checkpoint.read_text())['offset']
+            self.stdout.write(f'Продолжение с байта {offset}')
+        self.totals = {'created': 0, 'skipped': 0, 'errors': 0}
+        with open(path, 'rb') as source:
+            source.seek(offset)
+            batches = read_batches(source, options['batch_size'])
+            if options['processes'] > 1:
+                self.run_parallel(batches, options, checkpoint)
+            else:
+                for end, lines in batches:
+                    self.collect(
+                        import_batch(
+                            lines, options['create_ingredients'], end),
+                        checkpoint)
+        checkpoint.unlink(missing_ok=True)
+        self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(
+            'Импортировано рецептов: {created}, пропущено: {skipped}, '
+            'с ошибками: {errors}'.format(**self.totals)))
+        if not options['no_rebuild']:
+            for command in ('update_recipe_scores', 'build_recipe_documents',
+                            'rebuild_similarity_index'):
+                call_command(command, stdout=self.stdout)
+
+    def run_parallel(self, batches, options, checkpoint):
+        """
+        Порции обрабатываются пулом процессов; одновременно в работе не
+        больше двух порций на процесс, а контрольная точка сдвигается
+        только после завершения всех предыдущих порций.
+        """
+        connections.close_all()
+        processes = options['processes']
+        context = multiprocessing.get_context('fork')
+        pending = deque()
+        with context.Pool(processes) as pool:
+            for end, lines in batches:
+                pending.append(pool.apply_async(
+                    import_batch,
+                    (lines, options['create_ingredients'], end)))
+                if len(pending) >= processes * 2:
+                    self.collect(pending.popleft().get(), checkpoint)
+            while pending:
+                self.collect(pending.popleft().get(), checkpoint)
+
+    def collect(self, result, checkpoint):
+        offset, created, skipped, errors = result
+        self.totals['created'] += created
+        self.totals['skipped'] += skipped - len(errors)
+        self.totals['errors'] += len(errors)
+        for error in errors:
+            self.stderr.write(error)
+        temporary = checkpoint.with_name(f'{checkpoint.name}.tmp')
+        temporary.write_text(json.dumps({'offset': offset}))
+        os.replace(temporary, checkpoint)
+        self.stderr.write(
+            'Обработано: {created} импортировано, {skipped} пропущено, '
+            '{errors} с ошибками'.format(**self.totals),
+            ending='\r',
+        )
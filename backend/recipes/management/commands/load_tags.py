@@ -14,6 +14,7 @@ class Command(BaseCommand):
                 encoding='utf-8'
         ) as file:
             reader = csv.DictReader(file)
-            Tag.objects.bulk_create(
-                Tag(**data) for data in reader)
+            # Теги сохраняются по одному: save() назначает бит маски тегов.
+            for data in reader:
+                Tag.objects.create(**data)
         self.stdout.write(self.style.SUCCESS('Теги успешно загружены в базу'))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from recipes.changes import prune
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаление надгробий удаленных объектов старше '
+        "SYNC['TOMBSTONE_RETENTION']. Клиенты с более старым курсором "
+        'синхронизации получают 410 и выполняют полную синхронизацию. '
+        'Запускается периодически (например, раз в сутки из cron).'
+    )
+
+    def handle(self, *args, **options):
+        count = prune()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено надгробий: {count}'))
@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+from recipes.similarity import build_signatures, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение LSH-индекса похожих рецептов. Сначала вычисляются '
+        'недостающие сигнатуры (или все сигнатуры с --all).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать сигнатуры всех рецептов.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(signature__isnull=True)
+        ids = list(recipes.values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            build_signatures(ids[start:start + batch_size])
+        indexed = rebuild_index(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Вычислено сигнатур: {len(ids)}, рецептов в индексе: {indexed}'))
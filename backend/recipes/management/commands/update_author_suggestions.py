@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from recipes.models import AuthorSuggestions
+from recipes.suggestions import load_graph, suggest
+
+# Матрицы загружаются до запуска процессов и достаются им при fork без
+# копирования и сериализации.
+graph = None
+
+
+def scan(arguments):
+    """Рекомендации для пачки пользователей в отдельном процессе."""
+    start, stop, top_k, weights = arguments
+    return suggest(graph, start, stop, top_k, weights)
+
+
+class Command(BaseCommand):
+    help = (
+        'Расчет рекомендаций авторов для /api/users/suggestions/ по '
+        'пересечению избранного с другими пользователями и подпискам '
+        'второго уровня. Пользователи обрабатываются пачками в нескольких '
+        'процессах. Запускается периодически (например, раз в сутки из '
+        'cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Пользователей в пачке.')
+        parser.add_argument('--top-k', type=int,
+                            default=settings.AUTHOR_SUGGESTIONS['TOP_K'])
+
+    def handle(self, *args, **options):
+        global graph
+        started = timezone.now()
+        graph = load_graph()
+        weights = (settings.AUTHOR_SUGGESTIONS['CO_FAVORITES_WEIGHT'],
+                   settings.AUTHOR_SUGGESTIONS['FOLLOWS_WEIGHT'])
+        users, batch_size = len(graph.user_ids), options['batch_size']
+        tasks = [
+            (start, min(start + batch_size, users), options['top_k'],
+             weights)
+            for start in range(0, users, batch_size)
+        ]
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        saved = 0
+        with context.Pool(options['processes']) as pool:
+            for suggestions in pool.imap_unordered(scan, tasks):
+                AuthorSuggestions.objects.bulk_create(
+                    [AuthorSuggestions(user_id=user_id, authors=authors)
+                     for user_id, authors in suggestions],
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['authors', 'updated'],
+                    batch_size=1000,
+                )
+                saved += len(suggestions)
+        # Списки пользователей, которым больше нечего рекомендовать.
+        stale, _ = AuthorSuggestions.objects.filter(
+            updated__lt=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {users}, с рекомендациями: {saved}, '
+            f'удалено устаревших списков: {stale}'))
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from recipes.ingredient_usage import recompute
+
+
+class Command(BaseCommand):
+    help = (
+        'Полный пересчет статистики использования ингредиентов. Счетчики '
+        'обновляются сигналами; команда исправляет расхождения после '
+        'изменений в обход моделей (например, запросов SQL).'
+    )
+
+    def handle(self, *args, **options):
+        count = recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана, используемых ингредиентов: {count}'))
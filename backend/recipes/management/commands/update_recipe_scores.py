@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.ranking import recompute
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет рейтингов рецептов popular и trending. Запускается '
+        'периодически (например, раз в час из cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = recompute(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны, рецептов с активностью: {count}'))
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes.tag_masks import recompute
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет масок тегов всех рецептов по таблице связей. Нужен после '
+        'изменения тегов рецептов в обход ORM (SQL, загрузка дампа).'
+    )
+
+    def handle(self, *args, **options):
+        count = recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f'Маски тегов пересчитаны, рецептов: {count}'))
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.10 on 2026-10-19 08:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    epoch = django.utils.timezone.now()
+    RecipeScore.objects.bulk_create(
+        RecipeScore(recipe_id=pk, epoch=epoch)
+        for pk in Recipe.objects.values_list('pk', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipedocument_alter_recipe_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriterecipeuser',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления в избранное'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcartuser',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления в список покупок'),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popular', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Тренд')),
+                ('epoch', models.DateTimeField(verbose_name='Точка отсчета рейтингов')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+                'indexes': [models.Index(fields=['-popular'], name='recipe_score_popular'), models.Index(fields=['-trending'], name='recipe_score_trending')],
+            },
+        ),
+        migrations.RunPython(create_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.10 on 2026-10-19 08:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('ingredients', models.BinaryField(verbose_name='Сигнатура ингредиентов и тегов')),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Сигнатура рецепта',
+                'verbose_name_plural': 'Сигнатуры рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-19 08:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_signatures(apps, schema_editor):
+    """
+    Сигнатуры без сигнатуры текста вычисляются заново командой
+    rebuild_similarity_index.
+    """
+    apps.get_model('recipes', 'RecipeSignature').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipesignature',
+            name='text',
+            field=models.BinaryField(default=b'', verbose_name='Сигнатура названия и описания'),
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField(verbose_name='Сходство')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата обнаружения')),
+                ('duplicate_of', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Похож на рецепт')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Возможный дубликат',
+                'verbose_name_plural': 'Возможные дубликаты',
+                'ordering': ('-similarity',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='duplicatecandidate',
+            constraint=models.UniqueConstraint(fields=('recipe', 'duplicate_of'), name='unique_duplicate_candidate'),
+        ),
+        migrations.RunPython(drop_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.10 on 2026-10-19 11:02
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def assign_bits(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    tags = list(Tag.objects.order_by('pk'))
+    if len(tags) > 63:
+        raise RuntimeError('Маска тегов вмещает не больше 63 тегов')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+
+
+def compute_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    whens = [
+        models.When(tag_id=pk, then=models.Value(1 << bit))
+        for pk, bit in Tag.objects.values_list('pk', 'bit')
+    ]
+    if not whens:
+        return
+    masks = (
+        Recipe.tags.through.objects
+        .filter(recipe_id=models.OuterRef('pk'))
+        .values('recipe_id')
+        .annotate(mask=models.Sum(models.Case(
+            *whens, default=models.Value(0),
+            output_field=models.BigIntegerField())))
+        .values('mask')
+    )
+    Recipe.objects.update(tag_mask=Coalesce(
+        models.Subquery(masks, output_field=models.BigIntegerField()),
+        models.Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, help_text='Номер бита тега в маске тегов рецепта', verbose_name='Бит тега'),
+        ),
+        migrations.RunPython(assign_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, help_text='Номер бита тега в маске тегов рецепта', verbose_name='Бит тега'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Сумма битов тегов рецепта для фильтрации по тегам', verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(compute_masks, migrations.RunPython.noop),
+    ]
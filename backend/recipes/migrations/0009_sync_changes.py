@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:06
+
+from django.db import migrations, models
+
+
+def set_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_tag_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Рецепт'), ('favorite', 'Избранное'), ('shopping_cart', 'Список покупок')], max_length=16, verbose_name='Вид объекта')),
+                ('recipe_id', models.PositiveBigIntegerField(verbose_name='Рецепт')),
+                ('user_id', models.PositiveBigIntegerField(blank=True, help_text='Владелец избранного или списка покупок', null=True, verbose_name='Пользователь')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Надгробие',
+                'verbose_name_plural': 'Надгробия',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Изменение рецепта, его ингредиентов или тегов', verbose_name='Дата изменения рецепта'),
+        ),
+        migrations.RunPython(set_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at', 'id'], name='recipe_updated_at'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_at'),
+        ),
+    ]
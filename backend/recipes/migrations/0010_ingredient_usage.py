@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_usage(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientUsage = apps.get_model('recipes', 'IngredientUsage')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    counts = {
+        pk: (recipes, carts)
+        for pk, recipes, carts in RecipeIngredient.objects.values(
+            'ingredient_id'
+        ).annotate(
+            recipe_count=models.Count('pk', distinct=True),
+            cart_count=models.Count('recipe__shopping_card'),
+        ).values_list('ingredient_id', 'recipe_count', 'cart_count')
+    }
+    IngredientUsage.objects.bulk_create(
+        [IngredientUsage(ingredient_id=pk,
+                         recipes=counts.get(pk, (0, 0))[0],
+                         shopping_carts=counts.get(pk, (0, 0))[1])
+         for pk in Ingredient.objects.values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_sync_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientUsage',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('recipes', models.IntegerField(default=0, verbose_name='Рецептов')),
+                ('shopping_carts', models.IntegerField(default=0, help_text='Число рецептов с ингредиентом в списках покупок', verbose_name='В списках покупок')),
+            ],
+            options={
+                'verbose_name': 'Использование ингредиента',
+                'verbose_name_plural': 'Использование ингредиентов',
+            },
+        ),
+        migrations.RunPython(compute_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredient_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCheckpoint',
+            fields=[
+                ('consumer', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Обработчик')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последнее обработанное событие')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Время обработки')),
+            ],
+            options={
+                'verbose_name': 'Позиция обработчика',
+                'verbose_name_plural': 'Позиции обработчиков',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('recipe_published', 'Рецепт опубликован'), ('recipe_edited', 'Рецепт изменен'), ('recipe_deleted', 'Рецепт удален'), ('favorited', 'Рецепт добавлен в избранное'), ('unfavorited', 'Рецепт убран из избранного'), ('carted', 'Рецепт добавлен в список покупок'), ('uncarted', 'Рецепт убран из списка покупок'), ('followed', 'Подписка на автора'), ('unfollowed', 'Отписка от автора')], max_length=32, verbose_name='Тип события')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные события')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Время события')),
+            ],
+            options={
+                'verbose_name': 'Событие журнала',
+                'verbose_name_plural': 'События журнала',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-19 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('recipes', '0011_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSuggestions',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_suggestions', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('authors', models.JSONField(default=list, help_text='Идентификаторы авторов', verbose_name='Рекомендованные авторы')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Время расчета')),
+            ],
+            options={
+                'verbose_name': 'Рекомендации авторов',
+                'verbose_name_plural': 'Рекомендации авторов',
+            },
+        ),
+    ]
@@ -1,11 +1,18 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.db.models.lookups import Exact, GreaterThan
+
+from users.models import Follow
 
 User = get_user_model()
 
+# Маска тегов рецепта хранится в знаковом 64-битном целом.
+TAG_BITS = 63
+
 
 class Tag(models.Model):
     """Модель тега"""
@@ -24,6 +31,11 @@ class Tag(models.Model):
         max_length=settings.CONTENT_MAX_LENGTH,
         verbose_name='Слаг тега',
         help_text='Введите слаг тега', )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит тега',
+        help_text='Номер бита тега в маске тегов рецепта', )
 
     class Meta:
         verbose_name = 'Тег'
@@ -39,6 +51,26 @@ class Tag(models.Model):
                 f' цвет: {self.color}'
                 f' Slug: {self.slug}')
 
+    @staticmethod
+    def free_bit():
+        """Наименьший бит, не занятый другим тегом, или None."""
+        used = set(Tag.objects.values_list('bit', flat=True))
+        return next(
+            (bit for bit in range(TAG_BITS) if bit not in used), None)
+
+    def clean(self):
+        if self.bit is None and self.free_bit() is None:
+            raise ValidationError(
+                f'Тегов не может быть больше {TAG_BITS}')
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.free_bit()
+            if self.bit is None:
+                raise ValidationError(
+                    f'Тегов не может быть больше {TAG_BITS}')
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     """Модель избранного ингредиента"""
@@ -65,6 +97,26 @@ class Ingredient(models.Model):
         return f'{self.name} {self.measurement_unit}'
 
 
+def tags_mask(tags):
+    """Маска набора тегов: сумма их битов."""
+    mask = 0
+    for tag in tags:
+        mask |= 1 << tag.bit
+    return mask
+
+
+def has_tags(mask, match='any'):
+    """
+    Условие на маску тегов рецепта: есть любой (match='any') или все
+    (match='all') теги из mask. Годится и для filter(), и для filter=
+    агрегатов.
+    """
+    matched = F('tag_mask').bitand(mask)
+    if match == 'all':
+        return Exact(matched, mask)
+    return GreaterThan(matched, 0)
+
+
 class RecipeQuerySet(models.QuerySet):
     """
     Добавление поля is_favorited для определения добавления рецепта
@@ -72,27 +124,68 @@ class RecipeQuerySet(models.QuerySet):
     Добавление поля is_in_shopping_cart для определения добавления рецепта
     в список покупок.
     """
-    def filter_by_tags(self, tags):
-        if tags:
-            return self.filter(tags__slug__in=tags).distinct()
-        return self
-
-    def add_user_annotations(self, user_id):
-        return self.annotate(
-            is_favorited=Exists(
+    def filter_by_tags(self, tags, match='any'):
+        """
+        Рецепты с любым (match='any') или со всеми (match='all') тегами
+        из tags. Условие побитовое на столбец tag_mask рецепта, поэтому
+        не нужны ни соединение с таблицей связей, ни DISTINCT.
+        """
+        mask = tags_mask(tags)
+        if not mask:
+            return self
+        return self.filter(has_tags(mask, match))
+
+    @staticmethod
+    def user_flags(user_id):
+        """Признаки рецепта для пользователя: в избранном, в списке покупок."""
+        return {
+            'is_favorited': Exists(
                 FavoriteRecipeUser.objects.filter(
                     user_id=user_id, recipe__pk=OuterRef('pk')
                 )
             ),
-            is_in_shopping_cart=Exists(
+            'is_in_shopping_cart': Exists(
                 ShoppingCartUser.objects.filter(
                     user_id=user_id, recipe__pk=OuterRef('pk'))
             ),
-            in_shopping_cart=Exists(
-                ShoppingCartUser.objects.filter(
-                    user_id=user_id, recipe__pk=OuterRef('pk'))
-            )
-        )
+        }
+
+    def add_user_annotations(self, user_id):
+        flags = self.user_flags(user_id)
+        return self.annotate(
+            **flags, in_shopping_cart=flags['is_in_shopping_cart'])
+
+    def with_related(self, user_id, relations=None):
+        """
+        Предварительная загрузка связанных данных, чтобы сериализация
+        списка не выполняла запросов на каждый рецепт. relations задает
+        нужные связи ('author', 'tags', 'ingredients') и признак того,
+        нужен ли вложенный объект целиком или только идентификатор;
+        по умолчанию загружаются все связи целиком.
+        """
+        if relations is None:
+            relations = dict.fromkeys(('author', 'tags', 'ingredients'), True)
+        lookups = []
+        if relations.get('author'):
+            lookups.append(Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Exists(
+                        Follow.objects.filter(
+                            user_id=user_id, author=OuterRef('pk'))
+                    )
+                )
+            ))
+        if 'tags' in relations:
+            lookups.append('tags')
+        if 'ingredients' in relations:
+            recipe_ingredients = RecipeIngredient.objects.all()
+            if relations['ingredients']:
+                recipe_ingredients = recipe_ingredients.select_related(
+                    'ingredient')
+            lookups.append(
+                Prefetch('recipe_ingredients', queryset=recipe_ingredients))
+        return self.prefetch_related(*lookups)
 
 
 class Recipe(models.Model):
@@ -122,6 +215,12 @@ class Recipe(models.Model):
                                help_text="Введите автора рецепта",
                                on_delete=models.CASCADE, )
     tags = models.ManyToManyField(Tag, related_name="tags")
+    tag_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов',
+        help_text='Сумма битов тегов рецепта для фильтрации по тегам',
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -132,12 +231,22 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта',
         help_text="Введите дату публикации поста",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения рецепта',
+        help_text='Изменение рецепта, его ингредиентов или тегов',
+    )
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date'),
+            models.Index(fields=['updated_at', 'id'],
+                         name='recipe_updated_at'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'author'], name='unique_name_author_recip'
@@ -148,6 +257,145 @@ class Recipe(models.Model):
         return f'Рецепт: {self.name}'
 
 
+class RecipeDocument(models.Model):
+    """
+    Заранее сериализованный JSON-документ рецепта. Поля, зависящие от
+    пользователя, и адрес сервера в ссылке на изображение заменены в
+    документе нулевыми байтами и подставляются при ответе.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    body = models.BinaryField(verbose_name='JSON-документ рецепта')
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+
+class RecipeScore(models.Model):
+    """
+    Рейтинги рецепта по активности пользователей (избранное и список
+    покупок) с экспоненциальным затуханием, см. recipes/ranking.py.
+    Значения хранятся относительно общей для всех строк точки отсчета
+    epoch, поэтому новые события добавляются к рейтингу без пересчета.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    popular = models.FloatField(default=0, verbose_name='Популярность')
+    trending = models.FloatField(default=0, verbose_name='Тренд')
+    epoch = models.DateTimeField(verbose_name='Точка отсчета рейтингов')
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=['-popular'], name='recipe_score_popular'),
+            models.Index(fields=['-trending'], name='recipe_score_trending'),
+        ]
+
+
+class IngredientUsage(models.Model):
+    """
+    Статистика использования ингредиента, см. recipes/ingredient_usage.py:
+    в скольких рецептах он встречается и сколько раз рецепты с ним
+    добавлены в списки покупок. Счетчики обновляются при каждом изменении
+    рецептов и списков покупок и задают порядок ?ordering=popularity.
+    """
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='usage',
+        verbose_name='Ингредиент',
+    )
+    recipes = models.IntegerField(default=0, verbose_name='Рецептов')
+    shopping_carts = models.IntegerField(
+        default=0, verbose_name='В списках покупок',
+        help_text='Число рецептов с ингредиентом в списках покупок')
+
+    class Meta:
+        verbose_name = 'Использование ингредиента'
+        verbose_name_plural = 'Использование ингредиентов'
+
+    def __str__(self):
+        return str(self.ingredient)
+
+
+class RecipeSignature(models.Model):
+    """
+    MinHash-сигнатуры рецепта для поиска похожих рецептов и
+    почти-дубликатов, см. recipes/similarity.py.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт',
+    )
+    ingredients = models.BinaryField(
+        verbose_name='Сигнатура ингредиентов и тегов')
+    text = models.BinaryField(
+        default=b'', verbose_name='Сигнатура названия и описания')
+    updated = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата обновления',
+    )
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+
+class DuplicateCandidate(models.Model):
+    """
+    Рецепт, похожий на ранее опубликованный рецепт (возможно, любого
+    другого автора) по ингредиентам, названию и описанию.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='duplicate_candidates',
+        verbose_name='Рецепт',
+    )
+    duplicate_of = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похож на рецепт',
+    )
+    similarity = models.FloatField(verbose_name='Сходство')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата обнаружения',
+    )
+
+    class Meta:
+        verbose_name = 'Возможный дубликат'
+        verbose_name_plural = 'Возможные дубликаты'
+        ordering = ('-similarity',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'duplicate_of'],
+                name='unique_duplicate_candidate'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} похож на {self.duplicate_of}'
+
+
 class RecipeIngredient(models.Model):
     """Модель для связи рецепта и соответствующих ему ингредиентов."""
     ingredient = models.ForeignKey(
@@ -224,6 +472,10 @@ class ShoppingCartUser(models.Model):
         related_name='shopping_card',
         verbose_name='Рецепт из списка покупок пользователя',
         help_text='Рецепт в списке покупок', )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления в список покупок',
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -254,6 +506,10 @@ class FavoriteRecipeUser(models.Model):
         verbose_name='Избранный рецепт определенного пользователя',
         help_text='Избранный рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления в избранное',
+    )
 
     class Meta:
         verbose_name = 'Список избранного'
@@ -266,3 +522,150 @@ class FavoriteRecipeUser(models.Model):
 
     def __str__(self):
         return f'У {self.user} в избранном рецепт: {self.recipe}'
+
+
+class Tombstone(models.Model):
+    """
+    Надгробие удаленного объекта для синхронизации клиентов: удаленный
+    рецепт или рецепт, убранный из избранного или списка покупок
+    пользователя.
+    """
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    kind = models.CharField(
+        max_length=16,
+        choices=KINDS,
+        verbose_name='Вид объекта',
+    )
+    recipe_id = models.PositiveBigIntegerField(verbose_name='Рецепт')
+    user_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Пользователь',
+        help_text='Владелец избранного или списка покупок',
+    )
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата удаления',
+    )
+
+    class Meta:
+        verbose_name = 'Надгробие'
+        verbose_name_plural = 'Надгробия'
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'],
+                         name='tombstone_deleted_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.recipe_id} удален'
+
+
+class OutboxEvent(models.Model):
+    """
+    Доменное событие, записанное в той же транзакции, что и изменение
+    (recipes/outbox.py). События обрабатывает команда consume_events.
+    """
+    RECIPE_PUBLISHED = 'recipe_published'
+    RECIPE_EDITED = 'recipe_edited'
+    RECIPE_DELETED = 'recipe_deleted'
+    FAVORITED = 'favorited'
+    UNFAVORITED = 'unfavorited'
+    CARTED = 'carted'
+    UNCARTED = 'uncarted'
+    FOLLOWED = 'followed'
+    UNFOLLOWED = 'unfollowed'
+    TYPES = (
+        (RECIPE_PUBLISHED, 'Рецепт опубликован'),
+        (RECIPE_EDITED, 'Рецепт изменен'),
+        (RECIPE_DELETED, 'Рецепт удален'),
+        (FAVORITED, 'Рецепт добавлен в избранное'),
+        (UNFAVORITED, 'Рецепт убран из избранного'),
+        (CARTED, 'Рецепт добавлен в список покупок'),
+        (UNCARTED, 'Рецепт убран из списка покупок'),
+        (FOLLOWED, 'Подписка на автора'),
+        (UNFOLLOWED, 'Отписка от автора'),
+    )
+
+    type = models.CharField(
+        max_length=32,
+        choices=TYPES,
+        verbose_name='Тип события',
+    )
+    payload = models.JSONField(default=dict, verbose_name='Данные события')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время события',
+    )
+
+    class Meta:
+        verbose_name = 'Событие журнала'
+        verbose_name_plural = 'События журнала'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.pk}: {self.get_type_display()}'
+
+
+class OutboxCheckpoint(models.Model):
+    """Последнее обработанное обработчиком событие журнала."""
+
+    consumer = models.CharField(
+        max_length=64,
+        primary_key=True,
+        verbose_name='Обработчик',
+    )
+    position = models.BigIntegerField(
+        default=0,
+        verbose_name='Последнее обработанное событие',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Время обработки',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция обработчика'
+        verbose_name_plural = 'Позиции обработчиков'
+
+    def __str__(self):
+        return f'{self.consumer}: {self.position}'
+
+
+class AuthorSuggestions(models.Model):
+    """
+    Авторы, которых стоит посмотреть пользователю, в порядке убывания
+    оценки. Списки строит команда update_author_suggestions, см.
+    recipes/suggestions.py.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='author_suggestions',
+        verbose_name='Пользователь',
+    )
+    authors = models.JSONField(
+        default=list,
+        verbose_name='Рекомендованные авторы',
+        help_text='Идентификаторы авторов',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Время расчета',
+    )
+
+    class Meta:
+        verbose_name = 'Рекомендации авторов'
+        verbose_name_plural = 'Рекомендации авторов'
+
+    def __str__(self):
+        return f'Рекомендации авторов для {self.user}'
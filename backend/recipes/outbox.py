@@ -0,0 +1,109 @@
+"""
+Журнал доменных событий (transactional outbox).
+
+Событие записывается в OutboxEvent сигналом изменения в той же
+транзакции, что и само изменение: откат транзакции отменяет и событие.
+Пути записи API (создание и изменение рецепта, избранное, список покупок,
+подписки) выполняются в atomic.
+
+Команда consume_events передает события обработчикам из
+settings.OUTBOX['HANDLERS'] пачками в порядке идентификаторов. Позиция
+каждого обработчика хранится в OutboxCheckpoint и сдвигается в одной
+транзакции с обработкой пачки, поэтому изменения обработчика в базе
+применяются ровно один раз. Обработчик — функция, которая принимает
+список событий.
+
+Идентификаторы выдаются при вставке, а видны после фиксации: событие
+параллельной транзакции может появиться позже события с большим
+идентификатором. Пропуск в идентификаторах считается такой транзакцией,
+пока следующее за ним событие моложе OUTBOX['GAP_TIMEOUT'], и обработка
+останавливается перед ним; более старые пропуски — откаченные
+транзакции.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxCheckpoint, OutboxEvent
+
+RECIPE_CHANGES = (OutboxEvent.RECIPE_PUBLISHED, OutboxEvent.RECIPE_EDITED)
+
+
+def emit(event_type, **payload):
+    OutboxEvent.objects.create(type=event_type, payload=payload)
+
+
+def handlers():
+    """Обработчики из настроек: {имя: функция}."""
+    return {
+        name: import_string(path)
+        for name, path in settings.OUTBOX['HANDLERS'].items()
+    }
+
+
+def recipe_ids(events, types=RECIPE_CHANGES):
+    """Рецепты событий указанных типов."""
+    return {
+        event.payload['recipe'] for event in events if event.type in types
+    }
+
+
+def without_gaps(events, position):
+    """Начало пачки до первого пропуска, который еще может заполниться."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.OUTBOX['GAP_TIMEOUT'])
+    expected = position + 1
+    for index, event in enumerate(events):
+        if event.pk != expected and event.created > deadline:
+            return events[:index]
+        expected = event.pk + 1
+    return events
+
+
+def consume(name, handler, batch_size=None):
+    """
+    Обработка следующей пачки событий обработчиком name; возвращает
+    число обработанных событий.
+    """
+    batch_size = batch_size or settings.OUTBOX['BATCH_SIZE']
+    with transaction.atomic():
+        # Блокировка позиции не дает двум процессам обработать одну
+        # пачку одним обработчиком.
+        checkpoint, _ = OutboxCheckpoint.objects.select_for_update(
+        ).get_or_create(consumer=name)
+        events = without_gaps(list(OutboxEvent.objects.filter(
+            pk__gt=checkpoint.position).order_by('pk')[:batch_size]),
+            checkpoint.position)
+        if events:
+            handler(events)
+            checkpoint.position = events[-1].pk
+            checkpoint.save(update_fields=['position', 'updated'])
+    return len(events)
+
+
+def lag(names):
+    """Необработанных событий у каждого обработчика: {имя: число}."""
+    positions = dict(OutboxCheckpoint.objects.filter(
+        consumer__in=names).values_list('consumer', 'position'))
+    return {
+        name: OutboxEvent.objects.filter(
+            pk__gt=positions.get(name, 0)).count()
+        for name in names
+    }
+
+
+def prune(names):
+    """
+    Удаление событий, обработанных всеми обработчиками names; возвращает
+    число удаленных событий.
+    """
+    checkpoints = OutboxCheckpoint.objects.filter(consumer__in=names)
+    if checkpoints.count() < len(names):
+        return 0
+    position = checkpoints.aggregate(position=Min('position'))['position']
+    deleted, _ = OutboxEvent.objects.filter(pk__lte=position).delete()
+    return deleted
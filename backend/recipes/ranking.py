@@ -0,0 +1,125 @@
+"""
+Рейтинги рецептов popular и trending.
+
+Рейтинг рецепта — сумма весов событий (добавлений в избранное и в список
+покупок), затухающих экспоненциально с заданным периодом полураспада:
+
+    score(t) = Σ w · 2 ** (-(t - t_i) / half_life).
+
+Множитель 2 ** (-t / half_life) у всех рецептов общий и на порядок не
+влияет, поэтому в RecipeScore хранится Σ w · 2 ** ((t_i - epoch) / half_life)
+для общей точки отсчета epoch. Новое событие прибавляет к строке рейтинга
+свое слагаемое, удаление события — вычитает его. Команда
+update_recipe_scores периодически пересчитывает рейтинги с epoch, равной
+текущему моменту, чтобы показатели степени оставались небольшими; если
+она давно не запускалась, record сам выполняет пересчет, прежде чем
+показатель превысит MAX_EXPONENT.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FavoriteRecipeUser, Recipe, RecipeScore, ShoppingCartUser
+
+RANKINGS = ('popular', 'trending')
+# Предел показателя степени: 2 ** 1024 не помещается в float, а точность
+# сумм теряется намного раньше.
+MAX_EXPONENT = 500
+
+
+def event_weights():
+    return {
+        FavoriteRecipeUser: settings.RECIPE_RANKING['FAVORITE_WEIGHT'],
+        ShoppingCartUser: settings.RECIPE_RANKING['SHOPPING_CART_WEIGHT'],
+    }
+
+
+def half_life(name):
+    return settings.RECIPE_RANKING[f'{name.upper()}_HALF_LIFE'].total_seconds()
+
+
+def exponent(moment, epoch):
+    """Наибольший показатель степени слагаемого события в момент moment."""
+    offset = (moment - epoch).total_seconds()
+    return max(offset / half_life(name) for name in RANKINGS)
+
+
+def contributions(weight, moment, epoch):
+    """Слагаемые события с весом weight для каждого из рейтингов."""
+    offset = (moment - epoch).total_seconds()
+    return {
+        name: weight * 2 ** (offset / half_life(name)) for name in RANKINGS
+    }
+
+
+@transaction.atomic
+def create_score(recipe_id):
+    """
+    Пустой рейтинг нового рецепта с общей точкой отсчета. Блокировка
+    строки рейтинга ждет завершения пересчета, сменившего точку отсчета.
+    """
+    epoch = RecipeScore.objects.select_for_update().values_list(
+        'epoch', flat=True).first()
+    RecipeScore.objects.get_or_create(
+        recipe_id=recipe_id, defaults={'epoch': epoch or timezone.now()})
+
+
+@transaction.atomic
+def record(event, sign):
+    """
+    Учет добавления (sign=1) или удаления (sign=-1) события event —
+    объекта FavoriteRecipeUser или ShoppingCartUser. Строка рейтинга
+    блокируется до чтения точки отсчета: во время пересчета запись ждет
+    его завершения и прибавляет слагаемое к новым значениям.
+    """
+    scores = RecipeScore.objects.filter(recipe_id=event.recipe_id)
+    epoch = scores.select_for_update().values_list(
+        'epoch', flat=True).first()
+    if epoch is None:
+        return
+    if exponent(event.created, epoch) > MAX_EXPONENT:
+        # Событие уже записано или удалено в этой транзакции, поэтому
+        # пересчет с новой точкой отсчета его учитывает.
+        recompute()
+        return
+    weight = sign * event_weights()[type(event)]
+    scores.update(**{
+        name: F(name) + value
+        for name, value in contributions(weight, event.created, epoch).items()
+    })
+
+
+@transaction.atomic
+def recompute(batch_size=2000):
+    """
+    Полный пересчет рейтингов; возвращает число рецептов с событиями.
+    События читаются после блокировки всех строк рейтингов: запись
+    record, зафиксированная раньше, попадает в прочитанные события, а
+    более поздняя ждет конца пересчета.
+    """
+    list(RecipeScore.objects.select_for_update().order_by('pk').values_list(
+        'pk', flat=True))
+    now = timezone.now()
+    scores = defaultdict(lambda: dict.fromkeys(RANKINGS, 0.0))
+    for model, weight in event_weights().items():
+        events = model.objects.values_list('recipe_id', 'created')
+        for recipe_id, created in events.iterator(chunk_size=batch_size):
+            for name, value in contributions(weight, created, now).items():
+                scores[recipe_id][name] += value
+    missing = Recipe.objects.filter(score__isnull=True).values_list(
+        'pk', flat=True)
+    RecipeScore.objects.bulk_create(
+        [RecipeScore(recipe_id=pk, epoch=now) for pk in missing],
+        ignore_conflicts=True,
+    )
+    RecipeScore.objects.update(popular=0, trending=0, epoch=now)
+    RecipeScore.objects.bulk_update(
+        [RecipeScore(recipe_id=pk, **values)
+         for pk, values in scores.items()],
+        RANKINGS,
+        batch_size=batch_size,
+    )
+    return len(scores)
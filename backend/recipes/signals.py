@@ -0,0 +1,181 @@
+"""
+Инкрементальное обновление рейтингов, сигнатур и масок тегов рецептов,
+статистики использования ингредиентов, журнала изменений для
+синхронизации клиентов и журнала доменных событий.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from users.models import Follow
+
+from . import changes, ingredient_usage, outbox, ranking, similarity, tag_masks
+from .models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    OutboxEvent,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartUser,
+    Tag,
+    Tombstone,
+    has_tags,
+)
+
+USER_LIST_EVENTS = {
+    FavoriteRecipeUser: (OutboxEvent.FAVORITED, OutboxEvent.UNFAVORITED),
+    ShoppingCartUser: (OutboxEvent.CARTED, OutboxEvent.UNCARTED),
+}
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        ranking.create_score(instance.pk)
+    similarity.invalidate([instance.pk])
+    outbox.emit(
+        OutboxEvent.RECIPE_PUBLISHED if created else OutboxEvent.RECIPE_EDITED,
+        recipe=instance.pk, author=instance.author_id)
+
+
+@receiver(post_save, sender=FavoriteRecipeUser)
+@receiver(post_save, sender=ShoppingCartUser)
+def activity_added(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ranking.record(instance, 1)
+        outbox.emit(USER_LIST_EVENTS[sender][0],
+                    recipe=instance.recipe_id, user=instance.user_id)
+
+
+@receiver(post_delete, sender=FavoriteRecipeUser)
+@receiver(post_delete, sender=ShoppingCartUser)
+def activity_removed(sender, instance, **kwargs):
+    ranking.record(instance, -1)
+    kind = (Tombstone.FAVORITE if sender is FavoriteRecipeUser
+            else Tombstone.SHOPPING_CART)
+    changes.bury(kind, instance.recipe_id, instance.user_id)
+    outbox.emit(USER_LIST_EVENTS[sender][1],
+                recipe=instance.recipe_id, user=instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCartUser)
+def cart_added(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ingredient_usage.cart_changed(instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=ShoppingCartUser)
+def cart_removed(sender, instance, **kwargs):
+    ingredient_usage.cart_changed(instance.recipe_id, -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    ingredient_usage.recipe_deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    changes.bury(Tombstone.RECIPE, instance.pk)
+    ingredient_usage.recipe_deleted(instance.pk)
+    outbox.emit(OutboxEvent.RECIPE_DELETED,
+                recipe=instance.pk, author=instance.author_id)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        similarity.invalidate([instance.recipe_id])
+        changes.touch_ids([instance.recipe_id])
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(sender, instance, raw, **kwargs):
+    # Прежний ингредиент строки нужен, чтобы перенести его статистику.
+    instance.previous_ingredient_id = None
+    if not (raw or instance._state.adding):
+        instance.previous_ingredient_id = RecipeIngredient.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', flat=True).first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, 'previous_ingredient_id', None)
+    if previous is not None and previous != instance.ingredient_id:
+        ingredient_usage.ingredient_changed(instance.recipe_id, previous, -1)
+    if created or previous not in (None, instance.ingredient_id):
+        ingredient_usage.ingredient_changed(
+            instance.recipe_id, instance.ingredient_id, 1)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    ingredient_usage.ingredient_changed(
+        instance.recipe_id, instance.ingredient_id, -1)
+
+
+def tag_recipes(tag):
+    return Recipe.objects.filter(has_tags(1 << tag.bit))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        # Маска выставляется и у объекта, чтобы последующий save()
+        # рецепта не записал старое значение.
+        tag_masks.update_recipe_mask(instance)
+        similarity.invalidate([instance.pk])
+        changes.touch_ids([instance.pk])
+    elif action == 'post_clear':
+        # Рецепты тега после очистки таблицы связей известны только по
+        # маске: они отмечаются измененными, и бит тега снимается.
+        changes.touch(tag_recipes(instance))
+        tag_masks.clear_bit(instance)
+    elif pk_set:
+        tag_masks.update_masks(pk_set)
+        similarity.invalidate(pk_set)
+        changes.touch_ids(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, raw, **kwargs):
+    if not (created or raw):
+        changes.touch(tag_recipes(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    changes.touch(tag_recipes(instance))
+    tag_masks.clear_bit(instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, raw, **kwargs):
+    if not (created or raw):
+        changes.touch(Recipe.objects.filter(
+            recipe_ingredients__ingredient=instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        outbox.emit(OutboxEvent.FOLLOWED,
+                    user=instance.user_id, author=instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    outbox.emit(OutboxEvent.UNFOLLOWED,
+                user=instance.user_id, author=instance.author_id)
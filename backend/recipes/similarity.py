@@ -0,0 +1,648 @@
+"""
+Поиск похожих рецептов и почти-дубликатов.
+
+Для каждого рецепта вычисляются две MinHash-сигнатуры: множества
+ингредиентов и тегов (ingredients) и множества шинглов — подстрок из
+SHINGLE_SIZE символов — названия и описания (text). Доля совпадающих
+позиций двух сигнатур оценивает коэффициент Жаккара множеств. Сигнатуры
+хранятся в RecipeSignature и обновляются после фиксации транзакции,
+изменившей рецепт, его ингредиенты или теги.
+
+Сигнатуры разбиваются на BANDS полос по ROWS позиций (LSH): рецепты,
+у которых совпала хотя бы одна полоса, считаются кандидатами, и
+сравнивается только их сигнатура. Индекс полос строится командой
+rebuild_similarity_index и хранится на диске в виде .npy-файлов, которые
+открываются через mmap и поэтому делятся между воркерами. Сигнатуры,
+измененные после построения индекса, процесс держит в памяти и дочитывает
+из базы данных только новые строки; они заменяют данные индекса. Когда
+таких сигнатур становится больше SIMILARITY_INDEX_MAX_CHANGES (или индекса
+еще нет), обработчик журнала событий перестраивает индекс.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import outbox
+from .models import (
+    DuplicateCandidate,
+    Recipe,
+    RecipeIngredient,
+    RecipeSignature,
+)
+
+SIGNATURE_SIZE = 64
+BANDS = 32
+ROWS = SIGNATURE_SIZE // BANDS
+# Ограничение числа кандидатов из одной корзины: рецепты из одних и тех же
+# распространенных ингредиентов образуют очень большие корзины.
+MAX_BUCKET_SIZE = 128
+EMPTY = np.iinfo(np.uint32).max
+KINDS = ('ingredients', 'text')
+SHINGLE_SIZE = 5
+SHINGLE_BASE = np.uint64(0x100000001B3)
+MAX_TEXT_LENGTH = 5000
+NON_WORDS = re.compile(r'[\W_]+')
+# Сигнатура записывается с временем вычисления, а видна после фиксации
+# транзакции: строки за последние CHANGES_OVERLAP перечитываются.
+CHANGES_OVERLAP = timedelta(seconds=60)
+
+_random = np.random.default_rng(2504)
+HASH_A = _random.integers(1, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64) | 1
+HASH_B = _random.integers(0, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64)
+BAND_MULTIPLIERS = _random.integers(1, 2 ** 63, ROWS, dtype=np.uint64) | 1
+
+
+def mix(values):
+    """Перемешивание битов 64-битных значений (финализатор splitmix64)."""
+    values = np.asarray(values, dtype=np.uint64)
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def feature_tokens(ingredient_ids, tag_ids):
+    """Элементы множества рецепта: ингредиенты и теги не пересекаются."""
+    return np.concatenate([
+        np.asarray(ingredient_ids, dtype=np.uint64) * np.uint64(2),
+        np.asarray(tag_ids, dtype=np.uint64) * np.uint64(2) + np.uint64(1),
+    ])
+
+
+def text_tokens(name, text):
+    """
+    Хеши шинглов названия и описания рецепта. Регистр, пунктуация и
+    пробелы не учитываются, длинные описания обрезаются.
+    """
+    normalized = NON_WORDS.sub(' ', f'{name} {text}'.lower()).strip()
+    normalized = normalized[:MAX_TEXT_LENGTH].ljust(SHINGLE_SIZE)
+    codes = np.frombuffer(
+        normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    count = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * SHINGLE_BASE + codes[offset:offset + count]
+    return np.unique(hashes)
+
+
+def token_hashes(tokens):
+    """Значения SIGNATURE_SIZE хеш-функций для каждого элемента."""
+    mixed = mix(tokens)[:, None]
+    return ((mixed * HASH_A + HASH_B) >> np.uint64(32)).astype(np.uint32)
+
+
+def minhash(tokens):
+    if not len(tokens):
+        return np.full(SIGNATURE_SIZE, EMPTY, dtype=np.uint32)
+    return token_hashes(tokens).min(axis=0)
+
+
+def minhash_many(token_lists, chunk_size=20000):
+    """Сигнатуры нескольких множеств: матрица (len(token_lists), SIZE)."""
+    signatures = np.full(
+        (len(token_lists), SIGNATURE_SIZE), EMPTY, dtype=np.uint32)
+    for start in range(0, len(token_lists), chunk_size):
+        chunk = token_lists[start:start + chunk_size]
+        lengths = np.fromiter((len(tokens) for tokens in chunk), np.int64,
+                              len(chunk))
+        filled = np.flatnonzero(lengths)
+        if not len(filled):
+            continue
+        offsets = np.concatenate([[0], np.cumsum(lengths[filled])[:-1]])
+        hashes = token_hashes(np.concatenate([chunk[i] for i in filled]))
+        signatures[start + filled] = np.minimum.reduceat(
+            hashes, offsets, axis=0)
+    return signatures
+
+
+def band_keys(signatures):
+    """Ключи LSH-полос: матрица (BANDS, len(signatures))."""
+    bands = signatures.reshape(-1, BANDS, ROWS).astype(np.uint64)
+    return mix((bands * BAND_MULTIPLIERS).sum(axis=2)).T
+
+
+def is_empty(signature):
+    return bool(signature[0] == EMPTY)
+
+
+class SimilarityIndex:
+    """
+    LSH-индекс сигнатур. Файлы каталога:
+    ids.npy — идентификаторы рецептов по возрастанию;
+    signatures.npy — сигнатуры в том же порядке;
+    keys.npy и rows.npy — отсортированные ключи каждой полосы и номера
+    строк с этими ключами;
+    meta.json — время начала построения индекса.
+    """
+
+    FILES = ('ids', 'signatures', 'keys', 'rows')
+
+    def __init__(self, ids, signatures, keys, rows, built_at=None):
+        self.ids = ids
+        self.signatures = signatures
+        self.keys = keys
+        self.rows = rows
+        self.built_at = built_at
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty((0, SIGNATURE_SIZE), dtype=np.uint32),
+            np.empty((BANDS, 0), dtype=np.uint64),
+            np.empty((BANDS, 0), dtype=np.int32),
+        )
+
+    @classmethod
+    def load(cls, path):
+        arrays = {
+            name: np.asarray(
+                np.load(Path(path, f'{name}.npy'), mmap_mode='r'))
+            for name in cls.FILES
+        }
+        meta = json.loads(Path(path, 'meta.json').read_text())
+        return cls(built_at=parse_datetime(meta['built_at']), **arrays)
+
+    @classmethod
+    def write(cls, path, ids, signatures, built_at):
+        """Построение индекса из сигнатур и запись в каталог path."""
+        keep = signatures[:, 0] != EMPTY
+        ids, signatures = ids[keep], signatures[keep]
+        order = np.argsort(ids, kind='stable')
+        ids, signatures = ids[order], signatures[order]
+        keys = band_keys(signatures)
+        rows = np.argsort(keys, axis=1, kind='stable')
+        keys = np.take_along_axis(keys, rows, axis=1)
+        path.mkdir(parents=True)
+        for name, array in (('ids', ids), ('signatures', signatures),
+                            ('keys', keys), ('rows', rows.astype(np.int32))):
+            np.save(Path(path, f'{name}.npy'), array)
+        Path(path, 'meta.json').write_text(
+            json.dumps({'built_at': built_at.isoformat(), 'size': len(ids)}))
+        return len(ids)
+
+    def warm(self):
+        """Чтение файлов индекса целиком, чтобы они попали в page cache."""
+        for name in self.FILES:
+            getattr(self, name).max(initial=0)
+
+    def signature(self, recipe_id):
+        row = np.searchsorted(self.ids, recipe_id)
+        if row < len(self.ids) and self.ids[row] == recipe_id:
+            return np.asarray(self.signatures[row])
+        return None
+
+    def signatures_of(self, ids):
+        """
+        Сигнатуры рецептов ids (пустые для отсутствующих в индексе) и
+        признак наличия рецепта в индексе.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        signatures = np.full((len(ids), SIGNATURE_SIZE), EMPTY,
+                             dtype=np.uint32)
+        if not len(self.ids):
+            return signatures, np.zeros(len(ids), dtype=bool)
+        rows = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        found = self.ids[rows] == ids
+        signatures[found] = self.signatures[rows[found]]
+        return signatures, found
+
+    def candidates(self, signature):
+        """Строки индекса, у которых совпала хотя бы одна полоса."""
+        query = band_keys(signature[None, :])[:, 0]
+        found = []
+        for band, key in enumerate(query):
+            keys = self.keys[band]
+            start = np.searchsorted(keys, key, side='left')
+            stop = np.searchsorted(keys, key, side='right')
+            stop = min(stop, start + MAX_BUCKET_SIZE)
+            found.append(self.rows[band][start:stop])
+        return np.unique(np.concatenate(found))
+
+    def query(self, signature, exclude=()):
+        """
+        Идентификаторы и оценки сходства кандидатов; рецепты exclude
+        (например, замененные более новыми сигнатурами) пропускаются.
+        """
+        rows = self.candidates(signature)
+        ids = np.asarray(self.ids[rows])
+        keep = ~np.isin(ids, np.asarray(exclude, dtype=np.int64))
+        signatures = np.asarray(self.signatures[rows[keep]])
+        return ids[keep], (signatures == signature).mean(axis=1)
+
+
+def similarity(signatures, signature):
+    """Оценки коэффициента Жаккара; для пустых множеств — ноль."""
+    if is_empty(signature):
+        return np.zeros(len(signatures))
+    scores = (signatures == signature).mean(axis=1)
+    return np.where(signatures[:, 0] == EMPTY, 0.0, scores)
+
+
+def match_signatures(signature, ids, signatures):
+    """То же, что SimilarityIndex.query, для небольшого набора сигнатур."""
+    if not len(ids):
+        return ids, np.empty(0)
+    query = band_keys(signature[None, :])
+    matched = (band_keys(signatures) == query).any(axis=0)
+    return ids[matched], (signatures[matched] == signature).mean(axis=1)
+
+
+def index_root():
+    return Path(settings.SIMILARITY_INDEX_DIR)
+
+
+def empty_indexes():
+    return {kind: SimilarityIndex.empty() for kind in KINDS}
+
+
+def load_indexes(path):
+    """Индексы сигнатур каждого вида из каталога версии индекса."""
+    return {
+        kind: SimilarityIndex.load(path / kind)
+        if (path / kind).is_dir() else SimilarityIndex.empty()
+        for kind in KINDS
+    }
+
+
+_loaded = {'target': None, 'indexes': empty_indexes()}
+_lock = threading.Lock()
+
+
+def current_indexes():
+    """
+    Текущие индексы процесса. Каталог версии индекса выбирается
+    символической ссылкой current, поэтому новая версия подхватывается без
+    перезапуска.
+    """
+    try:
+        target = os.readlink(index_root() / 'current')
+    except OSError:
+        target = None
+    with _lock:
+        if target != _loaded['target']:
+            _loaded['indexes'] = (
+                load_indexes(index_root() / target)
+                if target else empty_indexes()
+            )
+            _loaded['target'] = target
+        return _loaded['indexes']
+
+
+def recipe_tokens(recipe_ids):
+    """
+    Элементы множеств существующих рецептов по данным базы:
+    {id: {вид сигнатуры: массив}}.
+    """
+    recipes = Recipe.objects.filter(
+        pk__in=recipe_ids).values_list('pk', 'name', 'text')
+    texts = {pk: text_tokens(name, text) for pk, name, text in recipes}
+    ingredients = {pk: [] for pk in texts}
+    tags = {pk: [] for pk in texts}
+    pairs = RecipeIngredient.objects.filter(
+        recipe_id__in=texts).values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in pairs:
+        ingredients[recipe_id].append(ingredient_id)
+    pairs = Recipe.tags.through.objects.filter(
+        recipe_id__in=texts).values_list('recipe_id', 'tag_id')
+    for recipe_id, tag_id in pairs:
+        tags[recipe_id].append(tag_id)
+    return {
+        pk: {
+            'ingredients': feature_tokens(ingredients[pk], tags[pk]),
+            'text': texts[pk],
+        }
+        for pk in texts
+    }
+
+
+def build_signatures(recipe_ids):
+    """Вычисление и сохранение сигнатур рецептов."""
+    tokens = recipe_tokens(recipe_ids)
+    recipe_ids = list(tokens)
+    signatures = {
+        kind: minhash_many([tokens[pk][kind] for pk in recipe_ids])
+        for kind in KINDS
+    }
+    now = timezone.now()
+    RecipeSignature.objects.bulk_create(
+        [RecipeSignature(
+            recipe_id=pk,
+            updated=now,
+            **{kind: signatures[kind][row].tobytes() for kind in KINDS})
+         for row, pk in enumerate(recipe_ids)],
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=[*KINDS, 'updated'],
+    )
+    return {
+        pk: {kind: signatures[kind][row] for kind in KINDS}
+        for row, pk in enumerate(recipe_ids)
+    }
+
+
+def build_missing(recipe_ids):
+    existing = RecipeSignature.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+    missing = set(recipe_ids) - set(existing)
+    if missing:
+        build_signatures(missing)
+
+
+def invalidate(recipe_ids):
+    """
+    Удаление устаревших сигнатур и их вычисление после фиксации
+    транзакции (один раз, сколько бы ингредиентов ни изменилось) или, при
+    OUTBOX['DEFERRED_BUILDS'], обработчиком журнала событий.
+    """
+    recipe_ids = list(recipe_ids)
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    if not settings.OUTBOX['DEFERRED_BUILDS']:
+        transaction.on_commit(partial(build_missing, recipe_ids))
+
+
+def handle_events(events):
+    """
+    Обработчик журнала событий: сигнатуры новых и измененных рецептов и
+    перестроение индекса, если он устарел.
+    """
+    build_missing(outbox.recipe_ids(events))
+    if index_is_stale():
+        rebuild()
+
+
+def index_is_stale():
+    """Индекса нет или после него изменено слишком много сигнатур."""
+    built_at = current_indexes()['ingredients'].built_at
+    if built_at is None:
+        return RecipeSignature.objects.exists()
+    limit = settings.SIMILARITY_INDEX_MAX_CHANGES
+    return RecipeSignature.objects.filter(
+        updated__gt=built_at)[:limit + 1].count() > limit
+
+
+def as_signature(value):
+    if not value:
+        return np.full(SIGNATURE_SIZE, EMPTY, dtype=np.uint32)
+    return np.frombuffer(value, dtype=np.uint32)
+
+
+def no_changes():
+    return np.empty(0, dtype=np.int64), {
+        kind: np.empty((0, SIGNATURE_SIZE), dtype=np.uint32)
+        for kind in KINDS
+    }
+
+
+_changes = {'target': None, 'since': None, 'rows': {}, 'arrays': None}
+
+
+def changed_signatures(indexes):
+    """
+    Сигнатуры, измененные после построения индекса: идентификаторы
+    рецептов по возрастанию и {вид сигнатуры: матрица}. Прочитанные
+    сигнатуры хранятся в процессе до смены индекса, из базы читаются
+    только строки, обновленные после предыдущего чтения.
+    """
+    built_at = indexes['ingredients'].built_at
+    with _lock:
+        if _changes['target'] is not indexes:
+            _changes.update(target=indexes, since=built_at, rows={},
+                            arrays=None)
+        since = _changes['since']
+    changed = RecipeSignature.objects.all()
+    if since is not None:
+        changed = changed.filter(updated__gt=since - CHANGES_OVERLAP)
+    rows = list(changed.values_list('recipe_id', 'updated', *KINDS))
+    with _lock:
+        if _changes['target'] is not indexes:
+            return no_changes()
+        known = _changes['rows']
+        for recipe_id, updated, *values in rows:
+            if recipe_id in known and known[recipe_id][0] == updated:
+                continue
+            known[recipe_id] = updated, [
+                as_signature(value) for value in values]
+            _changes['arrays'] = None
+            if _changes['since'] is None or updated > _changes['since']:
+                _changes['since'] = updated
+        if _changes['arrays'] is None:
+            _changes['arrays'] = changes_arrays(_changes['rows'])
+        return _changes['arrays']
+
+
+def changes_arrays(rows):
+    if not rows:
+        return no_changes()
+    ids = np.fromiter(sorted(rows), np.int64, len(rows))
+    return ids, {
+        kind: np.stack([rows[pk][1][column] for pk in ids.tolist()])
+        for column, kind in enumerate(KINDS)
+    }
+
+
+def lookup_signatures(ids, indexes, changes):
+    """
+    Сигнатуры рецептов ids из измененных сигнатур или из индекса и
+    признак того, что рецепт найден.
+    """
+    changed_ids, changed = changes
+    signatures = {}
+    found = np.zeros(len(ids), dtype=bool)
+    position = np.searchsorted(changed_ids, ids) if len(changed_ids) else None
+    in_changes = np.zeros(len(ids), dtype=bool)
+    if position is not None:
+        position = np.minimum(position, len(changed_ids) - 1)
+        in_changes = changed_ids[position] == ids
+    for kind in KINDS:
+        signatures[kind], in_index = indexes[kind].signatures_of(ids)
+        in_index &= ~in_changes
+        found |= in_index
+        if in_changes.any():
+            signatures[kind][in_changes] = changed[kind][
+                position[in_changes]]
+    return signatures, found | in_changes
+
+
+def kind_candidates(kind, signature, indexes, changes):
+    """Рецепты, у которых с signature совпала хотя бы одна LSH-полоса."""
+    changed_ids, changed = changes
+    ids, scores = indexes[kind].query(signature, exclude=changed_ids)
+    more_ids, more_scores = match_signatures(
+        signature, changed_ids, changed[kind])
+    return (
+        np.concatenate([ids, more_ids]),
+        np.concatenate([scores, more_scores]),
+    )
+
+
+def recipe_signatures(recipe_id, indexes, changes):
+    signatures, found = lookup_signatures(
+        np.array([recipe_id]), indexes, changes)
+    if found[0]:
+        return {kind: signatures[kind][0] for kind in KINDS}
+    return build_signatures([recipe_id]).get(recipe_id)
+
+
+def similar_recipes(recipe_id, limit):
+    """
+    Идентификаторы до limit рецептов, похожих на рецепт recipe_id по
+    ингредиентам и тегам, в порядке убывания сходства.
+    """
+    indexes = current_indexes()
+    changes = changed_signatures(indexes)
+    signatures = recipe_signatures(recipe_id, indexes, changes)
+    if signatures is None or is_empty(signatures['ingredients']):
+        return []
+    ids, scores = kind_candidates(
+        'ingredients', signatures['ingredients'], indexes, changes)
+    keep = ids != recipe_id
+    ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return existing_recipes([int(pk) for pk in ids[order]], limit)
+
+
+def existing_recipes(ranked, limit):
+    """
+    Первые limit существующих рецептов из ranked: удаленные рецепты
+    остаются в индексе до его перестроения.
+    """
+    found = []
+    for start in range(0, len(ranked), limit * 2):
+        chunk = ranked[start:start + limit * 2]
+        existing = set(Recipe.objects.filter(
+            pk__in=chunk).values_list('pk', flat=True))
+        found += [pk for pk in chunk if pk in existing]
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def duplicate_scores(signatures, indexes, changes, exclude=None):
+    """
+    Кандидаты в почти-дубликаты рецепта с сигнатурами signatures и оценки
+    сходства: среднее сходство по ингредиентам и по тексту.
+    """
+    ids = np.unique(np.concatenate([
+        kind_candidates(kind, signatures[kind], indexes, changes)[0]
+        for kind in KINDS
+    ]))
+    if exclude is not None:
+        ids = ids[ids != exclude]
+    candidates, _ = lookup_signatures(ids, indexes, changes)
+    scores = np.mean([
+        similarity(candidates[kind], signatures[kind]) for kind in KINDS
+    ], axis=0)
+    return ids, scores
+
+
+def near_duplicates(ingredient_ids, tag_ids, name, text, exclude=None):
+    """
+    Почти-дубликаты рецепта с указанными данными: список пар
+    (id рецепта, сходство) по убыванию сходства. Рецепт exclude (сам
+    редактируемый рецепт) пропускается.
+    """
+    signatures = {
+        'ingredients': minhash(feature_tokens(ingredient_ids, tag_ids)),
+        'text': minhash(text_tokens(name, text)),
+    }
+    indexes = current_indexes()
+    changes = changed_signatures(indexes)
+    ids, scores = duplicate_scores(signatures, indexes, changes, exclude)
+    keep = scores >= settings.NEAR_DUPLICATE_THRESHOLD
+    ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return [(int(ids[row]), float(scores[row])) for row in order]
+
+
+def flag_duplicates(recipe, duplicates):
+    """Замена списка возможных дубликатов рецепта."""
+    DuplicateCandidate.objects.filter(recipe=recipe).delete()
+    existing = set(Recipe.objects.filter(
+        pk__in=[pk for pk, _ in duplicates]).values_list('pk', flat=True))
+    DuplicateCandidate.objects.bulk_create(
+        [DuplicateCandidate(recipe=recipe, duplicate_of_id=pk,
+                            similarity=score)
+         for pk, score in duplicates if pk in existing],
+        ignore_conflicts=True,
+    )
+
+
+def read_signatures(batch_size):
+    """Все сигнатуры из базы: идентификаторы и {вид: матрица}."""
+    count = RecipeSignature.objects.count()
+    ids = np.empty(count, dtype=np.int64)
+    signatures = {
+        kind: np.empty((count, SIGNATURE_SIZE), dtype=np.uint32)
+        for kind in KINDS
+    }
+    size = 0
+    rows = RecipeSignature.objects.values_list('recipe_id', *KINDS)
+    for row in rows.iterator(chunk_size=batch_size):
+        if size == count:
+            break
+        ids[size] = row[0]
+        for column, kind in enumerate(KINDS, start=1):
+            signatures[kind][size] = as_signature(row[column])
+        size += 1
+    return ids[:size], {
+        kind: matrix[:size] for kind, matrix in signatures.items()
+    }
+
+
+def rebuild_index(batch_size=10000):
+    """
+    Запись новой версии индексов из RecipeSignature и переключение на нее.
+    Возвращает число рецептов в индексе сигнатур ингредиентов.
+    """
+    root = index_root()
+    root.mkdir(parents=True, exist_ok=True)
+    built_at = timezone.now()
+    ids, signatures = read_signatures(batch_size)
+    name = f'index-{built_at.strftime("%Y%m%d%H%M%S%f")}'
+    indexed = {
+        kind: SimilarityIndex.write(
+            root / name / kind, ids, signatures[kind], built_at)
+        for kind in KINDS
+    }
+    link = root / 'current.tmp'
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(name)
+    previous = os.readlink(root / 'current') if (
+        root / 'current').is_symlink() else None
+    os.replace(link, root / 'current')
+    for path in root.glob('index-*'):
+        if path.name not in (name, previous):
+            shutil.rmtree(path)
+    return indexed['ingredients']
+
+
+def build_all_missing(batch_size=5000):
+    """Сигнатуры рецептов, у которых их нет; возвращает их число."""
+    ids = list(Recipe.objects.filter(signature__isnull=True).order_by(
+        'pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        build_signatures(ids[start:start + batch_size])
+    return len(ids)
+
+
+def rebuild(batch_size=5000):
+    """
+    Недостающие сигнатуры и новая версия индекса. Возвращает число
+    вычисленных сигнатур и число рецептов в индексе.
+    """
+    built = build_all_missing(batch_size)
+    return built, rebuild_index(batch_size)
@@ -0,0 +1,188 @@
+"""
+Рекомендации авторов («Авторы, которые могут понравиться»).
+
+Оценка автора a для пользователя u складывается из вероятностей двух
+случайных блужданий по графу пользователей:
+
+* по избранному: u -> рецепт из избранного u -> другой пользователь,
+  добавивший этот рецепт в избранное, -> рецепт из его избранного ->
+  автор рецепта. Каждый шаг выбирает соседа равновероятно, поэтому
+  популярные рецепты и пользователи с большим избранным не заглушают
+  остальных;
+* по подпискам: u -> автор, на которого подписан u, -> автор, на
+  которого подписан тот.
+
+Веса блужданий задаются в settings.AUTHOR_SUGGESTIONS. Из рекомендаций
+исключаются сам пользователь, авторы, на которых он уже подписан, и
+пользователи без рецептов.
+
+Переходы хранятся разреженными матрицами в формате CSR на массивах
+NumPy; вероятности блуждания — произведения матриц переходов. Матрица
+переходов «рецепт -> автор через других пользователей» общая для всех и
+считается один раз, строки пользователей обрабатываются пачками.
+Списки строит команда update_author_suggestions и сохраняет в
+AuthorSuggestions, так что ответ /api/users/suggestions/ — одна выборка.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.contrib.auth import get_user_model
+
+from users.models import Follow
+
+from .models import FavoriteRecipeUser, Recipe
+
+User = get_user_model()
+
+Matrix = namedtuple('Matrix', ('indptr', 'indices', 'data', 'shape'))
+Graph = namedtuple('Graph', (
+    'user_ids', 'favorites', 'co_favorites', 'followees', 'follows',
+    'authors',
+))
+
+
+def from_triples(rows, cols, values, shape):
+    """Матрица CSR из троек (строка, столбец, значение); повторы
+    складываются."""
+    keys, inverse = np.unique(
+        rows.astype(np.int64) * shape[1] + cols, return_inverse=True)
+    data = np.bincount(inverse, weights=values, minlength=len(keys))
+    rows, cols = np.divmod(keys, shape[1])
+    indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+    return Matrix(indptr, cols, data, shape)
+
+
+def row_numbers(matrix):
+    """Номер строки каждого ненулевого элемента."""
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+
+def transpose(matrix):
+    return from_triples(matrix.indices, row_numbers(matrix), matrix.data,
+                        matrix.shape[::-1])
+
+
+def normalize_rows(matrix):
+    """Деление строк на их суммы: матрица переходов блуждания."""
+    sums = np.bincount(row_numbers(matrix), weights=matrix.data,
+                       minlength=matrix.shape[0])
+    sums[sums == 0] = 1
+    return matrix._replace(
+        data=matrix.data / np.repeat(sums, np.diff(matrix.indptr)))
+
+
+def row_slice(matrix, start, stop):
+    first, last = matrix.indptr[start], matrix.indptr[stop]
+    return Matrix(matrix.indptr[start:stop + 1] - first,
+                  matrix.indices[first:last], matrix.data[first:last],
+                  (stop - start, matrix.shape[1]))
+
+
+def multiply(left, right):
+    """
+    Произведение left · right: каждый ненулевой элемент left[i, j]
+    умножается на строку j матрицы right, результаты по одинаковым
+    (i, столбец) складываются.
+    """
+    starts = right.indptr[left.indices]
+    lengths = right.indptr[left.indices + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = (np.repeat(starts - offsets, lengths)
+                 + np.arange(lengths.sum()))
+    owners = np.repeat(np.arange(len(left.indices)), lengths)
+    return from_triples(
+        row_numbers(left)[owners],
+        right.indices[positions],
+        left.data[owners] * right.data[positions],
+        (left.shape[0], right.shape[1]),
+    )
+
+
+def load_graph():
+    """Матрицы переходов по избранному и подпискам всех пользователей."""
+    user_ids = np.array(
+        User.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64)
+    recipes = np.array(
+        Recipe.objects.order_by('pk').values_list('pk', 'author_id'),
+        dtype=np.int64).reshape(-1, 2)
+    favorites = np.array(
+        FavoriteRecipeUser.objects.values_list('user_id', 'recipe_id'),
+        dtype=np.int64).reshape(-1, 2)
+    follows = np.array(
+        Follow.objects.values_list('user_id', 'author_id'),
+        dtype=np.int64).reshape(-1, 2)
+    # Таблицы читаются отдельными запросами: строки, которые ссылаются на
+    # пользователей и рецепты, созданные между запросами, отбрасываются.
+    recipes = recipes[np.isin(recipes[:, 1], user_ids)]
+    favorites = favorites[np.isin(favorites[:, 0], user_ids)
+                          & np.isin(favorites[:, 1], recipes[:, 0])]
+    follows = follows[np.isin(follows, user_ids).all(axis=1)]
+    users = len(user_ids)
+    fans = np.searchsorted(user_ids, favorites[:, 0])
+    liked = np.searchsorted(recipes[:, 0], favorites[:, 1])
+    ones = np.ones(len(favorites))
+    # Пользователь -> рецепт из избранного, рецепт -> его поклонник и
+    # пользователь -> автор рецепта из его избранного.
+    user_recipe = from_triples(fans, liked, ones, (users, len(recipes)))
+    recipe_user = normalize_rows(transpose(user_recipe))
+    user_author = normalize_rows(from_triples(
+        fans, np.searchsorted(user_ids, recipes[liked, 1]), ones,
+        (users, users)))
+    follow_matrix = from_triples(
+        np.searchsorted(user_ids, follows[:, 0]),
+        np.searchsorted(user_ids, follows[:, 1]),
+        np.ones(len(follows)), (users, users))
+    authors = np.zeros(users, dtype=bool)
+    authors[np.searchsorted(user_ids, recipes[:, 1])] = True
+    return Graph(
+        user_ids=user_ids,
+        favorites=normalize_rows(user_recipe),
+        co_favorites=multiply(recipe_user, user_author),
+        followees=normalize_rows(follow_matrix),
+        follows=follow_matrix,
+        authors=authors,
+    )
+
+
+def suggest(graph, start, stop, top_k, weights):
+    """
+    Рекомендации пользователям с номерами start..stop-1: список пар
+    (id пользователя, [id авторов по убыванию оценки]).
+    """
+    scores = [
+        multiply(row_slice(graph.favorites, start, stop),
+                 graph.co_favorites),
+        multiply(row_slice(graph.followees, start, stop), graph.follows),
+    ]
+    rows = np.concatenate([row_numbers(matrix) for matrix in scores])
+    cols = np.concatenate([matrix.indices for matrix in scores])
+    values = np.concatenate([
+        matrix.data * weight for matrix, weight in zip(scores, weights)])
+    combined = from_triples(rows, cols, values,
+                            (stop - start, graph.follows.shape[1]))
+    rows, cols = row_numbers(combined), combined.indices
+    users = rows + start
+    followed = row_slice(graph.follows, start, stop)
+    followed_keys = row_numbers(followed) * combined.shape[1] + (
+        followed.indices)
+    keep = (
+        graph.authors[cols] & (cols != users)
+        & ~np.isin(rows * combined.shape[1] + cols, followed_keys)
+        & (combined.data > 0)
+    )
+    rows, cols, values = rows[keep], cols[keep], combined.data[keep]
+    # Лучшие top_k в каждой строке; при равных оценках — меньший id.
+    order = np.lexsort((cols, -values, rows))
+    rows, cols = rows[order], cols[order]
+    firsts = np.searchsorted(rows, rows)
+    top = np.arange(len(rows)) - firsts < top_k
+    rows, cols = rows[top], cols[top]
+    bounds = np.searchsorted(rows, np.arange(stop - start + 1))
+    return [
+        (int(graph.user_ids[start + row]),
+         graph.user_ids[cols[bounds[row]:bounds[row + 1]]].tolist())
+        for row in range(stop - start)
+        if bounds[row] < bounds[row + 1]
+    ]
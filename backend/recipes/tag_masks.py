@@ -0,0 +1,77 @@
+"""
+Маски тегов рецептов.
+
+Каждому тегу назначен свой бит (Tag.bit), а в Recipe.tag_mask хранится
+сумма битов тегов рецепта. Фильтр по тегам — побитовое условие на этот
+столбец: рецепты с любым из тегов — tag_mask & mask <> 0, со всеми
+тегами — tag_mask & mask = mask. Маска обновляется сигналом изменения
+тегов рецепта; пути, которые пишут таблицу связей напрямую (bulk_create),
+вызывают update_masks сами.
+"""
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, Tag, tags_mask
+
+BATCH_SIZE = 1000
+
+
+def mask_expression():
+    """
+    Выражение маски рецепта по таблице связей: сумма битов его тегов.
+    Биты подставляются в запрос константами, поэтому выражение работает
+    в любой СУБД без функций возведения в степень.
+    """
+    whens = [
+        When(tag_id=pk, then=Value(1 << bit))
+        for pk, bit in Tag.objects.values_list('pk', 'bit')
+    ]
+    if not whens:
+        return Value(0)
+    masks = (
+        Recipe.tags.through.objects
+        .filter(recipe_id=OuterRef('pk'))
+        .values('recipe_id')
+        .annotate(mask=Sum(Case(*whens, default=Value(0),
+                                output_field=BigIntegerField())))
+        .values('mask')
+    )
+    return Coalesce(Subquery(masks, output_field=BigIntegerField()),
+                    Value(0))
+
+
+def update_masks(recipe_ids):
+    """Пересчет масок указанных рецептов одним запросом на пачку."""
+    recipe_ids = list(recipe_ids)
+    expression = mask_expression()
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        Recipe.objects.filter(
+            pk__in=recipe_ids[start:start + BATCH_SIZE]
+        ).update(tag_mask=expression)
+
+
+def update_recipe_mask(recipe):
+    """Маска одного рецепта; обновляется и у объекта в памяти."""
+    recipe.tag_mask = tags_mask(recipe.tags.only('bit'))
+    Recipe.objects.filter(pk=recipe.pk).update(tag_mask=recipe.tag_mask)
+
+
+def clear_bit(tag):
+    """Снятие бита тега у всех рецептов (при удалении тега)."""
+    bit = 1 << tag.bit
+    Recipe.objects.alias(tag_bit=F('tag_mask').bitand(bit)).filter(
+        tag_bit=bit).update(tag_mask=F('tag_mask') - bit)
+
+
+def recompute():
+    """Пересчет масок всех рецептов; возвращает число рецептов."""
+    return Recipe.objects.update(tag_mask=mask_expression())
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from users.models import User
+
+from . import ingredient_usage
+from .models import Ingredient, IngredientUsage, Recipe, RecipeIngredient
+
+
+class RecipeDeleteUsageTest(TestCase):
+    """Счетчики ингредиентов после удаления рецепта, прерванного ошибкой."""
+
+    def setUp(self):
+        author = User.objects.create(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password')
+        self.salt = Ingredient.objects.create(name='соль',
+                                              measurement_unit='г')
+        self.pepper = Ingredient.objects.create(name='перец',
+                                                measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            name='Суп', text='Посолить', cooking_time=10,
+            image='recipes/images/soup.png', author=author)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=5)
+
+    def recipes_with(self, ingredient):
+        return IngredientUsage.objects.get(ingredient=ingredient).recipes
+
+    def test_failed_delete_does_not_mute_signals(self):
+        with mock.patch('recipes.changes.bury', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.recipe.delete()
+        self.assertNotIn(self.recipe.pk, ingredient_usage.deleting())
+        self.assertEqual(self.recipes_with(self.salt), 1)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.pepper, amount=1)
+        self.assertEqual(self.recipes_with(self.pepper), 1)
@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from foodgram.paginators import EstimatedCountPaginator
+
 from .models import User
 
 
@@ -12,4 +14,6 @@ class UserAdmin(admin.ModelAdmin):
         'last_name',
         'email',
     )
-    list_filter = ('username', 'email',)
+    search_fields = ('^username', '^email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Value
 
 
 class User(AbstractUser):
@@ -58,6 +59,19 @@ class User(AbstractUser):
         return self.username
 
 
+class FollowQuerySet(models.QuerySet):
+    """Выборки подписок с предзагрузкой данных для сериализации."""
+
+    def subscriptions_of(self, user):
+        return self.filter(user=user).select_related(
+            'author'
+        ).prefetch_related(
+            'author__recipes'
+        ).annotate(
+            is_subscribed=Value(True, output_field=models.BooleanField())
+        )
+
+
 class Follow(models.Model):
     """Модель подписок на других пользователей"""
     user = models.ForeignKey(
@@ -72,6 +86,7 @@ class Follow(models.Model):
         related_name="following",
         verbose_name="Автор",
     )
+    objects = FollowQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Подписка на автора'